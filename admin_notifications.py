@@ -1,10 +1,27 @@
+import asyncio
 import datetime
+import functools
+import logging
 import pytz
+from collections import Counter
+from typing import Any, Callable, Dict, Optional, Set, Tuple
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
 from data.texts import TEXTS
-from data.admin_texts import VIOLATION_DESCRIPTIONS, get_penalty_descriptions, ADMIN_NOTIFICATION
+from data.admin_texts import (
+    VIOLATION_DESCRIPTIONS,
+    ADMIN_NOTIFICATION,
+    ADMIN_DIGEST,
+    ADMIN_DIGEST_TITLES,
+    ADMIN_DIGEST_OFFENDER
+)
 from config import Config
 from aiogram import Bot
+from services.send_queue import send_queue, PRIORITY_ADMIN
+
+logger = logging.getLogger(__name__)
+
+# Сколько самых частых нарушителей показывать в сводке (с кнопками действий)
+DIGEST_TOP_OFFENDERS = 5
 
 def make_admin_inline_kb(user_id: int, deleted_msg_id: int = None) -> InlineKeyboardMarkup:
     """
@@ -42,6 +59,173 @@ def make_admin_inline_kb(user_id: int, deleted_msg_id: int = None) -> InlineKeyb
         ])
     return kb
 
+class _DigestBucket:
+    """Уведомления одного ключа (чат, тип нарушения) за текущее окно"""
+
+    __slots__ = ("bot", "config", "sent_individually", "counts", "names", "handle")
+
+    def __init__(self, bot: Bot, config: Config):
+        self.bot = bot
+        self.config = config
+        self.sent_individually = 0
+        # user_id -> количество уведомлений, вошедших в сводку, и последнее имя пользователя
+        self.counts: Counter = Counter()
+        self.names: Dict[int, str] = {}
+        self.handle: Optional[asyncio.TimerHandle] = None
+
+
+class AdminDigest:
+    """
+    Объединяет уведомления в админ-чат по (чат, тип нарушения).
+
+    Первые admin_digest_individual_limit уведомлений ключа за окно
+    admin_digest_window_seconds отправляются как обычно, остальные только
+    подсчитываются. По окончании окна отправляется одна сводка: сколько было
+    нарушений, от скольких пользователей, и самые частые нарушители с кнопками
+    действий. При небольшом потоке нарушений админ-чат получает обычные уведомления.
+    """
+
+    def __init__(self, top_offenders: int = DIGEST_TOP_OFFENDERS):
+        self.top_offenders = top_offenders
+        # (chat_id, violation_type, нарушители - администраторы) -> окно уведомлений
+        self._buckets: Dict[Tuple[Optional[int], str, bool], _DigestBucket] = {}
+        self._flushes: Set[asyncio.Task] = set()
+
+        self.individual = 0
+        self.digested = 0
+        self.digests_sent = 0
+
+    def notify(
+        self,
+        bot: Bot,
+        config: Config,
+        chat_id: Optional[int],
+        violation_type: str,
+        user_id: int,
+        user_name: str,
+        send_individual: Callable[[], Any],
+        admins: bool = False
+    ) -> bool:
+        """
+        Ставит уведомление в очередь через send_individual или учитывает его в сводке.
+        send_individual не должен ждать отправки (например, send_queue.enqueue):
+        notify вызывается из обработчика обновления.
+        Возвращает True, если уведомление отправляется отдельным сообщением.
+        """
+        window = config.admin_digest_window_seconds
+        if window <= 0:
+            self.individual += 1
+            send_individual()
+            return True
+
+        key = (chat_id, violation_type, admins)
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = _DigestBucket(bot, config)
+            bucket.handle = asyncio.get_running_loop().call_later(window, self._schedule_flush, key)
+
+        if bucket.sent_individually < config.admin_digest_individual_limit:
+            bucket.sent_individually += 1
+            self.individual += 1
+            send_individual()
+            return True
+
+        bucket.counts[user_id] += 1
+        bucket.names[user_id] = user_name
+        self.digested += 1
+        return False
+
+    def _schedule_flush(self, key: Tuple[Optional[int], str, bool]) -> None:
+        task = asyncio.create_task(self._flush(key))
+        self._flushes.add(task)
+        task.add_done_callback(self._flushes.discard)
+
+    async def _flush(self, key: Tuple[Optional[int], str, bool]) -> None:
+        bucket = self._buckets.pop(key, None)
+        if bucket is None or not bucket.counts:
+            return
+        chat_id, violation_type, admins = key
+        try:
+            await self._send_digest(bucket, chat_id, violation_type, admins)
+            self.digests_sent += 1
+        except Exception as e:
+            logger.error(f"Ошибка при отправке сводки нарушений {violation_type} в чате {chat_id}: {str(e)}")
+
+    async def flush_all(self) -> None:
+        """Отправляет все накопленные сводки, не дожидаясь окончания окон"""
+        for key in list(self._buckets):
+            handle = self._buckets[key].handle
+            if handle is not None:
+                handle.cancel()
+            await self._flush(key)
+        if self._flushes:
+            await asyncio.gather(*self._flushes, return_exceptions=True)
+
+    async def _send_digest(
+        self,
+        bucket: _DigestBucket,
+        chat_id: Optional[int],
+        violation_type: str,
+        admins: bool
+    ) -> None:
+        config = bucket.config
+        top = bucket.counts.most_common(self.top_offenders)
+        offenders = "\n".join(
+            ADMIN_DIGEST_OFFENDER.format(user_name=bucket.names[user_id], user_id=user_id, count=count)
+            for user_id, count in top
+        )
+        text = ADMIN_DIGEST.format(
+            title=ADMIN_DIGEST_TITLES[admins],
+            violation_desc=VIOLATION_DESCRIPTIONS.get(violation_type, violation_type),
+            violation_type=violation_type,
+            chat_id=chat_id,
+            window=config.admin_digest_window_seconds,
+            total=sum(bucket.counts.values()),
+            users=len(bucket.counts),
+            offenders=offenders
+        )
+
+        kb = None
+        if not admins:
+            # Администраторы не наказываются, поэтому кнопки действий нужны только для участников
+            kb = InlineKeyboardMarkup(inline_keyboard=[
+                [
+                    InlineKeyboardButton(
+                        text=f"🚫 {bucket.names[user_id]}",
+                        callback_data=f"revoke_penalty:{user_id}"
+                    ),
+                    InlineKeyboardButton(
+                        text=f"🔄 {bucket.names[user_id]}",
+                        callback_data=f"reset_violations:{user_id}"
+                    )
+                ]
+                for user_id, _ in top
+            ])
+
+        admin_chat_id, message_thread_id = config.policy.admin_chat_target
+        await send_queue.submit(admin_chat_id, PRIORITY_ADMIN, functools.partial(
+            bucket.bot.send_message,
+            chat_id=admin_chat_id,
+            text=text,
+            parse_mode="HTML",
+            reply_markup=kb,
+            message_thread_id=message_thread_id
+        ))
+
+    def stats(self) -> Dict[str, Any]:
+        """Возвращает количество отдельных уведомлений, учтённых в сводках и отправленных сводок"""
+        return {
+            "open_windows": len(self._buckets),
+            "individual": self.individual,
+            "digested": self.digested,
+            "digests_sent": self.digests_sent
+        }
+
+
+# Сводки уведомлений в админ-чат
+admin_digest = AdminDigest()
+
+
 async def send_admin_notification(
     bot: Bot,
     config: Config,
@@ -51,15 +235,17 @@ async def send_admin_notification(
     penalty_to_apply: str,
     msg_text: str,
     penalty_count: int,
-    deleted_msg_id: int = None
+    deleted_msg_id: int = None,
+    group_id: Optional[int] = None
 ):
     """
     Формирует и отправляет уведомление в админ-чат с HTML форматированием и inline кнопками.
     В уведомлении отображается информация о нарушении, номер инцидента и применённая санкция.
     Если задан deleted_msg_id, то добавляется кнопка для восстановления сообщения.
+    При частых нарушениях одного типа в группе group_id уведомления объединяются в сводку.
     """
     violation_desc = VIOLATION_DESCRIPTIONS.get(violation_type, violation_type)
-    penalty_desc = get_penalty_descriptions(config).get(penalty_to_apply, penalty_to_apply)
+    penalty_desc = config.policy.penalty_descriptions.get(penalty_to_apply, penalty_to_apply)
     
     text_report = ADMIN_NOTIFICATION.format(
         user_name=user_name,
@@ -74,21 +260,19 @@ async def send_admin_notification(
 
     kb = make_admin_inline_kb(user_id, deleted_msg_id)
     
-    # Обработка составного ID чата и топика
-    chat_id = config.admin_chat_id
-    message_thread_id = None
+    # Админ-чат и топик заранее разобраны в политике
+    chat_id, message_thread_id = config.policy.admin_chat_target
     
-    if '_' in str(chat_id):
-        chat_id, message_thread_id = str(chat_id).split('_')
-        chat_id = int(chat_id)
-        message_thread_id = int(message_thread_id)
-    else:
-        chat_id = int(chat_id)  # Преобразуем простой ID в число
-    
-    await bot.send_message(
-        chat_id=chat_id,
-        text=text_report,
-        parse_mode="HTML",
-        reply_markup=kb,
-        message_thread_id=message_thread_id
+    send_individual = functools.partial(
+        send_queue.enqueue, chat_id, PRIORITY_ADMIN, functools.partial(
+            bot.send_message,
+            chat_id=chat_id,
+            text=text_report,
+            parse_mode="HTML",
+            reply_markup=kb,
+            message_thread_id=message_thread_id
+        )
+    )
+    admin_digest.notify(
+        bot, config, group_id, violation_type, user_id, user_name, send_individual
     )
\ No newline at end of file
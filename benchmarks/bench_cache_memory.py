@@ -0,0 +1,70 @@
+"""
+Сравнение памяти на одно закэшированное сообщение ленты чата.
+
+Прежняя схема хранила каждое сообщение кортежем (message_id, user_id, timestamp)
+в списке, ChatTimeline хранит те же данные по столбцам в массивах.
+
+Запуск из корня репозитория:
+    python -m benchmarks.bench_cache_memory
+"""
+import gc
+import random
+import tracemalloc
+
+from state.chat_timeline import ChatTimeline
+
+MESSAGES = 200_000
+CHATS = 20
+BASE_MESSAGE_ID = 1_000_000
+BASE_USER_ID = 5_000_000_000
+BASE_TS = 1_700_000_000.0
+
+
+def _legacy(messages):
+    chat_messages = {}
+    for chat_id, message_id, user_id, ts in messages:
+        chat_messages.setdefault(chat_id, []).append((message_id, user_id, ts))
+    return chat_messages
+
+
+def _timeline(messages):
+    timelines = {}
+    for chat_id, message_id, user_id, ts in messages:
+        timeline = timelines.get(chat_id)
+        if timeline is None:
+            timeline = timelines[chat_id] = ChatTimeline()
+        timeline.append(message_id, user_id, ts)
+    return timelines
+
+
+def _messages(seed: int):
+    """Генерирует поток сообщений, создавая значения заново, как при разборе обновлений"""
+    rnd = random.Random(seed)
+    for i in range(MESSAGES):
+        yield (-1000 - rnd.randrange(CHATS), BASE_MESSAGE_ID + i,
+               BASE_USER_ID + rnd.randrange(5000), BASE_TS + i * 0.01)
+
+
+def measure(build) -> float:
+    """Возвращает байт на сообщение, удерживаемых построенным кэшем"""
+    gc.collect()
+    tracemalloc.start()
+    cache = build(_messages(0))
+    gc.collect()
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del cache
+    return current / MESSAGES
+
+
+def main():
+    legacy = measure(_legacy)
+    current = measure(_timeline)
+    print(f"сообщений: {MESSAGES}, чатов: {CHATS}")
+    print(f"список кортежей: {legacy:.1f} байт/сообщение")
+    print(f"ChatTimeline:    {current:.1f} байт/сообщение")
+    print(f"экономия:        {legacy / current:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""
+Микробенчмарк проверки «были ли сообщения других пользователей между сообщениями».
+
+Сравнивает прежнюю схему (append + sort списка chat_messages и линейный поиск)
+с лентой ChatTimeline при разном количестве сообщений в истории чата.
+
+Запуск из корня репозитория:
+    python -m benchmarks.bench_chat_timeline
+"""
+import random
+import time
+from typing import List, Tuple
+
+from state.chat_timeline import ChatTimeline
+
+HISTORY_SIZES = (1_000, 10_000, 100_000)
+USERS = 200
+
+
+def _legacy_update(chat_messages: List[Tuple[int, int, float]], message_id: int, user_id: int,
+                   ts: float, prev_ts: float) -> bool:
+    """Прежняя реализация: добавление с сортировкой и линейный поиск"""
+    chat_messages.append((message_id, user_id, ts))
+    chat_messages.sort(key=lambda x: x[2])
+    messages_between = [
+        msg for msg in chat_messages
+        if prev_ts < msg[2] < ts and msg[1] != user_id
+    ]
+    return len(messages_between) > 0
+
+
+def _timeline_update(timeline: ChatTimeline, message_id: int, user_id: int,
+                     ts: float, prev_seq: int) -> bool:
+    timeline.append(message_id, user_id, ts)
+    return timeline.has_other_messages_since(user_id, prev_seq)
+
+
+def bench(history_size: int, updates: int) -> Tuple[float, float]:
+    """Возвращает время одного обновления в микросекундах (старая схема, лента)"""
+    rnd = random.Random(history_size)
+    authors = [rnd.randrange(USERS) for _ in range(history_size + updates)]
+
+    chat_messages: List[Tuple[int, int, float]] = []
+    timeline = ChatTimeline()
+    for i in range(history_size):
+        chat_messages.append((i, authors[i], float(i)))
+        timeline.append(i, authors[i], float(i))
+
+    start = time.perf_counter()
+    for i in range(history_size, history_size + updates):
+        _legacy_update(chat_messages, i, authors[i], float(i), float(i - USERS))
+    legacy = (time.perf_counter() - start) / updates * 1e6
+
+    start = time.perf_counter()
+    for i in range(history_size, history_size + updates):
+        _timeline_update(timeline, i, authors[i], float(i), i - USERS)
+    current = (time.perf_counter() - start) / updates * 1e6
+
+    return legacy, current
+
+
+def main():
+    print(f"{'история':>10} {'старая схема, мкс':>20} {'ChatTimeline, мкс':>20} {'ускорение':>10}")
+    for size in HISTORY_SIZES:
+        updates = max(20, 200_000 // size)
+        legacy, current = bench(size, updates)
+        print(f"{size:>10} {legacy:>20.2f} {current:>20.3f} {legacy / current:>9.0f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""
+Бенчмарк сериализации контекста нарушений.
+
+Сравнивает прежнюю схему (str(dict) при записи, eval() при чтении) с
+форматами db.serializers: стоимость записи и чтения одной строки в
+микросекундах и размер значения в байтах. Формат msgpack измеряется,
+только если установлен пакет msgpack.
+
+Запуск из корня репозитория:
+    python -m benchmarks.bench_context_serialization
+"""
+import time
+from typing import Any, Callable, Dict, List
+
+from db import serializers
+from db.serializers import decode_context, encode_context, set_default_serializer
+
+ROWS = 50_000
+
+
+def _make_contexts(count: int) -> List[Dict[str, Any]]:
+    """Контекст нарушения: идентификаторы сообщений, время и короткий текст"""
+    return [
+        {
+            "message_id": 100000 + i,
+            "reply_to_message_id": 99000 + i if i % 3 else None,
+            "previous_message_id": 99500 + i,
+            "elapsed_seconds": round(i % 600 / 7, 3),
+            "text": f"сообщение пользователя номер {i}",
+            "is_admin": i % 50 == 0
+        }
+        for i in range(count)
+    ]
+
+
+def _measure(contexts: List[Dict[str, Any]], dumps: Callable, loads: Callable):
+    """Возвращает время записи и чтения одной строки (мкс) и средний размер значения"""
+    start = time.perf_counter()
+    encoded = [dumps(context) for context in contexts]
+    write_us = (time.perf_counter() - start) / len(contexts) * 1e6
+
+    start = time.perf_counter()
+    for value in encoded:
+        loads(value)
+    read_us = (time.perf_counter() - start) / len(contexts) * 1e6
+
+    size = sum(len(value) for value in encoded) / len(encoded)
+    return write_us, read_us, size
+
+
+def main():
+    contexts = _make_contexts(ROWS)
+    results = {"str()/eval()": _measure(contexts, str, eval)}
+
+    formats = ["json"]
+    if serializers.msgpack is not None:
+        formats.append("msgpack")
+    for name in formats:
+        set_default_serializer(name)
+        results[name] = _measure(contexts, encode_context, decode_context)
+    set_default_serializer("json")
+
+    print(f"строк: {ROWS}")
+    print(f"{'формат':>14} {'запись, мкс':>12} {'чтение, мкс':>12} {'размер, байт':>13}")
+    for name, (write_us, read_us, size) in results.items():
+        print(f"{name:>14} {write_us:>12.2f} {read_us:>12.2f} {size:>13.0f}")
+    if serializers.msgpack is None:
+        print("msgpack не установлен, формат пропущен")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""
+Бенчмарк записи нарушений в базу данных.
+
+Сравнивает прежнюю схему (record_deleted_message и record_violation с
+собственным коммитом каждая, затем отдельное чтение get_incidents_count)
+с пакетной записью через WriteBehindWriter при разном количестве
+одновременно обрабатываемых нарушений.
+
+Запуск из корня репозитория:
+    python -m benchmarks.bench_db_writes
+"""
+import asyncio
+import os
+import tempfile
+import time
+
+from db import operations as db_operations
+from db.operations import get_incidents_count, record_deleted_message, record_violation
+from db.pool import ConnectionPool
+from config import ViolationRule
+
+VIOLATIONS = 2000
+CONCURRENCY = (1, 10, 100)
+USERS = 500
+
+
+class _Config:
+    """Минимальная конфигурация, которую читает record_violation"""
+    violation_rules = {
+        "no_reply": ViolationRule(enabled=True, count_as_violation=True, violations_before_penalty=1)
+    }
+
+
+async def _legacy_violation(pool: ConnectionPool, user_id: int) -> int:
+    """Прежняя схема: две транзакции с коммитом и отдельное чтение счетчика"""
+    now_ts = int(time.time())
+    async with pool.acquire() as db:
+        await db.execute(
+            "INSERT INTO messages_deleted (user_id, user_name, group_id, message_text, timestamp) VALUES (?,?,?,?,?)",
+            (user_id, "user", -100, "text", now_ts)
+        )
+        await db.commit()
+    async with pool.acquire() as db:
+        await db.execute(
+            "INSERT INTO violations (user_id, chat_id, violation_type, message_text, timestamp) VALUES (?,?,?,?,?)",
+            (user_id, -100, "no_reply", "", now_ts)
+        )
+        await db.execute(
+            """
+            INSERT INTO violation_counters (user_id, violation_type, count) VALUES (?, ?, 1)
+            ON CONFLICT(user_id, violation_type) DO UPDATE SET count = count + 1
+            """,
+            (user_id, "no_reply")
+        )
+        await db.execute(
+            """
+            INSERT INTO users_incidents (user_id, incident_count, last_incident_ts) VALUES (?, 1, ?)
+            ON CONFLICT(user_id) DO UPDATE SET incident_count = incident_count + 1, last_incident_ts = ?
+            """,
+            (user_id, now_ts, now_ts)
+        )
+        await db.commit()
+    return await get_incidents_count(user_id)
+
+
+async def _batched_violation(user_id: int) -> int:
+    """Новая схема: обе записи уходят в общую пачку, счетчик возвращается из записи"""
+    _, outcome = await asyncio.gather(
+        record_deleted_message(user_id, "user", -100, "text"),
+        record_violation(user_id, "user", -100, "no_reply", _Config)
+    )
+    return outcome.incident_count
+
+
+async def _run(concurrency: int, violation) -> float:
+    """Возвращает количество обработанных нарушений в секунду"""
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(i: int):
+        async with semaphore:
+            await violation(i % USERS)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(VIOLATIONS)))
+    return VIOLATIONS / (time.perf_counter() - started)
+
+
+async def bench(db_dir: str, concurrency: int):
+    db_operations.DB_PATH = os.path.join(db_dir, f"bench_{concurrency}.db")
+    await db_operations.init_db()
+    pool = db_operations.db_pool
+
+    legacy = await _run(concurrency, lambda user_id: _legacy_violation(pool, user_id))
+    batched = await _run(concurrency, _batched_violation)
+    await db_operations.close_connection_pool()
+    return legacy, batched
+
+
+def main():
+    print(f"нарушений: {VIOLATIONS}")
+    print(f"{'параллельно':>12} {'прежняя схема, /с':>20} {'пакетная запись, /с':>22} {'ускорение':>10}")
+    with tempfile.TemporaryDirectory() as db_dir:
+        for concurrency in CONCURRENCY:
+            legacy, batched = asyncio.run(bench(db_dir, concurrency))
+            print(f"{concurrency:>12} {legacy:>20,.0f} {batched:>22,.0f} {batched / legacy:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
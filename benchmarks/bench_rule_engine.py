@@ -0,0 +1,90 @@
+"""
+Бенчмарк пропускной способности движка правил.
+
+Измеряет количество событий в секунду для двух сценариев:
+- только проверка правилами (RuleEngine.evaluate) на заранее заполненном состоянии;
+- полный цикл обработчика без ввода-вывода: добавление в ленту чата,
+  проверка правилами и добавление в историю пользователя.
+
+Запуск из корня репозитория:
+    python -m benchmarks.bench_rule_engine
+"""
+import random
+import time
+from typing import List
+
+from rules.engine import MessageEvent, RuleEngine
+from state.chat_state import ChatState
+
+EVENTS = 1_000_000
+CHATS = 20
+USERS = 500
+COOLDOWN = 60
+
+
+def _make_events(count: int) -> List[MessageEvent]:
+    """Генерирует поток сообщений: часть с реплаями, часть подряд от одного автора"""
+    rnd = random.Random(42)
+    events = []
+    for i in range(count):
+        chat_id = rnd.randrange(CHATS)
+        user_id = rnd.randrange(USERS)
+        reply_to = None
+        reply_user = None
+        if rnd.random() < 0.4:
+            reply_to = rnd.randrange(max(1, i))
+            reply_user = rnd.choice((user_id, rnd.randrange(USERS)))
+        events.append(MessageEvent(chat_id, user_id, i + 1, reply_to, reply_user, i * 0.01))
+    return events
+
+
+def _fill(state: ChatState, events: List[MessageEvent]) -> None:
+    for event in events:
+        seq = state.timeline(event.chat_id).append(event.message_id, event.user_id, event.timestamp)
+        state.history.append(
+            event.chat_id, event.user_id,
+            (event.message_id, event.reply_to_message_id, event.timestamp, seq)
+        )
+
+
+def bench_evaluate(events: List[MessageEvent]) -> float:
+    """Возвращает количество проверок в секунду"""
+    state = ChatState()
+    _fill(state, events)
+    engine = RuleEngine()
+    evaluate = engine.evaluate
+
+    start = time.perf_counter()
+    for event in events:
+        evaluate(event, state, COOLDOWN)
+    return len(events) / (time.perf_counter() - start)
+
+
+def bench_pipeline(events: List[MessageEvent]) -> float:
+    """Возвращает количество событий в секунду с обновлением состояния"""
+    state = ChatState()
+    engine = RuleEngine()
+    evaluate = engine.evaluate
+    timelines = state.timelines
+    history_append = state.history.append
+
+    start = time.perf_counter()
+    for event in events:
+        seq = timelines[event.chat_id].append(event.message_id, event.user_id, event.timestamp)
+        evaluate(event, state, COOLDOWN)
+        history_append(
+            event.chat_id, event.user_id,
+            (event.message_id, event.reply_to_message_id, event.timestamp, seq)
+        )
+    return len(events) / (time.perf_counter() - start)
+
+
+def main():
+    events = _make_events(EVENTS)
+    print(f"событий: {EVENTS}, чатов: {CHATS}, пользователей: {USERS}")
+    print(f"{'только правила':>30}: {bench_evaluate(events):>12,.0f} событий/с")
+    print(f"{'лента + правила + история':>30}: {bench_pipeline(events):>12,.0f} событий/с")
+
+
+if __name__ == "__main__":
+    main()
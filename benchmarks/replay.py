@@ -0,0 +1,326 @@
+"""
+Воспроизведение потока обновлений через настоящий роутер бота.
+
+Обновления групп (JSONL, по одному объекту Update на строку) подаются в
+Dispatcher с теми же роутерами и middleware конфигурации, что и в main.py.
+Бот работает без сети: запросы к Telegram API обрабатывает FakeSession,
+а база данных создаётся во временном каталоге.
+
+По итогам выводятся:
+- пропускная способность (обновлений в секунду);
+- задержка обработки одного обновления (p50/p95/p99);
+- количество SQL-запросов и коммитов на обновление;
+- количество запросов к Telegram API по методам;
+- пиковый объём резидентной памяти процесса.
+
+Запуск из корня репозитория:
+    python -m benchmarks.replay --synthetic 20000
+    python -m benchmarks.replay --synthetic 20000 --save updates.jsonl
+    python -m benchmarks.replay updates.jsonl --config config.json
+
+Задержка перед отправкой сообщений бота (bot_message_delay_seconds)
+при воспроизведении обнуляется, иначе она определяла бы время обработки.
+"""
+import argparse
+import asyncio
+import dataclasses
+import itertools
+import json
+import logging
+import os
+import random
+import tempfile
+import time
+from collections import Counter
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional
+
+import aiosqlite
+from aiogram import Bot, Dispatcher
+from aiogram.client.session.base import BaseSession
+from aiogram.methods import TelegramMethod
+from aiogram.types import ChatFullInfo, Message, Update
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+from config import Config
+from main import ConfigMiddleware
+from db import operations as db_operations
+from db.writer import WriteBehindWriter
+from handlers.message_handlers import message_router
+from handlers.callbacks import callbacks_router
+
+# Параметры синтетического потока
+SYNTHETIC_CHATS = 5
+SYNTHETIC_USERS = 300
+SYNTHETIC_FIRST_CHAT_ID = -1001000000000
+SYNTHETIC_ADMIN_CHAT_ID = -1009999999999
+BURST_PROBABILITY = 0.3  # Вероятность, что сообщение написал автор предыдущего сообщения в чате
+REPLY_PROBABILITY = 0.5
+SELF_REPLY_PROBABILITY = 0.2
+LONG_MESSAGE_PROBABILITY = 0.05
+MEDIA_GROUP_PROBABILITY = 0.03
+
+# Имена функций sqlite3, вызовы которых считаются операциями с базой
+_SQL_STATEMENTS = {"execute", "executemany", "executescript"}
+
+
+class FakeSession(BaseSession):
+    """Сессия бота, отвечающая на запросы к Telegram API без обращения к сети"""
+
+    def __init__(self):
+        super().__init__()
+        self.calls: Counter = Counter()
+        self._message_ids = itertools.count(10_000_000)
+
+    async def make_request(self, bot: Bot, method: TelegramMethod, timeout: Optional[int] = None) -> Any:
+        self.calls[type(method).__name__] += 1
+        returning = method.__returning__
+        chat_id = getattr(method, "chat_id", None) or 0
+
+        if returning is Message:
+            return Message.model_validate({
+                "message_id": next(self._message_ids),
+                "date": int(time.time()),
+                "chat": {"id": chat_id, "type": "supergroup"},
+                "text": getattr(method, "text", None)
+            }, context={"bot": bot})
+        if returning is ChatFullInfo:
+            # Обязательные поля ChatFullInfo меняются от версии к версии API,
+            # обработчику нужен только linked_chat_id
+            return ChatFullInfo.model_construct(id=chat_id, type="supergroup", linked_chat_id=None)
+        return True
+
+    async def close(self) -> None:
+        pass
+
+    async def stream_content(self, url, headers=None, timeout=30, chunk_size=65536, raise_for_status=True):
+        yield b""
+
+
+@contextmanager
+def count_db_operations() -> Iterator[Counter]:
+    """Считает SQL-запросы и коммиты всех соединений aiosqlite"""
+    counters: Counter = Counter()
+    original = aiosqlite.Connection._execute
+
+    async def _execute(self, fn, *args, **kwargs):
+        name = getattr(fn, "__name__", "")
+        if name in _SQL_STATEMENTS:
+            counters["statements"] += 1
+        elif name == "commit":
+            counters["commits"] += 1
+        return await original(self, fn, *args, **kwargs)
+
+    # Соединение потока пакетной записи - обычное sqlite3, его запросы считаются через trace callback
+    original_writer_connection = WriteBehindWriter._connection
+
+    def _trace(statement: str) -> None:
+        if statement == "COMMIT":
+            counters["commits"] += 1
+        else:
+            counters["statements"] += 1
+
+    def _writer_connection(self):
+        conn = original_writer_connection(self)
+        conn.set_trace_callback(_trace)
+        return conn
+
+    aiosqlite.Connection._execute = _execute
+    WriteBehindWriter._connection = _writer_connection
+    try:
+        yield counters
+    finally:
+        aiosqlite.Connection._execute = original
+        WriteBehindWriter._connection = original_writer_connection
+
+
+def generate_updates(count: int, seed: int = 1) -> List[Dict[str, Any]]:
+    """Генерирует синтетический поток сообщений в группах"""
+    rnd = random.Random(seed)
+    chats = [SYNTHETIC_FIRST_CHAT_ID - i for i in range(SYNTHETIC_CHATS)]
+    # chat_id -> [(message_id, user_id)] последних сообщений для реплаев
+    recent: Dict[int, List] = {chat_id: [] for chat_id in chats}
+    next_message_id: Dict[int, int] = {chat_id: 1 for chat_id in chats}
+    media_group = None
+
+    updates = []
+    for update_id in range(1, count + 1):
+        chat_id = rnd.choice(chats)
+        history = recent[chat_id]
+        if history and rnd.random() < BURST_PROBABILITY:
+            user_id = history[-1][1]
+        else:
+            user_id = rnd.randrange(1, SYNTHETIC_USERS + 1)
+        message_id = next_message_id[chat_id]
+        next_message_id[chat_id] += 1
+
+        text = "x" * 1000 if rnd.random() < LONG_MESSAGE_PROBABILITY else f"сообщение {message_id}"
+        message: Dict[str, Any] = {
+            "message_id": message_id,
+            "date": 1_700_000_000 + update_id,
+            "chat": {"id": chat_id, "type": "supergroup", "title": "replay"},
+            "from": {"id": user_id, "is_bot": False, "first_name": f"user{user_id}", "username": f"user{user_id}"},
+            "text": text
+        }
+
+        if history and rnd.random() < REPLY_PROBABILITY:
+            if rnd.random() < SELF_REPLY_PROBABILITY:
+                own = [entry for entry in history if entry[1] == user_id]
+                target = own[-1] if own else history[-1]
+            else:
+                target = rnd.choice(history)
+            message["reply_to_message"] = {
+                "message_id": target[0],
+                "date": 1_700_000_000,
+                "chat": message["chat"],
+                "from": {"id": target[1], "is_bot": False, "first_name": f"user{target[1]}"},
+                "text": "..."
+            }
+
+        # Альбом: несколько сообщений подряд с одним media_group_id
+        if media_group and media_group[0] == chat_id and media_group[2] > 0:
+            message["media_group_id"] = media_group[1]
+            message["from"] = {"id": media_group[3], "is_bot": False, "first_name": "album"}
+            media_group = (chat_id, media_group[1], media_group[2] - 1, media_group[3])
+        elif rnd.random() < MEDIA_GROUP_PROBABILITY:
+            media_group = (chat_id, f"album{update_id}", rnd.randrange(2, 6), user_id)
+            message["media_group_id"] = media_group[1]
+
+        history.append((message_id, user_id))
+        if len(history) > 50:
+            del history[0]
+        updates.append({"update_id": update_id, "message": message})
+    return updates
+
+
+def load_updates(path: str) -> List[Dict[str, Any]]:
+    """Читает обновления из JSONL-файла"""
+    with open(path, "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def save_updates(path: str, updates: List[Dict[str, Any]]) -> None:
+    with open(path, "w", encoding="utf-8") as f:
+        for update in updates:
+            f.write(json.dumps(update, ensure_ascii=False) + "\n")
+
+
+def _percentile(sorted_values: List[float], percent: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(len(sorted_values) * percent / 100))
+    return sorted_values[index]
+
+
+def _peak_rss_mb() -> Optional[float]:
+    if resource is None:
+        return None
+    # В Linux ru_maxrss измеряется в килобайтах
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+async def replay(updates: List[Dict[str, Any]], config: Config, db_dir: str) -> Dict[str, Any]:
+    """Прогоняет обновления через диспетчер и возвращает собранные метрики"""
+    db_operations.DB_PATH = os.path.join(db_dir, "replay.db")
+    await db_operations.init_db()
+
+    session = FakeSession()
+    bot = Bot(token="42:REPLAY", session=session)
+    dp = Dispatcher()
+    dp.update.outer_middleware(ConfigMiddleware(config))
+    dp.include_router(message_router)
+    dp.include_router(callbacks_router)
+
+    parsed = [Update.model_validate(update, context={"bot": bot}) for update in updates]
+    latencies = []
+
+    with count_db_operations() as db_counters:
+        started = time.perf_counter()
+        for update in parsed:
+            update_started = time.perf_counter()
+            await dp.feed_update(bot, update)
+            latencies.append(time.perf_counter() - update_started)
+        elapsed = time.perf_counter() - started
+
+    # Отменяем отложенные удаления сообщений, запланированные обработчиками
+    current = asyncio.current_task()
+    pending = [task for task in asyncio.all_tasks() if task is not current]
+    for task in pending:
+        task.cancel()
+    await asyncio.gather(*pending, return_exceptions=True)
+    await db_operations.close_connection_pool()
+
+    latencies.sort()
+    total = len(parsed) or 1
+    return {
+        "updates": len(parsed),
+        "seconds": elapsed,
+        "updates_per_second": len(parsed) / elapsed if elapsed else 0.0,
+        "p50_ms": _percentile(latencies, 50) * 1000,
+        "p95_ms": _percentile(latencies, 95) * 1000,
+        "p99_ms": _percentile(latencies, 99) * 1000,
+        "db_statements_per_update": db_counters["statements"] / total,
+        "db_commits_per_update": db_counters["commits"] / total,
+        "api_calls": dict(session.calls),
+        "peak_rss_mb": _peak_rss_mb()
+    }
+
+
+def build_config(path: str, synthetic: bool, penalties: bool) -> Config:
+    """Загружает конфигурацию и подготавливает её для воспроизведения"""
+    config = Config.from_json_file(path)
+    changes: Dict[str, Any] = {"bot_message_delay_seconds": 0}
+    if synthetic:
+        changes["allowed_groups"] = [SYNTHETIC_FIRST_CHAT_ID - i for i in range(SYNTHETIC_CHATS)]
+        changes["admin_chat_id"] = str(SYNTHETIC_ADMIN_CHAT_ID)
+        changes["admin_ids"] = []
+    if penalties:
+        changes["features"] = {**config.features, "violation_counter": True, "penalties": True}
+    # replace заново вызывает __post_init__, поэтому политика компилируется с новыми значениями
+    return dataclasses.replace(config, **changes)
+
+
+def print_report(metrics: Dict[str, Any]) -> None:
+    print(f"обновлений:                {metrics['updates']}")
+    print(f"время:                     {metrics['seconds']:.2f} с")
+    print(f"пропускная способность:    {metrics['updates_per_second']:,.0f} обновлений/с")
+    print(f"задержка p50/p95/p99:      "
+          f"{metrics['p50_ms']:.3f} / {metrics['p95_ms']:.3f} / {metrics['p99_ms']:.3f} мс")
+    print(f"SQL-запросов на обновление: {metrics['db_statements_per_update']:.3f}")
+    print(f"коммитов на обновление:    {metrics['db_commits_per_update']:.3f}")
+    print(f"запросы к Telegram API:    {metrics['api_calls']}")
+    if metrics["peak_rss_mb"] is not None:
+        print(f"пиковая память (RSS):      {metrics['peak_rss_mb']:.1f} МБ")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Воспроизведение обновлений через обработчики бота")
+    parser.add_argument("input", nargs="?", help="JSONL-файл с обновлениями")
+    parser.add_argument("--synthetic", type=int, default=0, help="сгенерировать указанное количество обновлений")
+    parser.add_argument("--save", help="сохранить сгенерированные обновления в JSONL-файл")
+    parser.add_argument("--config", default="config.example.json", help="файл конфигурации")
+    parser.add_argument("--penalties", action="store_true", help="включить счетчик нарушений и наказания")
+    parser.add_argument("--log-level", default="WARNING", help="уровень логирования при воспроизведении")
+    args = parser.parse_args()
+
+    if not args.input and not args.synthetic:
+        parser.error("укажите JSONL-файл или --synthetic N")
+
+    logging.getLogger().setLevel(args.log_level)
+
+    updates = load_updates(args.input) if args.input else generate_updates(args.synthetic)
+    if args.save:
+        save_updates(args.save, updates)
+
+    config = build_config(args.config, synthetic=not args.input, penalties=args.penalties)
+    with tempfile.TemporaryDirectory() as db_dir:
+        metrics = asyncio.run(replay(updates, config, db_dir))
+    print_report(metrics)
+
+
+if __name__ == "__main__":
+    main()
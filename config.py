@@ -1,6 +1,10 @@
 import json
-from dataclasses import dataclass
-from typing import Dict, List, Optional, Any
+from bisect import bisect_right
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Any, FrozenSet, Tuple
+
+from data.texts import TEXTS
+from data.admin_texts import get_penalty_descriptions
 
 
 @dataclass
@@ -29,6 +33,95 @@ class ViolationRule:
     violations_before_penalty: int  # Сколько раз нужно нарушить до penalties
 
 
+def _ceil_minutes(seconds: Optional[int]) -> int:
+    """Переводит секунды в минуты с округлением вверх, но не меньше одной минуты"""
+    return max(1, ((seconds or 0) + 59) // 60)
+
+
+@dataclass(frozen=True)
+class CompiledPolicy:
+    """Неизменяемые параметры конфигурации, заранее подготовленные для горячего пути"""
+    admin_chat_id: int  # ID админ-чата без топика
+    admin_thread_id: Optional[int]  # ID топика в админ-чате, если задан
+    allowed_groups: FrozenSet[int]
+    admin_ids: FrozenSet[int]
+    penalty_thresholds: Tuple[int, ...]  # Пороги наказаний по возрастанию
+    penalty_types: Tuple[str, ...]  # Наказания, соответствующие порогам
+    penalty_descriptions: Dict[str, str]
+    delete_warning: str  # Предупреждение об отложенном удалении сообщения
+    violation_texts: Dict[str, str]  # Уведомления о нарушениях с подставленными константами
+    violation_texts_no_delete_warning: Dict[str, str]
+    mute_minutes: int
+    temp_ban_minutes: int
+
+    @property
+    def admin_chat_target(self) -> Tuple[int, Optional[int]]:
+        """Возвращает пару (chat_id, message_thread_id) для отправки в админ-чат"""
+        return self.admin_chat_id, self.admin_thread_id
+
+    def current_penalty(self, count: int) -> Optional[str]:
+        """Возвращает наказание для указанного количества нарушений"""
+        index = bisect_right(self.penalty_thresholds, count)
+        return self.penalty_types[index - 1] if index else None
+
+    def next_penalty(self, count: int) -> Tuple[Optional[int], Optional[str]]:
+        """Возвращает ближайший порог больше count и наказание за него"""
+        index = bisect_right(self.penalty_thresholds, count)
+        if index < len(self.penalty_thresholds):
+            return self.penalty_thresholds[index], self.penalty_types[index]
+        return None, None
+
+    def violation_text(self, violation_type: str, name: str, with_delete_warning: bool = True) -> Optional[str]:
+        """Формирует уведомление о нарушении для пользователя"""
+        texts = self.violation_texts if with_delete_warning else self.violation_texts_no_delete_warning
+        template = texts.get(violation_type)
+        return template.format(name=name) if template else None
+
+    @staticmethod
+    def from_config(config: "Config") -> "CompiledPolicy":
+        admin_chat = str(config.admin_chat_id)
+        if '_' in admin_chat:
+            chat_id, thread_id = admin_chat.split('_')
+            admin_chat_id, admin_thread_id = int(chat_id), int(thread_id)
+        else:
+            admin_chat_id, admin_thread_id = int(admin_chat), None
+
+        # sorted устойчива, поэтому при совпадающих порогах побеждает последний, как и раньше
+        ladder = sorted(((int(threshold), penalty) for threshold, penalty in config.penalties.items()),
+                        key=lambda x: x[0])
+
+        delete_warning = ""
+        if config.delete_violationg_user_messages and config.violationg_user_messages_lifetime_seconds > 0:
+            delete_warning = TEXTS["delete_warning"].format(seconds=config.violationg_user_messages_lifetime_seconds)
+
+        def render(warning: str) -> Dict[str, str]:
+            # Подставляем всё, кроме имени пользователя
+            return {
+                "no_reply": TEXTS["no_reply"].format(name="{name}", delete_warning=warning),
+                "double_reply": TEXTS["double_reply"].format(name="{name}", delete_warning=warning),
+                "self_reply": TEXTS["self_reply"].format(
+                    name="{name}",
+                    minutes=_ceil_minutes(config.reply_cooldown_seconds),
+                    delete_warning=warning
+                )
+            }
+
+        return CompiledPolicy(
+            admin_chat_id=admin_chat_id,
+            admin_thread_id=admin_thread_id,
+            allowed_groups=frozenset(config.allowed_groups),
+            admin_ids=frozenset(config.admin_ids),
+            penalty_thresholds=tuple(threshold for threshold, _ in ladder),
+            penalty_types=tuple(penalty for _, penalty in ladder),
+            penalty_descriptions=get_penalty_descriptions(config),
+            delete_warning=delete_warning,
+            violation_texts=render(delete_warning),
+            violation_texts_no_delete_warning=render(""),
+            mute_minutes=_ceil_minutes(config.mute_duration_seconds),
+            temp_ban_minutes=_ceil_minutes(config.temp_ban_duration_seconds)
+        )
+
+
 @dataclass
 class Config:
     # Основные параметры бота
@@ -71,9 +164,25 @@ class Config:
     # Настройки логирования
     logging: LoggingConfig
 
+    # Настройки производительности
+    cache_cleanup_budget_ms: float = 5  # Максимальная пауза цикла событий при очистке кэшей
+    db_write_flush_interval_ms: float = 0  # Время накопления пачки записей в базу перед коммитом
+    retention_chunk_size: int = 500  # Сколько устаревших строк удалять за одну операцию
+    context_format: str = "json"  # Формат хранения контекста нарушений: json или msgpack
+    send_rate_per_second: float = 30  # Общий лимит исходящих сообщений и действий бота в секунду
+    send_rate_per_chat_per_minute: float = 20  # Лимит исходящих сообщений бота в один чат в минуту
+    admin_digest_window_seconds: float = 60  # Окно объединения уведомлений админам в сводку (0 - без сводок)
+    admin_digest_individual_limit: int = 3  # Сколько уведомлений за окно отправлять отдельными сообщениями
+    update_shards: int = 16  # Количество шардов параллельной обработки обновлений
+    update_shard_queue_size: int = 1000  # Сколько обновлений может ждать в очереди одного шарда
+
+    # Скомпилированная политика, вычисляется при создании конфигурации
+    policy: CompiledPolicy = field(init=False, repr=False, compare=False)
+
     def __post_init__(self):
-        """Преобразуем admin_chat_id в строку после инициализации"""
+        """Преобразуем admin_chat_id в строку и компилируем политику после инициализации"""
         self.admin_chat_id = str(self.admin_chat_id)
+        self.policy = CompiledPolicy.from_config(self)
 
     @staticmethod
     def from_json_file(path: str) -> "Config":
@@ -146,5 +255,16 @@ class Config:
             
             data_retention_days=data.get("data_retention_days", 360),
             
-            logging=logging_config
+            logging=logging_config,
+
+            cache_cleanup_budget_ms=data.get("cache_cleanup_budget_ms", 5),
+            db_write_flush_interval_ms=data.get("db_write_flush_interval_ms", 0),
+            retention_chunk_size=data.get("retention_chunk_size", 500),
+            context_format=data.get("context_format", "json"),
+            send_rate_per_second=data.get("send_rate_per_second", 30),
+            send_rate_per_chat_per_minute=data.get("send_rate_per_chat_per_minute", 20),
+            admin_digest_window_seconds=data.get("admin_digest_window_seconds", 60),
+            admin_digest_individual_limit=data.get("admin_digest_individual_limit", 3),
+            update_shards=data.get("update_shards", 16),
+            update_shard_queue_size=data.get("update_shard_queue_size", 1000)
         )
\ No newline at end of file
@@ -38,4 +38,19 @@ ADMIN_VIOLATION_WARNING = """⚠️ <b>Нарушение правил адми
 - Однако ваши действия видны другим администраторам
 - Просим соблюдать правила чата, подавая пример участникам
 
-<b>Сообщение с нарушением</b>:<blockquote>{msg_text}</blockquote>"""
\ No newline at end of file
+<b>Сообщение с нарушением</b>:<blockquote>{msg_text}</blockquote>"""
+
+ADMIN_DIGEST = """📊 <b>{title}</b>
+<b>Тип нарушения</b>: {violation_desc} ({violation_type})
+<b>Чат</b>: {chat_id}
+<b>Нарушений за {window} с</b>: {total} (пользователей: {users})
+
+<b>Чаще всего нарушали</b>:
+{offenders}"""
+
+ADMIN_DIGEST_TITLES = {
+    False: "Сводка нарушений",
+    True: "Сводка нарушений администраторами"
+}
+
+ADMIN_DIGEST_OFFENDER = "• {user_name} (ID {user_id}): {count}"
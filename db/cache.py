@@ -0,0 +1,83 @@
+"""
+Кэш данных базы со сквозной записью (write-through).
+
+Бот - единственный, кто пишет в таблицы счетчиков и наказаний, поэтому их
+значения можно держать в памяти: функции записи обновляют кэш сразу после
+коммита, а функции чтения обращаются к базе только при промахе и заполняют
+кэш прочитанным значением.
+
+Чтение из базы и запись идут по разным соединениям, поэтому значение,
+прочитанное до записи, может вернуться уже после неё. Чтобы такое значение
+не попало в кэш, перед чтением берётся токен (номер последней записи), и
+заполнение кэша отбрасывается, если с тех пор была хотя бы одна запись.
+"""
+from typing import Any, Callable, Dict, Hashable
+
+from state.ttl_cache import TTLCache
+
+# Максимальное количество пользователей в каждом кэше
+DB_CACHE_MAX_ENTRIES = 10000
+
+# Время жизни записи кэша в секундах (страховка от рассинхронизации с базой)
+DB_CACHE_TTL = 3600
+
+# Признак промаха (None - допустимое закэшированное значение)
+MISSING = object()
+
+
+class WriteThroughCache:
+    """Ограниченный кэш значений базы, обновляемый функциями записи"""
+
+    def __init__(self, maxsize: int = DB_CACHE_MAX_ENTRIES, ttl: float = DB_CACHE_TTL):
+        self._cache = TTLCache(maxsize=maxsize, ttl=ttl, touch_on_get=True)
+        # Номер последней записи; меняется при каждом set, update, invalidate и clear
+        self._writes = 0
+        self.rejected_fills = 0
+
+    def get(self, key: Hashable, default: Any = MISSING) -> Any:
+        """Возвращает значение из кэша или default при промахе"""
+        return self._cache.get(key, default)
+
+    def read_token(self) -> int:
+        """Возвращает токен, который нужно взять перед чтением из базы"""
+        return self._writes
+
+    def fill(self, key: Hashable, value: Any, token: int) -> None:
+        """Кэширует прочитанное из базы значение, если после взятия токена не было записей"""
+        if token != self._writes:
+            self.rejected_fills += 1
+            return
+        self._cache.set(key, value)
+
+    def set(self, key: Hashable, value: Any) -> None:
+        """Сохраняет значение, записанное в базу"""
+        self._writes += 1
+        self._cache.set(key, value)
+
+    def update(self, key: Hashable, fn: Callable[[Any], Any]) -> None:
+        """Применяет fn к закэшированному значению; если значения нет, запись только учитывается"""
+        self._writes += 1
+        value = self._cache.peek(key, MISSING)
+        if value is not MISSING:
+            self._cache.set(key, fn(value))
+
+    def invalidate(self, key: Hashable) -> None:
+        """Удаляет значение, изменённое в базе"""
+        self._writes += 1
+        self._cache.pop(key, None)
+
+    def clear(self) -> None:
+        self._writes += 1
+        self._cache.clear()
+
+    def __len__(self) -> int:
+        return len(self._cache)
+
+    def stats(self) -> Dict[str, Any]:
+        """Возвращает статистику кэша и долю попаданий"""
+        stats = self._cache.stats()
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = round(stats["hits"] / lookups, 3) if lookups else 0.0
+        stats["rejected_fills"] = self.rejected_fills
+        return stats
+
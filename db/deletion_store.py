@@ -0,0 +1,46 @@
+"""
+Хранилище отложенных удалений сообщений.
+
+Таблица scheduled_deletions (WITHOUT ROWID, ключ - чат и сообщение) хранит
+только то, что нужно для удаления после перезапуска. Запись и удаление строк
+выполняются одной операцией пакетной записи на пачку изменений.
+"""
+import sqlite3
+from typing import List, Sequence, Tuple
+
+from db.pool import ConnectionPool
+from db.writer import WriteBehindWriter
+
+
+class DeletionStore:
+    """Сохраняет и загружает отложенные удаления для DeletionScheduler"""
+
+    def __init__(self, pool: ConnectionPool, writer: WriteBehindWriter):
+        self.pool = pool
+        self.writer = writer
+
+    async def load(self) -> List[Tuple[int, int, int]]:
+        """Возвращает все сохранённые удаления (chat_id, message_id, due_ts) по возрастанию срока"""
+        async with self.pool.acquire() as db:
+            cursor = await db.execute(
+                "SELECT chat_id, message_id, due_ts FROM scheduled_deletions ORDER BY due_ts"
+            )
+            rows = await cursor.fetchall()
+            await cursor.close()
+        return [tuple(row) for row in rows]
+
+    async def apply(self, saves: Sequence[Tuple[int, int, int]], removes: Sequence[Tuple[int, int]]) -> None:
+        """Сохраняет новые удаления и убирает выполненные (в этом порядке, одной операцией)"""
+        def op(conn: sqlite3.Connection) -> None:
+            if saves:
+                conn.executemany(
+                    "INSERT OR REPLACE INTO scheduled_deletions (chat_id, message_id, due_ts) VALUES (?, ?, ?)",
+                    saves
+                )
+            if removes:
+                conn.executemany(
+                    "DELETE FROM scheduled_deletions WHERE chat_id = ? AND message_id = ?",
+                    removes
+                )
+
+        await self.writer.submit(op)
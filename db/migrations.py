@@ -0,0 +1,251 @@
+"""
+Версионные миграции схемы базы данных.
+
+Номер версии схемы хранится в таблице schema_version (по строке на каждую
+применённую миграцию), а отпечаток списка миграций - в PRAGMA user_version.
+При запуске сначала сверяется отпечаток, и если он совпадает, никакие
+DDL-запросы не выполняются. Иначе по порядку применяются недостающие миграции.
+
+Миграция - это либо SQL-скрипт, который выполняется в одной транзакции вместе
+с записью номера версии, либо асинхронная функция переноса данных, которая
+сама делит работу на порции через пакетную запись; её версия записывается
+после успешного завершения, так что прерванный перенос повторяется при
+следующем запуске.
+"""
+import asyncio
+import logging
+import sqlite3
+import time
+import zlib
+from typing import Any, Awaitable, Callable, NamedTuple, Optional, Tuple
+
+import aiosqlite
+
+from db.pool import ConnectionPool
+from db.serializers import reencode_legacy_context
+from db.writer import WriteBehindWriter
+
+logger = logging.getLogger(__name__)
+
+# Сколько строк с контекстом в прежнем формате переписывать за одну операцию
+CONTEXT_MIGRATION_BATCH_SIZE = 500
+
+SCHEMA_VERSION_SCRIPT = """
+CREATE TABLE IF NOT EXISTS schema_version (
+    version INTEGER PRIMARY KEY,
+    description TEXT NOT NULL,
+    applied_at INTEGER NOT NULL
+);
+"""
+
+# Схема, которую создавали версии без миграций (IF NOT EXISTS - базы тех версий уже её содержат)
+INITIAL_SCHEMA_SCRIPT = """
+CREATE TABLE IF NOT EXISTS violations (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INTEGER NOT NULL,
+    chat_id INTEGER NOT NULL,
+    violation_type TEXT NOT NULL,
+    message_text TEXT,
+    context TEXT,
+    timestamp INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_violations_user_id ON violations(user_id);
+CREATE INDEX IF NOT EXISTS idx_violations_timestamp ON violations(timestamp);
+
+CREATE TABLE IF NOT EXISTS messages_deleted (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INTEGER NOT NULL,
+    user_name TEXT,
+    group_id INTEGER NOT NULL,
+    message_text TEXT,
+    timestamp INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_messages_user_id ON messages_deleted(user_id);
+CREATE INDEX IF NOT EXISTS idx_messages_timestamp ON messages_deleted(timestamp);
+
+CREATE TABLE IF NOT EXISTS penalties_active (
+    user_id INTEGER PRIMARY KEY,
+    user_name TEXT,
+    penalty_type TEXT NOT NULL,
+    until_date INTEGER
+);
+CREATE INDEX IF NOT EXISTS idx_penalties_until_date ON penalties_active(until_date);
+
+CREATE TABLE IF NOT EXISTS violation_counters (
+    user_id INTEGER NOT NULL,
+    violation_type TEXT NOT NULL,
+    count INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (user_id, violation_type)
+);
+
+CREATE TABLE IF NOT EXISTS users_incidents (
+    user_id INTEGER PRIMARY KEY,
+    incident_count INTEGER NOT NULL DEFAULT 0,
+    last_incident_ts INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_incidents_timestamp ON users_incidents(last_incident_ts);
+"""
+
+# Триггеры удаляли записи старше 30 дней после каждой вставки и не учитывали
+# data_retention_days; теперь это делает RetentionPurger
+DROP_CLEANUP_TRIGGERS_SCRIPT = """
+DROP TRIGGER IF EXISTS cleanup_old_violations;
+DROP TRIGGER IF EXISTS cleanup_old_messages;
+"""
+
+# get_user_violations_count и get_user_active_violations фильтруют по
+# (user_id, chat_id) и диапазону timestamp: составной индекс покрывает подсчёт
+# целиком и отдаёт строки уже упорядоченными по времени. Индекс по одному
+# user_id становится его префиксом и больше не нужен.
+VIOLATIONS_USER_CHAT_INDEX_SCRIPT = """
+CREATE INDEX IF NOT EXISTS idx_violations_user_chat_ts ON violations(user_id, chat_id, timestamp);
+DROP INDEX IF EXISTS idx_violations_user_id;
+ANALYZE;
+"""
+
+# Отложенные удаления сообщений, переживающие перезапуск бота (см. db.deletion_store)
+SCHEDULED_DELETIONS_SCRIPT = """
+CREATE TABLE IF NOT EXISTS scheduled_deletions (
+    chat_id INTEGER NOT NULL,
+    message_id INTEGER NOT NULL,
+    due_ts INTEGER NOT NULL,
+    PRIMARY KEY (chat_id, message_id)
+) WITHOUT ROWID;
+"""
+
+
+async def reencode_legacy_contexts(writer: WriteBehindWriter, batch_size: int = CONTEXT_MIGRATION_BATCH_SIZE) -> int:
+    """
+    Переписывает контекст нарушений из прежнего формата str(dict) в текущий
+
+    Строки обходятся по возрастанию id порциями, каждая порция - отдельная
+    операция пакетной записи, так что миграция большой базы не блокирует запись.
+
+    Returns:
+        Количество переписанных строк
+    """
+    def _rewrite_batch(after_id: int):
+        def op(conn: sqlite3.Connection) -> Tuple[int, int]:
+            rows = conn.execute(
+                """
+                SELECT id, context FROM violations
+                WHERE id > ? AND typeof(context) = 'text'
+                ORDER BY id LIMIT ?
+                """,
+                (after_id, batch_size)
+            ).fetchall()
+            conn.executemany(
+                "UPDATE violations SET context = ? WHERE id = ?",
+                [(reencode_legacy_context(context), row_id) for row_id, context in rows]
+            )
+            return len(rows), rows[-1][0] if rows else after_id
+        return op
+
+    migrated = 0
+    last_id = 0
+    while True:
+        count, last_id = await writer.submit(_rewrite_batch(last_id))
+        migrated += count
+        if count < batch_size:
+            break
+        await asyncio.sleep(0)
+
+    if migrated:
+        logger.info(f"Контекст нарушений переведён в новый формат: {migrated} строк")
+    return migrated
+
+
+class Migration(NamedTuple):
+    version: int
+    description: str
+    script: Optional[str] = None  # SQL, выполняемый в одной транзакции
+    run: Optional[Callable[[WriteBehindWriter], Awaitable[Any]]] = None  # Перенос данных порциями
+
+
+MIGRATIONS: Tuple[Migration, ...] = (
+    Migration(1, "Начальная схема", script=INITIAL_SCHEMA_SCRIPT),
+    Migration(2, "Удаление триггеров очистки старых записей", script=DROP_CLEANUP_TRIGGERS_SCRIPT),
+    Migration(3, "Составной индекс нарушений по пользователю, чату и времени", script=VIOLATIONS_USER_CHAT_INDEX_SCRIPT),
+    Migration(4, "Перевод контекста нарушений в формат db.serializers", run=reencode_legacy_contexts),
+    Migration(5, "Таблица отложенных удалений сообщений", script=SCHEDULED_DELETIONS_SCRIPT),
+)
+
+LATEST_VERSION = MIGRATIONS[-1].version
+
+
+def schema_fingerprint(migrations: Tuple[Migration, ...] = MIGRATIONS) -> int:
+    """Возвращает отпечаток списка миграций: меняется при добавлении или изменении любой из них"""
+    digest = zlib.crc32(repr([tuple(migration[:3]) for migration in migrations]).encode("utf-8"))
+    # PRAGMA user_version - знаковое 32-битное число
+    return digest & 0x7FFFFFFF
+
+
+async def _read_schema_version(db: aiosqlite.Connection) -> int:
+    try:
+        cursor = await db.execute("SELECT MAX(version) FROM schema_version")
+    except sqlite3.OperationalError:
+        # Таблицы версий нет: новая база или база версии без миграций
+        return 0
+    row = await cursor.fetchone()
+    await cursor.close()
+    return row[0] or 0
+
+
+async def get_schema_version(pool: ConnectionPool) -> int:
+    """Возвращает номер последней применённой миграции (0 для новой базы)"""
+    async with pool.acquire() as db:
+        return await _read_schema_version(db)
+
+
+async def apply_migrations(
+    pool: ConnectionPool,
+    writer: WriteBehindWriter,
+    migrations: Tuple[Migration, ...] = MIGRATIONS
+) -> int:
+    """
+    Применяет миграции новее текущей версии схемы
+
+    Отпечаток применённого списка миграций хранится в PRAGMA user_version, то
+    есть в заголовке файла базы. Если он совпадает с текущим, схема актуальна
+    и проверка обходится одним запросом без чтения таблиц. Иначе сверяется
+    schema_version и применяются недостающие миграции. Вся работа идёт через
+    одно соединение пула.
+
+    Returns:
+        Количество применённых миграций
+    """
+    fingerprint = schema_fingerprint(migrations)
+    async with pool.acquire() as db:
+        async with db.execute("PRAGMA user_version") as cursor:
+            if (await cursor.fetchone())[0] == fingerprint:
+                return 0
+
+        current = await _read_schema_version(db)
+        pending = [migration for migration in migrations if migration.version > current]
+        if pending:
+            await db.executescript(SCHEMA_VERSION_SCRIPT)
+
+        for migration in pending:
+            started = time.perf_counter()
+            # executescript не принимает параметры, описание экранируется вручную
+            description = migration.description.replace("'", "''")
+            record = (
+                f"INSERT INTO schema_version (version, description, applied_at) "
+                f"VALUES ({migration.version}, '{description}', {int(time.time())});"
+            )
+            if migration.run is not None:
+                await migration.run(writer)
+                await db.executescript(record)
+            else:
+                # Скрипт и запись версии в одной транзакции: при ошибке пул откатит её при возврате соединения
+                await db.executescript(f"BEGIN;\n{migration.script}\n{record}\nCOMMIT;")
+            logger.info(
+                f"Применена миграция {migration.version}: {migration.description} "
+                f"за {(time.perf_counter() - started) * 1000:.1f} мс"
+            )
+
+        await db.execute(f"PRAGMA user_version = {fingerprint}")
+
+    if not pending:
+        logger.debug(f"Схема базы данных актуальна (версия {current})")
+    return len(pending)
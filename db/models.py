@@ -10,7 +10,7 @@ class Violation:
     chat_id: int
     violation_type: str
     message_text: str
-    context: Optional[str]  # хранится как строка в БД
+    context: Optional[bytes]  # хранится в БД в формате db.serializers
     timestamp: int  # хранится как UNIX timestamp
 
 @dataclass
@@ -43,4 +43,11 @@ class UserIncidents:
     """Модель счетчика инцидентов пользователя"""
     user_id: int  # PRIMARY KEY
     incident_count: int  # NOT NULL DEFAULT 0
-    last_incident_ts: int  # NOT NULL, хранится как UNIX timestamp 
\ No newline at end of file
+    last_incident_ts: int  # NOT NULL, хранится как UNIX timestamp 
+
+@dataclass(frozen=True)
+class ViolationOutcome:
+    """Результат записи нарушения: состояние счетчиков сразу после неё"""
+    type_count: int  # Значение счетчика нарушений этого типа, достигнутое записью
+    incident_count: int  # Количество инцидентов пользователя после записи
+    threshold_crossed: bool  # Достигнут ли порог, после которого засчитывается инцидент
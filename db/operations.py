@@ -1,99 +1,73 @@
 import asyncio
 import logging
+import sqlite3
 import time
-import os
 from datetime import datetime, timedelta
 from typing import List, Optional, Dict, Any, Callable
 from functools import wraps
 
 import aiosqlite
 from config import Config
+from db.migrations import apply_migrations
+from db.cache import MISSING, WriteThroughCache
+from db.deletion_store import DeletionStore
+from db.models import ViolationOutcome
+from db.penalty_expiry import PenaltyExpiryScheduler
+from db.pool import ConnectionPool
+from db.retention import RetentionPurger
+from db.serializers import decode_context, encode_context
+from db.writer import WriteBehindWriter
 
 logger = logging.getLogger(__name__)
 
 DB_PATH = "violations.db"
 
-CREATE_TABLES_SCRIPT = """
-CREATE TABLE IF NOT EXISTS violations (
-    id INTEGER PRIMARY KEY AUTOINCREMENT,
-    user_id INTEGER NOT NULL,
-    chat_id INTEGER NOT NULL,
-    violation_type TEXT NOT NULL,
-    message_text TEXT,
-    context TEXT,
-    timestamp INTEGER NOT NULL
-);
-CREATE INDEX IF NOT EXISTS idx_violations_user_id ON violations(user_id);
-CREATE INDEX IF NOT EXISTS idx_violations_timestamp ON violations(timestamp);
-
-CREATE TABLE IF NOT EXISTS messages_deleted (
-    id INTEGER PRIMARY KEY AUTOINCREMENT,
-    user_id INTEGER NOT NULL,
-    user_name TEXT,
-    group_id INTEGER NOT NULL,
-    message_text TEXT,
-    timestamp INTEGER NOT NULL
-);
-CREATE INDEX IF NOT EXISTS idx_messages_user_id ON messages_deleted(user_id);
-CREATE INDEX IF NOT EXISTS idx_messages_timestamp ON messages_deleted(timestamp);
-
-CREATE TABLE IF NOT EXISTS penalties_active (
-    user_id INTEGER PRIMARY KEY,
-    user_name TEXT,
-    penalty_type TEXT NOT NULL,
-    until_date INTEGER
-);
-CREATE INDEX IF NOT EXISTS idx_penalties_until_date ON penalties_active(until_date);
-
-CREATE TABLE IF NOT EXISTS violation_counters (
-    user_id INTEGER NOT NULL,
-    violation_type TEXT NOT NULL,
-    count INTEGER NOT NULL DEFAULT 0,
-    PRIMARY KEY (user_id, violation_type)
-);
-
-CREATE TABLE IF NOT EXISTS users_incidents (
-    user_id INTEGER PRIMARY KEY,
-    incident_count INTEGER NOT NULL DEFAULT 0,
-    last_incident_ts INTEGER NOT NULL
-);
-CREATE INDEX IF NOT EXISTS idx_incidents_timestamp ON users_incidents(last_incident_ts);
-
--- Добавляем триггер для автоматической очистки старых записей
-CREATE TRIGGER IF NOT EXISTS cleanup_old_violations
-AFTER INSERT ON violations
-BEGIN
-    DELETE FROM violations 
-    WHERE timestamp < (strftime('%s', 'now') - 2592000); -- 30 дней
-END;
-
-CREATE TRIGGER IF NOT EXISTS cleanup_old_messages
-AFTER INSERT ON messages_deleted
-BEGIN
-    DELETE FROM messages_deleted 
-    WHERE timestamp < (strftime('%s', 'now') - 2592000); -- 30 дней
-END;
-"""
-
-# Создаём пул соединений
-_connection_pool = []
-MAX_POOL_SIZE = 5
-
-async def get_db_connection():
-    """Получает соединение из пула или создает новое"""
-    if not _connection_pool:
-        conn = await aiosqlite.connect(DB_PATH)
-        await conn.execute("PRAGMA journal_mode=WAL")  # Включаем WAL режим
-        await conn.execute("PRAGMA synchronous=NORMAL")  # Оптимизируем производительность
-        return conn
-    return _connection_pool.pop()
-
-async def release_connection(conn):
-    """Возвращает соединение в пул"""
-    if len(_connection_pool) < MAX_POOL_SIZE:
-        _connection_pool.append(conn)
-    else:
-        await conn.close()
+# Как часто запускать удаление устаревших записей, в секундах
+RETENTION_INTERVAL_SECONDS = 3600
+
+# Общий пул соединений, через который работают все функции модуля
+db_pool = ConnectionPool(DB_PATH)
+
+# Пакетная запись нарушений и удалённых сообщений
+db_writer = WriteBehindWriter(db_pool)
+
+# Отложенные удаления сообщений, сохраняемые между перезапусками
+deletion_store = DeletionStore(db_pool, db_writer)
+
+# Порционное удаление записей старше срока хранения
+retention_purger = RetentionPurger(db_writer)
+
+# Кэши со сквозной записью: функции записи этого модуля обновляют их после коммита
+incidents_cache = WriteThroughCache()  # user_id -> количество инцидентов
+counters_cache = WriteThroughCache()  # user_id -> {тип нарушения: значение счетчика}
+penalties_cache = WriteThroughCache()  # user_id -> (тип наказания, until_date) или None
+
+def _forget_expired_penalties(user_ids: List[int]) -> None:
+    for user_id in user_ids:
+        penalties_cache.invalidate(user_id)
+
+# Снятие наказаний в момент окончания
+penalty_expiry = PenaltyExpiryScheduler(db_pool, db_writer, on_expired=_forget_expired_penalties)
+
+def db_cache_stats() -> Dict[str, Dict[str, Any]]:
+    """Возвращает статистику кэшей счетчиков и наказаний"""
+    return {
+        "incidents": incidents_cache.stats(),
+        "counters": counters_cache.stats(),
+        "penalties": penalties_cache.stats()
+    }
+
+def clear_db_caches() -> None:
+    """Очищает кэши счетчиков и наказаний"""
+    incidents_cache.clear()
+    counters_cache.clear()
+    penalties_cache.clear()
+
+async def close_connection_pool() -> None:
+    """Записывает отложенные операции и закрывает соединения, оставшиеся в пуле"""
+    await penalty_expiry.stop()
+    await db_writer.stop()
+    await db_pool.close()
 
 async def retry_on_locked(func: Callable, *args, **kwargs) -> Any:
     """
@@ -116,32 +90,36 @@ async def retry_on_locked(func: Callable, *args, **kwargs) -> Any:
 async def init_db() -> None:
     """Инициализирует базу данных"""
     logger.info("Инициализация базы данных...")
+    started = time.perf_counter()
     
-    # Убедимся, что директория существует
-    db_dir = os.path.dirname(DB_PATH)
-    if db_dir and not os.path.exists(db_dir):
-        os.makedirs(db_dir)
-
-    # Создаём соединение и таблицы
-    async with aiosqlite.connect(DB_PATH) as db:
-        await db.executescript(CREATE_TABLES_SCRIPT)
-        await db.commit()
-
-    # Проверяем, что таблицы действительно созданы
-    async with aiosqlite.connect(DB_PATH) as db:
-        cursor = await db.execute("SELECT name FROM sqlite_master WHERE type='table'")
-        tables = await cursor.fetchall()
-        await cursor.close()
-        
-        required_tables = {'violations', 'messages_deleted', 'penalties_active', 
-                          'violation_counters', 'users_incidents'}
-        existing_tables = {table[0] for table in tables}
-        
-        if not required_tables.issubset(existing_tables):
-            missing_tables = required_tables - existing_tables
-            raise Exception(f"Failed to create tables: {missing_tables}")
+    # Путь к базе мог быть изменён после создания пула
+    if db_pool.path != DB_PATH:
+        await db_pool.reopen(DB_PATH)
+    clear_db_caches()
+
+    # Применяем недостающие миграции (директория базы создаётся пулом при открытии соединения)
+    applied = await apply_migrations(db_pool, db_writer)
+
+    if applied:
+        # Проверяем, что таблицы действительно созданы
+        async with db_pool.acquire() as db:
+            cursor = await db.execute("SELECT name FROM sqlite_master WHERE type='table'")
+            tables = await cursor.fetchall()
+            await cursor.close()
+            
+            required_tables = {'violations', 'messages_deleted', 'penalties_active', 
+                              'violation_counters', 'users_incidents', 'schema_version',
+                              'scheduled_deletions'}
+            existing_tables = {table[0] for table in tables}
             
-    logger.info("База данных инициализирована успешно")
+            if not required_tables.issubset(existing_tables):
+                missing_tables = required_tables - existing_tables
+                raise Exception(f"Failed to create tables: {missing_tables}")
+            
+    logger.info(
+        f"База данных инициализирована успешно за {(time.perf_counter() - started) * 1000:.1f} мс "
+        f"(применено миграций: {applied})"
+    )
 
 async def add_violation(
     user_id: int,
@@ -156,8 +134,7 @@ async def add_violation(
     now_ts = int(time.time())
     
     async def _add():
-        conn = await get_db_connection()
-        try:
+        async with db_pool.acquire() as conn:
             async with conn.cursor() as cursor:
                 # Записываем нарушение
                 await cursor.execute(
@@ -165,7 +142,7 @@ async def add_violation(
                     INSERT INTO violations (user_id, chat_id, violation_type, message_text, context, timestamp)
                     VALUES (?, ?, ?, ?, ?, ?)
                     """,
-                    (user_id, chat_id, violation_type, message_text, str(context) if context else None, now_ts)
+                    (user_id, chat_id, violation_type, message_text, encode_context(context), now_ts)
                 )
                 violation_id = cursor.lastrowid
                 
@@ -185,11 +162,9 @@ async def add_violation(
                 "chat_id": row[2],
                 "violation_type": row[3],
                 "message_text": row[4],
-                "context": eval(row[5]) if row[5] else None,
+                "context": decode_context(row[5]),
                 "timestamp": datetime.fromtimestamp(row[6])
             }
-        finally:
-            await release_connection(conn)
     
     return await retry_on_locked(_add)
 
@@ -199,7 +174,7 @@ async def get_user_violations_count(user_id: int, chat_id: int) -> int:
     
     one_day_ago = int(time.time()) - 86400  # 24 часа в секундах
     
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with db_pool.acquire() as db:
         async with db.execute(
             """
             SELECT COUNT(*) FROM violations
@@ -220,7 +195,7 @@ async def get_user_active_violations(user_id: int, chat_id: int) -> List[Dict]:
     one_day_ago = int(time.time()) - 86400  # 24 часа в секундах
     violations = []
     
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with db_pool.acquire() as db:
         async with db.execute(
             """
             SELECT * FROM violations
@@ -237,7 +212,7 @@ async def get_user_active_violations(user_id: int, chat_id: int) -> List[Dict]:
                     "chat_id": row[2],
                     "violation_type": row[3],
                     "message_text": row[4],
-                    "context": eval(row[5]) if row[5] else None,
+                    "context": decode_context(row[5]),
                     "timestamp": datetime.fromtimestamp(row[6])
                 })
                 
@@ -245,56 +220,52 @@ async def get_user_active_violations(user_id: int, chat_id: int) -> List[Dict]:
     return violations
 
 async def cleanup_old_violations(config: Config) -> None:
-    """Удаляет старые нарушения из базы данных"""
+    """Периодически удаляет старые нарушения и удалённые сообщения"""
     logger.info("Запуск задачи очистки старых нарушений")
     
     while True:
         try:
-            async with aiosqlite.connect(DB_PATH) as db:
-                now = int(time.time())
-                cutoff_ts = now - (config.data_retention_days * 86400)  # конвертируем дни в секунды
+            now = int(time.time())
+            cutoff_ts = now - (config.data_retention_days * 86400)  # конвертируем дни в секунды
+
+            # Старые нарушения и удаленные сообщения удаляются порциями
+            # (просроченные наказания снимает penalty_expiry в момент окончания)
+            purged = await retention_purger.purge(cutoff_ts)
+            violations_deleted = purged.get("violations", 0)
+            messages_deleted = purged.get("messages_deleted", 0)
                 
-                # Удаляем старые нарушения
-                cursor = await db.execute(
-                    "DELETE FROM violations WHERE timestamp < ?",
-                    (cutoff_ts,)
-                )
-                violations_deleted = cursor.rowcount
-
-                # Удаляем старые удаленные сообщения
-                cursor = await db.execute(
-                    "DELETE FROM messages_deleted WHERE timestamp < ?",
-                    (cutoff_ts,)
-                )
-                messages_deleted = cursor.rowcount
-
-                # Удаляем просроченные наказания
-                cursor = await db.execute(
-                    "DELETE FROM penalties_active WHERE until_date < ? AND until_date IS NOT NULL",
-                    (now,)
+            if violations_deleted > 0 or messages_deleted > 0:
+                logger.info(
+                    f"Удалено старых записей: "
+                    f"нарушений - {violations_deleted}, "
+                    f"сообщений - {messages_deleted}, "
+                    f"за {retention_purger.last_run_ms:.1f} мс"
                 )
-                penalties_deleted = cursor.rowcount
-
-                await db.commit()
+            else:
+                logger.debug("Старых записей для удаления не найдено")
                 
-                if violations_deleted > 0 or messages_deleted > 0 or penalties_deleted > 0:
-                    logger.info(
-                        f"Удалено старых записей: "
-                        f"нарушений - {violations_deleted}, "
-                        f"сообщений - {messages_deleted}, "
-                        f"наказаний - {penalties_deleted}"
-                    )
-                else:
-                    logger.debug("Старых записей для удаления не найдено")
-                    
         except Exception as e:
             logger.error(f"Ошибка при очистке старых записей: {str(e)}")
             
-        # Ждем 24 часа перед следующей проверкой
-        await asyncio.sleep(86400)
+        await asyncio.sleep(RETENTION_INTERVAL_SECONDS)
+
+async def record_violation(
+    user_id: int,
+    user_name: str,
+    group_id: int,
+    violation_type: str,
+    config: Config
+) -> Optional[ViolationOutcome]:
+    """
+    Записывает нарушение и обновляет incidents если нужно
 
-async def record_violation(user_id: int, user_name: str, group_id: int, violation_type: str, config: Config) -> None:
-    """Записывает нарушение и обновляет incidents если нужно"""
+    Запись в лог, увеличение счетчика типа нарушения и инцидентов выполняются
+    одной операцией в одной транзакции; счетчики возвращаются через RETURNING,
+    поэтому решение о наказании принимается по актуальным значениям.
+
+    Returns:
+        Состояние счетчиков после записи или None, если правило отключено
+    """
     logger.debug(f"Запись нарушения: user_id={user_id}, type={violation_type}")
     
     now_ts = int(time.time())
@@ -303,94 +274,112 @@ async def record_violation(user_id: int, user_name: str, group_id: int, violatio
     rule = config.violation_rules.get(violation_type)
     if not rule or not rule.enabled:
         logger.debug(f"Правило {violation_type} отключено или не существует")
-        return
+        return None
 
-    async def _record():
-        conn = await get_db_connection()
-        try:
-            async with conn.cursor() as cursor:
-                # Записываем нарушение в лог
-                await cursor.execute(
-                    """
-                    INSERT INTO violations (user_id, chat_id, violation_type, message_text, timestamp)
-                    VALUES (?,?,?,?,?)
-                    """,
-                    (user_id, group_id, violation_type, "", now_ts)
-                )
+    def _record(conn: sqlite3.Connection) -> ViolationOutcome:
+        # Выполняется в потоке пакетной записи, в общей транзакции
+        # Записываем нарушение в лог
+        conn.execute(
+            """
+            INSERT INTO violations (user_id, chat_id, violation_type, message_text, timestamp)
+            VALUES (?,?,?,?,?)
+            """,
+            (user_id, group_id, violation_type, "", now_ts)
+        )
 
-                # Увеличиваем счетчик конкретного типа нарушения
-                await cursor.execute(
-                    """
-                    INSERT INTO violation_counters (user_id, violation_type, count)
-                    VALUES (?, ?, 1)
-                    ON CONFLICT(user_id, violation_type) DO UPDATE
-                    SET count = count + 1
-                    RETURNING count
-                    """,
-                    (user_id, violation_type)
-                )
-                
-                row = await cursor.fetchone()
-                current_count = row[0] if row else 1
-
-                # Если достигли порога для этого типа нарушения и оно считается как violation
-                if (rule.count_as_violation and 
-                    current_count >= rule.violations_before_penalty):
-                    
-                    # Сбрасываем счетчик этого типа нарушения
-                    await cursor.execute(
-                        """
-                        UPDATE violation_counters
-                        SET count = 0
-                        WHERE user_id=? AND violation_type=?
-                        """,
-                        (user_id, violation_type)
-                    )
-                    
-                    # Обновляем общий счетчик инцидентов атомарно
-                    await cursor.execute(
-                        """
-                        INSERT INTO users_incidents (user_id, incident_count, last_incident_ts)
-                        VALUES (?, 1, ?)
-                        ON CONFLICT(user_id) DO UPDATE
-                        SET incident_count = incident_count + 1,
-                            last_incident_ts = ?
-                        """,
-                        (user_id, now_ts, now_ts)
-                    )
+        # Увеличиваем счетчик конкретного типа нарушения
+        # (fetchall дочитывает RETURNING до конца, иначе незавершённый запрос не даст снять точку сохранения)
+        rows = conn.execute(
+            """
+            INSERT INTO violation_counters (user_id, violation_type, count)
+            VALUES (?, ?, 1)
+            ON CONFLICT(user_id, violation_type) DO UPDATE
+            SET count = count + 1
+            RETURNING count
+            """,
+            (user_id, violation_type)
+        ).fetchall()
+        current_count = rows[0][0] if rows else 1
 
-            await conn.commit()
-            logger.info(f"Нарушение записано: user_id={user_id}, type={violation_type}, count={current_count}")
-        finally:
-            await release_connection(conn)
+        # Если достигли порога для этого типа нарушения и оно считается как violation
+        threshold_crossed = rule.count_as_violation and current_count >= rule.violations_before_penalty
+        if threshold_crossed:
+            
+            # Сбрасываем счетчик этого типа нарушения
+            conn.execute(
+                """
+                UPDATE violation_counters
+                SET count = 0
+                WHERE user_id=? AND violation_type=?
+                """,
+                (user_id, violation_type)
+            )
+            
+            # Обновляем общий счетчик инцидентов атомарно
+            rows = conn.execute(
+                """
+                INSERT INTO users_incidents (user_id, incident_count, last_incident_ts)
+                VALUES (?, 1, ?)
+                ON CONFLICT(user_id) DO UPDATE
+                SET incident_count = incident_count + 1,
+                    last_incident_ts = ?
+                RETURNING incident_count
+                """,
+                (user_id, now_ts, now_ts)
+            ).fetchall()
+        else:
+            rows = conn.execute(
+                "SELECT incident_count FROM users_incidents WHERE user_id=?",
+                (user_id,)
+            ).fetchall()
+
+        incident_count = rows[0][0] if rows else 0
+        return ViolationOutcome(current_count, incident_count, threshold_crossed)
+
+    outcome = await db_writer.submit(_record)
 
-    await retry_on_locked(_record)
+    # Счетчик типа после достижения порога сброшен в базе
+    type_count = 0 if outcome.threshold_crossed else outcome.type_count
+    incidents_cache.set(user_id, outcome.incident_count)
+    counters_cache.update(user_id, lambda counters: {**counters, violation_type: type_count})
+
+    logger.info(
+        f"Нарушение записано: user_id={user_id}, type={violation_type}, count={outcome.type_count}, "
+        f"incidents={outcome.incident_count}, threshold_crossed={outcome.threshold_crossed}"
+    )
+    return outcome
 
 async def record_deleted_message(user_id: int, user_name: str, group_id: int, message_text: str) -> int:
     """Записывает удаленное сообщение"""
     logger.debug(f"Запись удаленного сообщения: user_id={user_id}")
     
     now_ts = int(time.time())
-    async with aiosqlite.connect(DB_PATH) as db:
-        cursor = await db.execute(
+
+    def _insert(conn: sqlite3.Connection) -> int:
+        # Выполняется в потоке пакетной записи, в общей транзакции
+        cursor = conn.execute(
             """
             INSERT INTO messages_deleted (user_id, user_name, group_id, message_text, timestamp)
             VALUES (?,?,?,?,?)
             """,
             (user_id, user_name, group_id, message_text, now_ts)
         )
-        deleted_msg_id = cursor.lastrowid
-        await db.commit()
-        
-        logger.info(f"Записано удаленное сообщение с ID {deleted_msg_id}")
-        return deleted_msg_id
+        return cursor.lastrowid
+
+    deleted_msg_id = await db_writer.submit(_insert)
+    logger.info(f"Записано удаленное сообщение с ID {deleted_msg_id}")
+    return deleted_msg_id
 
 async def get_incidents_count(user_id: int) -> int:
     """Возвращает текущее число инцидентов для пользователя"""
     logger.debug(f"Получение количества инцидентов: user_id={user_id}")
-    
-    conn = await get_db_connection()
-    try:
+
+    count = incidents_cache.get(user_id)
+    if count is not MISSING:
+        return count
+
+    token = incidents_cache.read_token()
+    async with db_pool.acquire() as conn:
         async with conn.cursor() as cursor:
             await cursor.execute(
                 "SELECT incident_count FROM users_incidents WHERE user_id=?",
@@ -399,17 +388,37 @@ async def get_incidents_count(user_id: int) -> int:
             row = await cursor.fetchone()
             count = row[0] if row else 0
             
-            logger.debug(f"Количество инцидентов для user_id={user_id}: {count}")
-            return count
-    finally:
-        await release_connection(conn)
+    incidents_cache.fill(user_id, count, token)
+    logger.debug(f"Количество инцидентов для user_id={user_id}: {count}")
+    return count
+
+async def get_violation_counters(user_id: int) -> Dict[str, int]:
+    """Возвращает счетчики нарушений пользователя по типам"""
+    logger.debug(f"Получение счетчиков нарушений: user_id={user_id}")
+
+    counters = counters_cache.get(user_id)
+    if counters is not MISSING:
+        return dict(counters)
+
+    token = counters_cache.read_token()
+    async with db_pool.acquire() as db:
+        cursor = await db.execute(
+            "SELECT violation_type, count FROM violation_counters WHERE user_id=?",
+            (user_id,)
+        )
+        rows = await cursor.fetchall()
+        await cursor.close()
+
+    counters = {violation_type: count for violation_type, count in rows}
+    counters_cache.fill(user_id, counters, token)
+    return dict(counters)
 
 # Функции для работы с наказаниями
 async def set_penalty(user_id: int, user_name: str, penalty_type: str, until_date: Optional[int]) -> None:
     """Устанавливает наказание для пользователя"""
     logger.debug(f"Установка наказания: user_id={user_id}, type={penalty_type}")
     
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with db_pool.acquire() as db:
         await db.execute(
             """
             INSERT INTO penalties_active (user_id, user_name, penalty_type, until_date)
@@ -422,20 +431,27 @@ async def set_penalty(user_id: int, user_name: str, penalty_type: str, until_dat
             (user_id, user_name, penalty_type, until_date)
         )
         await db.commit()
+    penalties_cache.set(user_id, (penalty_type, until_date))
+    penalty_expiry.schedule(user_id, until_date)
         
     logger.info(f"Установлено наказание {penalty_type} для user_id={user_id}")
 
 async def get_penalty(user_id: int) -> Optional[str]:
     """Получает текущее наказание пользователя"""
     logger.debug(f"Получение наказания: user_id={user_id}")
-    
-    async with aiosqlite.connect(DB_PATH) as db:
-        cursor = await db.execute(
-            "SELECT penalty_type, until_date FROM penalties_active WHERE user_id=?",
-            (user_id,)
-        )
-        row = await cursor.fetchone()
-        await cursor.close()
+
+    row = penalties_cache.get(user_id)
+    if row is MISSING:
+        token = penalties_cache.read_token()
+        async with db_pool.acquire() as db:
+            cursor = await db.execute(
+                "SELECT penalty_type, until_date FROM penalties_active WHERE user_id=?",
+                (user_id,)
+            )
+            row = await cursor.fetchone()
+            await cursor.close()
+        # Отсутствие наказания тоже кэшируется
+        penalties_cache.fill(user_id, tuple(row) if row else None, token)
         
     if row:
         ptype, until = row
@@ -449,12 +465,14 @@ async def revoke_penalty(user_id: int) -> None:
     """Отменяет наказание пользователя"""
     logger.debug(f"Отмена наказания: user_id={user_id}")
     
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with db_pool.acquire() as db:
         await db.execute(
             "DELETE FROM penalties_active WHERE user_id=?",
             (user_id,)
         )
         await db.commit()
+    penalties_cache.set(user_id, None)
+    penalty_expiry.cancel(user_id)
         
     logger.info(f"Наказание отменено для user_id={user_id}")
 
@@ -462,12 +480,13 @@ async def reset_violation_counters(user_id: int) -> None:
     """Сбрасывает все счетчики нарушений для пользователя"""
     logger.debug(f"Сброс счетчиков нарушений: user_id={user_id}")
     
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with db_pool.acquire() as db:
         await db.execute(
             "DELETE FROM violation_counters WHERE user_id=?",
             (user_id,)
         )
         await db.commit()
+    counters_cache.set(user_id, {})
         
     logger.info(f"Счетчики нарушений сброшены для user_id={user_id}")
 
@@ -475,7 +494,7 @@ async def reset_all_user_data(user_id: int) -> None:
     """Полностью сбрасывает все данные о нарушениях пользователя"""
     logger.debug(f"Полный сброс данных пользователя: user_id={user_id}")
     
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with db_pool.acquire() as db:
         # Сбрасываем счетчики отдельных нарушений
         await db.execute(
             "DELETE FROM violation_counters WHERE user_id=?",
@@ -492,6 +511,8 @@ async def reset_all_user_data(user_id: int) -> None:
             (user_id,)
         )
         await db.commit()
+    counters_cache.set(user_id, {})
+    incidents_cache.set(user_id, 0)
         
     logger.info(f"Все данные пользователя user_id={user_id} сброшены")
 
@@ -499,7 +520,7 @@ async def get_deleted_message_by_id(message_id: int) -> Optional[tuple]:
     """Получает информацию об удаленном сообщении по его ID"""
     logger.debug(f"Получение удаленного сообщения: message_id={message_id}")
     
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with db_pool.acquire() as db:
         cursor = await db.execute(
             """
             SELECT id, user_id, user_name, group_id, message_text, timestamp
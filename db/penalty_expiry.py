@@ -0,0 +1,222 @@
+"""
+Снятие истёкших наказаний точно в срок.
+
+Раньше просроченные строки penalties_active удалялись периодической очисткой
+раз в сутки, и до этого get_penalty продолжал возвращать истёкший мут или
+временный бан. Теперь моменты окончания наказаний хранятся в min-куче:
+при запуске она заполняется из базы, дальше её обновляют set_penalty и
+revoke_penalty. Фоновая задача спит ровно до ближайшего окончания, удаляет
+все наступившие наказания одной операцией записи и снова засыпает.
+
+Если запись в базу не удалась, извлечённые наказания возвращаются в кучу, и
+снятие повторяется с растущей паузой.
+
+Отмена наказания не ищет его в куче: запись остаётся и пропускается при
+извлечении, если не совпадает с текущим сроком пользователя. Когда таких
+записей становится больше, чем действующих, куча пересобирается.
+"""
+import asyncio
+import heapq
+import logging
+import sqlite3
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from db.pool import ConnectionPool
+from db.writer import WriteBehindWriter
+
+logger = logging.getLogger(__name__)
+
+# Максимальный сон между проверками: страховка от перевода системных часов
+PENALTY_EXPIRY_MAX_SLEEP = 3600
+
+# Пауза перед повтором после ошибки записи: удваивается до максимума
+PENALTY_EXPIRY_RETRY_DELAY = 1
+PENALTY_EXPIRY_RETRY_MAX_DELAY = 60
+
+
+class PenaltyExpiryScheduler:
+    """Удаляет наказания из penalties_active в момент их окончания"""
+
+    def __init__(
+        self,
+        pool: ConnectionPool,
+        writer: WriteBehindWriter,
+        on_expired: Optional[Callable[[List[int]], Any]] = None
+    ):
+        self.pool = pool
+        self.writer = writer
+        # Вызывается со списком пользователей, чьи наказания удалены
+        self.on_expired = on_expired
+        # (until_date, user_id), включая устаревшие записи
+        self._heap: List[Tuple[int, int]] = []
+        # Текущий срок наказания каждого пользователя из кучи
+        self._until: Dict[int, int] = {}
+        # Событие создаётся в работающем цикле событий
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+
+        self.scheduled = 0
+        self.expired = 0
+        self.batches = 0
+        self.rebuilds = 0
+        self.failures = 0
+
+    async def load(self) -> int:
+        """Заполняет кучу сроками наказаний из базы и возвращает их количество"""
+        async with self.pool.acquire() as db:
+            cursor = await db.execute(
+                "SELECT user_id, until_date FROM penalties_active WHERE until_date IS NOT NULL"
+            )
+            rows = await cursor.fetchall()
+            await cursor.close()
+
+        self._until = {user_id: until_date for user_id, until_date in rows}
+        self._heap = [(until_date, user_id) for user_id, until_date in self._until.items()]
+        heapq.heapify(self._heap)
+        self._wake()
+        logger.info(f"Загружено сроков наказаний: {len(self._heap)}")
+        return len(self._heap)
+
+    def schedule(self, user_id: int, until_date: Optional[int]) -> None:
+        """Учитывает новое наказание; бессрочное наказание только отменяет прежний срок"""
+        if until_date is None:
+            self.cancel(user_id)
+            return
+        self._until[user_id] = until_date
+        heapq.heappush(self._heap, (until_date, user_id))
+        self.scheduled += 1
+        # Будим задачу, только если новое наказание закончится раньше всех
+        if self._heap[0] == (until_date, user_id):
+            self._wake()
+
+    def cancel(self, user_id: int) -> None:
+        """Убирает срок наказания пользователя (запись в куче пропустится при извлечении)"""
+        if self._until.pop(user_id, None) is not None:
+            self._maybe_rebuild()
+
+    def start(self) -> asyncio.Task:
+        """Запускает фоновую задачу снятия наказаний"""
+        if self._task is None or self._task.done():
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+        return self._task
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def _wake(self) -> None:
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    def _maybe_rebuild(self) -> None:
+        if len(self._heap) > 2 * len(self._until) + 64:
+            self._heap = [(until_date, user_id) for user_id, until_date in self._until.items()]
+            heapq.heapify(self._heap)
+            self.rebuilds += 1
+
+    def _next_deadline(self) -> Optional[int]:
+        """Снимает устаревшие записи с вершины кучи и возвращает ближайший срок"""
+        heap = self._heap
+        while heap:
+            until_date, user_id = heap[0]
+            if self._until.get(user_id) == until_date:
+                return until_date
+            heapq.heappop(heap)
+        return None
+
+    def _pop_due(self, now: float) -> List[Tuple[int, int]]:
+        due = []
+        while True:
+            until_date = self._next_deadline()
+            if until_date is None or until_date > now:
+                return due
+            _, user_id = heapq.heappop(self._heap)
+            del self._until[user_id]
+            due.append((user_id, until_date))
+
+    def _restore_due(self, due: Iterable[Tuple[int, int]]) -> None:
+        """Возвращает в кучу наказания, которые не удалось снять"""
+        for user_id, until_date in due:
+            # Пока шла запись, наказание могли продлить или отменить: новый срок важнее
+            if user_id in self._until:
+                continue
+            self._until[user_id] = until_date
+            heapq.heappush(self._heap, (until_date, user_id))
+
+    async def _run(self) -> None:
+        retry_delay = PENALTY_EXPIRY_RETRY_DELAY
+        while True:
+            try:
+                self._wakeup.clear()
+                deadline = self._next_deadline()
+                if deadline is None:
+                    await self._wakeup.wait()
+                    continue
+
+                delay = deadline - time.time()
+                if delay > 0:
+                    try:
+                        await asyncio.wait_for(self._wakeup.wait(), min(delay, PENALTY_EXPIRY_MAX_SLEEP))
+                    except asyncio.TimeoutError:
+                        pass
+                    continue
+
+                due = self._pop_due(time.time())
+                if due:
+                    try:
+                        await self._expire(due)
+                    except asyncio.CancelledError:
+                        self._restore_due(due)
+                        raise
+                    except Exception as e:
+                        self._restore_due(due)
+                        self.failures += 1
+                        logger.error(
+                            f"Ошибка при снятии истёкших наказаний, повтор через {retry_delay} с: {str(e)}"
+                        )
+                        await asyncio.sleep(retry_delay)
+                        retry_delay = min(retry_delay * 2, PENALTY_EXPIRY_RETRY_MAX_DELAY)
+                        continue
+                    retry_delay = PENALTY_EXPIRY_RETRY_DELAY
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Ошибка при снятии истёкших наказаний: {str(e)}")
+                await asyncio.sleep(60)
+
+    async def _expire(self, due: Iterable[Tuple[int, int]]) -> None:
+        due = list(due)
+
+        def op(conn: sqlite3.Connection) -> int:
+            # Условие по сроку не даёт удалить наказание, которое успели продлить
+            cursor = conn.executemany(
+                "DELETE FROM penalties_active WHERE user_id = ? AND until_date = ?",
+                due
+            )
+            return cursor.rowcount
+
+        deleted = await self.writer.submit(op)
+        self.expired += deleted
+        self.batches += 1
+        if self.on_expired is not None:
+            self.on_expired([user_id for user_id, _ in due])
+        logger.info(f"Сняты истёкшие наказания: {deleted}")
+
+    def stats(self) -> Dict[str, Any]:
+        """Возвращает размер кучи и количество снятых наказаний"""
+        return {
+            "pending": len(self._until),
+            "heap_size": len(self._heap),
+            "scheduled": self.scheduled,
+            "expired": self.expired,
+            "batches": self.batches,
+            "rebuilds": self.rebuilds,
+            "failures": self.failures
+        }
@@ -0,0 +1,176 @@
+"""
+Пул соединений с базой данных SQLite.
+
+Все функции работы с базой получают соединение из одного пула вместо
+открытия нового соединения (и нового потока aiosqlite) на каждый вызов.
+PRAGMA применяются один раз при создании соединения, поэтому все соединения
+работают в одинаковом режиме (WAL, busy_timeout, размер кэша и т.д.).
+
+Размер пула ограничен: если все соединения заняты, acquire ждёт освобождения
+одного из них. Время ожидания учитывается в статистике пула.
+"""
+import asyncio
+import logging
+import os
+import time
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+import aiosqlite
+
+logger = logging.getLogger(__name__)
+
+# Максимальное количество одновременно открытых соединений
+POOL_MAX_SIZE = 5
+
+# Через сколько секунд простоя соединение проверяется перед выдачей
+HEALTH_CHECK_IDLE_SECONDS = 30
+
+# PRAGMA, применяемые к каждому новому соединению
+DEFAULT_PRAGMAS: Tuple[Tuple[str, Any], ...] = (
+    ("journal_mode", "WAL"),  # Читатели не блокируют писателя
+    ("synchronous", "NORMAL"),  # В режиме WAL безопасно и заметно быстрее FULL
+    ("busy_timeout", 5000),  # Ждать снятия блокировки до 5 секунд вместо ошибки
+    ("cache_size", -8000),  # 8 МБ кэша страниц на соединение
+    ("mmap_size", 64 * 1024 * 1024),  # Чтение файла базы через mmap (64 МБ)
+    ("temp_store", "MEMORY"),  # Временные таблицы и индексы в памяти
+)
+
+
+class ConnectionPool:
+    """Ограниченный пул соединений aiosqlite с проверкой работоспособности"""
+
+    def __init__(
+        self,
+        path: str,
+        max_size: int = POOL_MAX_SIZE,
+        pragmas: Tuple[Tuple[str, Any], ...] = DEFAULT_PRAGMAS,
+        health_check_idle_seconds: float = HEALTH_CHECK_IDLE_SECONDS
+    ):
+        self.path = path
+        self.max_size = max_size
+        self.pragmas = pragmas
+        self.health_check_idle_seconds = health_check_idle_seconds
+        # Свободные соединения и время их возврата в пул (используется последнее возвращённое)
+        self._idle: List[Tuple[aiosqlite.Connection, float]] = []
+        # Семафор создаётся в работающем цикле событий (в Python 3.9 он привязывается к циклу при создании)
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._in_use = 0
+
+        self.acquisitions = 0
+        self.waits = 0
+        self.total_wait_ms = 0.0
+        self.max_wait_ms = 0.0
+        self.created = 0
+        self.health_check_failures = 0
+
+    async def _connect(self) -> aiosqlite.Connection:
+        """Открывает соединение и применяет PRAGMA"""
+        db_dir = os.path.dirname(self.path)
+        if db_dir and not os.path.exists(db_dir):
+            os.makedirs(db_dir)
+
+        conn = await aiosqlite.connect(self.path)
+        try:
+            for name, value in self.pragmas:
+                await conn.execute(f"PRAGMA {name}={value}")
+        except Exception:
+            await conn.close()
+            raise
+        self.created += 1
+        logger.debug(f"Открыто соединение с базой данных {self.path}")
+        return conn
+
+    async def _is_healthy(self, conn: aiosqlite.Connection) -> bool:
+        try:
+            async with conn.execute("SELECT 1") as cursor:
+                await cursor.fetchone()
+            return True
+        except Exception as e:
+            self.health_check_failures += 1
+            logger.warning(f"Соединение с базой данных не прошло проверку: {str(e)}")
+            return False
+
+    async def _get_connection(self) -> aiosqlite.Connection:
+        while self._idle:
+            conn, released_at = self._idle.pop()
+            if time.monotonic() - released_at < self.health_check_idle_seconds:
+                return conn
+            if await self._is_healthy(conn):
+                return conn
+            await self._close_quietly(conn)
+        return await self._connect()
+
+    @asynccontextmanager
+    async def acquire(self) -> AsyncIterator[aiosqlite.Connection]:
+        """Выдаёт соединение из пула, при необходимости дожидаясь освобождения"""
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_size)
+
+        self.acquisitions += 1
+        if self._semaphore.locked():
+            self.waits += 1
+            started = time.perf_counter()
+            await self._semaphore.acquire()
+            wait_ms = (time.perf_counter() - started) * 1000
+            self.total_wait_ms += wait_ms
+            if wait_ms > self.max_wait_ms:
+                self.max_wait_ms = wait_ms
+        else:
+            await self._semaphore.acquire()
+
+        conn = None
+        try:
+            conn = await self._get_connection()
+            self._in_use += 1
+            yield conn
+        finally:
+            if conn is not None:
+                self._in_use -= 1
+                await self._release(conn)
+            self._semaphore.release()
+
+    async def _release(self, conn: aiosqlite.Connection) -> None:
+        # Незавершённая транзакция означает, что операция прервалась с ошибкой
+        try:
+            if conn.in_transaction:
+                await conn.rollback()
+        except Exception as e:
+            logger.warning(f"Не удалось откатить транзакцию, соединение закрывается: {str(e)}")
+            await self._close_quietly(conn)
+            return
+        self._idle.append((conn, time.monotonic()))
+
+    async def _close_quietly(self, conn: aiosqlite.Connection) -> None:
+        try:
+            await conn.close()
+        except Exception:
+            pass
+
+    async def close(self) -> None:
+        """Закрывает свободные соединения пула"""
+        while self._idle:
+            conn, _ = self._idle.pop()
+            await self._close_quietly(conn)
+        # Семафор привязан к циклу событий; пустой пул можно использовать в другом цикле
+        if not self._in_use:
+            self._semaphore = None
+
+    async def reopen(self, path: str) -> None:
+        """Закрывает свободные соединения и переключает пул на другой файл базы"""
+        await self.close()
+        self.path = path
+
+    def stats(self) -> Dict[str, Any]:
+        """Возвращает размер пула и статистику ожидания соединений"""
+        return {
+            "max_size": self.max_size,
+            "in_use": self._in_use,
+            "idle": len(self._idle),
+            "created": self.created,
+            "acquisitions": self.acquisitions,
+            "waits": self.waits,
+            "avg_wait_ms": round(self.total_wait_ms / self.waits, 3) if self.waits else 0.0,
+            "max_wait_ms": round(self.max_wait_ms, 3),
+            "health_check_failures": self.health_check_failures
+        }
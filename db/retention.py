@@ -0,0 +1,106 @@
+"""
+Порционное удаление устаревших записей (retention).
+
+Раньше старые записи удалялись триггерами после каждой вставки, и каждая
+запись нарушения превращалась в удаление диапазона по всей таблице. Теперь
+устаревшие строки удаляет фоновая задача: за один шаг удаляется не больше
+chunk_size строк, самых старых по индексу timestamp, а между шагами цикл
+событий обрабатывает другие задачи. Каждый шаг выполняется отдельной
+операцией пакетной записи, поэтому очистка не держит блокировку записи дольше
+одного небольшого удаления.
+"""
+import asyncio
+import logging
+import sqlite3
+import time
+from typing import Any, Dict, Tuple
+
+from db.writer import WriteBehindWriter
+
+logger = logging.getLogger(__name__)
+
+# Максимальное количество строк, удаляемых одной операцией
+RETENTION_CHUNK_SIZE = 500
+
+# Таблицы с историей и их столбец времени (по нему есть индекс)
+RETENTION_TABLES: Tuple[Tuple[str, str], ...] = (
+    ("violations", "timestamp"),
+    ("messages_deleted", "timestamp"),
+)
+
+
+class RetentionPurger:
+    """Удаляет записи старше срока хранения порциями ограниченного размера"""
+
+    def __init__(
+        self,
+        writer: WriteBehindWriter,
+        chunk_size: int = RETENTION_CHUNK_SIZE,
+        tables: Tuple[Tuple[str, str], ...] = RETENTION_TABLES
+    ):
+        self.writer = writer
+        self.chunk_size = chunk_size
+        self.tables = tables
+
+        self.runs = 0
+        self.chunks = 0
+        self.purged: Dict[str, int] = {table: 0 for table, _ in tables}
+        self.last_run_ms = 0.0
+        self.total_run_ms = 0.0
+        self.max_chunk_ms = 0.0
+
+    def _delete_chunk(self, table: str, column: str, cutoff_ts: int):
+        def op(conn: sqlite3.Connection) -> int:
+            # Подзапрос выбирает самые старые строки по индексу времени, удаление идёт по rowid
+            cursor = conn.execute(
+                f"""
+                DELETE FROM {table} WHERE rowid IN (
+                    SELECT rowid FROM {table} WHERE {column} < ? ORDER BY {column} LIMIT ?
+                )
+                """,
+                (cutoff_ts, self.chunk_size)
+            )
+            return cursor.rowcount
+        return op
+
+    async def purge(self, cutoff_ts: int) -> Dict[str, int]:
+        """
+        Удаляет из всех таблиц строки старше cutoff_ts
+
+        Returns:
+            Количество удалённых строк по таблицам
+        """
+        started = time.perf_counter()
+        purged = {}
+        for table, column in self.tables:
+            total = 0
+            while True:
+                chunk_started = time.perf_counter()
+                deleted = await self.writer.submit(self._delete_chunk(table, column, cutoff_ts))
+                chunk_ms = (time.perf_counter() - chunk_started) * 1000
+                if chunk_ms > self.max_chunk_ms:
+                    self.max_chunk_ms = chunk_ms
+                self.chunks += 1
+                total += deleted
+                if deleted < self.chunk_size:
+                    break
+                # Даём обработать накопившиеся обновления перед следующей порцией
+                await asyncio.sleep(0)
+            purged[table] = total
+            self.purged[table] += total
+
+        self.runs += 1
+        self.last_run_ms = (time.perf_counter() - started) * 1000
+        self.total_run_ms += self.last_run_ms
+        return purged
+
+    def stats(self) -> Dict[str, Any]:
+        """Возвращает количество удалённых строк и время работы очистки"""
+        return {
+            "runs": self.runs,
+            "chunks": self.chunks,
+            "purged": dict(self.purged),
+            "last_run_ms": round(self.last_run_ms, 3),
+            "total_run_ms": round(self.total_run_ms, 3),
+            "max_chunk_ms": round(self.max_chunk_ms, 3)
+        }
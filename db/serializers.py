@@ -0,0 +1,124 @@
+"""
+Сериализация контекста нарушений для хранения в базе.
+
+Контекст хранится как BLOB: первый байт - номер формата, за ним данные в этом
+формате. Номер формата позволяет читать записи, сделанные разными
+сериализаторами, и менять формат по умолчанию без переписывания базы.
+
+Форматы:
+    1 - JSON (по умолчанию, без дополнительных зависимостей)
+    2 - MessagePack (компактнее и быстрее, нужен пакет msgpack)
+
+Прежние версии сохраняли контекст как str(dict) в TEXT и читали через eval().
+Такие значения распознаются по типу (строка, а не bytes) и разбираются
+безопасно через ast.literal_eval, пока миграция не перепишет их в новый формат.
+"""
+import ast
+import json
+from typing import Any, Dict, Optional, Union
+
+try:
+    import msgpack
+except ImportError:  # msgpack - необязательная зависимость
+    msgpack = None
+
+FORMAT_JSON = 1
+FORMAT_MSGPACK = 2
+
+
+class JsonSerializer:
+    """Компактный JSON в UTF-8"""
+    name = "json"
+    format_id = FORMAT_JSON
+
+    def __init__(self):
+        # Готовые кодировщик и декодировщик: json.dumps/loads с параметрами создают их на каждый вызов
+        self._encoder = json.JSONEncoder(ensure_ascii=False, separators=(",", ":"))
+        self._decoder = json.JSONDecoder()
+
+    def dumps(self, value: Any) -> bytes:
+        return self._encoder.encode(value).encode("utf-8")
+
+    def loads(self, data: bytes) -> Any:
+        return self._decoder.decode(data.decode("utf-8"))
+
+
+class MsgpackSerializer:
+    """Двоичный формат MessagePack"""
+    name = "msgpack"
+    format_id = FORMAT_MSGPACK
+
+    def __init__(self):
+        if msgpack is None:
+            raise RuntimeError("Для формата msgpack установите пакет msgpack")
+
+    def dumps(self, value: Any) -> bytes:
+        return msgpack.packb(value, use_bin_type=True)
+
+    def loads(self, data: bytes) -> Any:
+        return msgpack.unpackb(data, raw=False, strict_map_key=False)
+
+
+SERIALIZERS = {
+    JsonSerializer.name: JsonSerializer,
+    MsgpackSerializer.name: MsgpackSerializer,
+}
+
+# Сериализаторы для чтения создаются по мере появления записей в соответствующем формате
+_readers: Dict[int, Any] = {FORMAT_JSON: JsonSerializer()}
+_reader_classes = {cls.format_id: cls for cls in SERIALIZERS.values()}
+
+_default = _readers[FORMAT_JSON]
+
+
+def set_default_serializer(name: str) -> None:
+    """Выбирает формат, в котором сохраняется новый контекст"""
+    global _default
+    if name not in SERIALIZERS:
+        raise ValueError(f"Неизвестный формат контекста: {name}")
+    serializer = SERIALIZERS[name]()
+    _readers[serializer.format_id] = serializer
+    _default = serializer
+
+
+def encode_context(value: Optional[Any]) -> Optional[bytes]:
+    """Кодирует контекст в формате по умолчанию; пустой контекст хранится как NULL"""
+    if not value:
+        return None
+    return bytes((_default.format_id,)) + _default.dumps(value)
+
+
+def decode_legacy_context(text: str) -> Any:
+    """Разбирает контекст, сохранённый прежними версиями как str(dict)"""
+    try:
+        return ast.literal_eval(text)
+    except (ValueError, SyntaxError):
+        # Значение, которое не было литералом Python, сохраняется как есть
+        return text
+
+
+def reencode_legacy_context(text: str) -> Optional[bytes]:
+    """Переводит контекст из прежнего формата в формат по умолчанию"""
+    value = decode_legacy_context(text)
+    try:
+        return encode_context(value)
+    except (TypeError, ValueError):
+        # Литерал с типами, которых нет в формате (например, множество), сохраняется строкой
+        return encode_context(text)
+
+
+def decode_context(data: Optional[Union[bytes, str]]) -> Optional[Any]:
+    """Декодирует контекст из базы в любом из поддерживаемых форматов"""
+    if not data:
+        return None
+    if isinstance(data, str):
+        return decode_legacy_context(data)
+
+    format_id = data[0]
+    reader = _readers.get(format_id)
+    if reader is None:
+        reader_class = _reader_classes.get(format_id)
+        if reader_class is None:
+            raise ValueError(f"Неизвестный формат контекста: {format_id}")
+        reader = _readers[format_id] = reader_class()
+    return reader.loads(data[1:])
@@ -0,0 +1,228 @@
+"""
+Отложенная пакетная запись в базу данных (group commit).
+
+Обработчики не выполняют коммит сами: операция записи ставится в очередь
+фоновой задачи, а вызывающий код ждёт future с её результатом. Фоновая
+задача выполняет накопившиеся операции (не более max_batch) в одной
+транзакции с одним коммитом. Пока идёт запись пачки, новые операции
+накапливаются в очереди и попадают в следующую пачку, поэтому под нагрузкой
+пачки растут сами, а одиночная запись не ждёт. Дополнительно можно задать
+flush_interval_ms - время, в течение которого пачка добирается перед записью.
+
+Пачка целиком выполняется одним вызовом в выделенном потоке записи на
+собственном соединении sqlite3, поэтому операции записи - синхронные функции,
+а переключение между циклом событий и потоком происходит один раз на пачку,
+а не на каждый запрос. Если в пачке несколько операций, каждая выполняется
+внутри своей точки сохранения (SAVEPOINT), и ошибка одной операции не
+откатывает остальные.
+
+Future операции завершается только после коммита пачки, так что вызывающий
+код получает результат (например, ID записи) уже сохранённых данных.
+"""
+import asyncio
+import logging
+import sqlite3
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+
+from db.pool import ConnectionPool
+
+logger = logging.getLogger(__name__)
+
+# Время, в течение которого пачка добирается перед записью, в миллисекундах
+# (0 - записывать сразу всё, что накопилось за время предыдущей записи)
+WRITER_FLUSH_INTERVAL_MS = 0
+
+# Максимальное количество операций в одной транзакции
+WRITER_MAX_BATCH = 256
+
+# Операция записи: выполняет запросы на переданном соединении без коммита
+WriteOp = Callable[[sqlite3.Connection], Any]
+
+
+def _noop(conn: sqlite3.Connection) -> None:
+    return None
+
+
+class WriteBehindWriter:
+    """Фоновая задача, объединяющая операции записи в общие транзакции"""
+
+    def __init__(
+        self,
+        pool: ConnectionPool,
+        flush_interval_ms: float = WRITER_FLUSH_INTERVAL_MS,
+        max_batch: int = WRITER_MAX_BATCH
+    ):
+        # Из пула берутся путь к базе и PRAGMA, запись идёт через собственное соединение
+        self.pool = pool
+        self.flush_interval_ms = flush_interval_ms
+        self.max_batch = max_batch
+        self._queue: Deque[Tuple[WriteOp, asyncio.Future]] = deque()
+        # События и задача создаются в работающем цикле событий
+        self._wakeup: Optional[asyncio.Event] = None
+        self._batch_full: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = False
+        # Поток записи и его соединение
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._conn: Optional[sqlite3.Connection] = None
+        self._conn_path: Optional[str] = None
+
+        self.batches = 0
+        self.operations = 0
+        self.failed_operations = 0
+        self.max_batch_seen = 0
+        self.last_flush_ms = 0.0
+        self.max_flush_ms = 0.0
+
+    def _ensure_started(self) -> None:
+        if self._task is not None and not self._task.done():
+            return
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="db-writer")
+        self._wakeup = asyncio.Event()
+        self._batch_full = asyncio.Event()
+        self._stopping = False
+        self._task = asyncio.create_task(self._run())
+
+    async def submit(self, op: WriteOp) -> Any:
+        """Ставит операцию в очередь и возвращает её результат после коммита"""
+        self._ensure_started()
+        future = asyncio.get_running_loop().create_future()
+        self._queue.append((op, future))
+        self._wakeup.set()
+        if len(self._queue) >= self.max_batch:
+            self._batch_full.set()
+        return await future
+
+    async def flush(self) -> None:
+        """Дожидается записи всех операций, поставленных в очередь ранее"""
+        await self.submit(_noop)
+
+    async def stop(self) -> None:
+        """Записывает оставшиеся операции, останавливает задачу и закрывает соединение"""
+        if self._task is not None and not self._task.done():
+            self._stopping = True
+            self._wakeup.set()
+            self._batch_full.set()
+            await self._task
+        self._task = None
+
+        if self._executor is not None:
+            await asyncio.get_running_loop().run_in_executor(self._executor, self._close_connection)
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            if not self._queue:
+                if self._stopping:
+                    return
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+
+            # Даём поставить в очередь операции, запущенные в той же итерации цикла событий
+            await asyncio.sleep(0)
+
+            # Даём накопиться пачке, если она ещё не заполнена
+            if self.flush_interval_ms > 0 and len(self._queue) < self.max_batch and not self._stopping:
+                self._batch_full.clear()
+                try:
+                    await asyncio.wait_for(self._batch_full.wait(), self.flush_interval_ms / 1000)
+                except asyncio.TimeoutError:
+                    pass
+
+            batch = [self._queue.popleft() for _ in range(min(len(self._queue), self.max_batch))]
+            started = time.perf_counter()
+            ops = [op for op, _ in batch]
+            try:
+                results = await loop.run_in_executor(self._executor, self._write_batch, ops)
+            except Exception as e:
+                # Транзакция не записана: сообщаем об ошибке всем операциям пачки
+                logger.error(f"Ошибка пакетной записи в базу данных ({len(batch)} операций): {str(e)}")
+                results = [(False, e)] * len(batch)
+
+            for (_, future), (ok, value) in zip(batch, results):
+                if future.done():
+                    continue
+                if ok:
+                    future.set_result(value)
+                else:
+                    self.failed_operations += 1
+                    future.set_exception(value)
+            self._record_batch(len(batch), started)
+
+    def _connection(self) -> sqlite3.Connection:
+        """Возвращает соединение потока записи, открывая его при первом обращении"""
+        if self._conn is not None and self._conn_path == self.pool.path:
+            return self._conn
+        self._close_connection()
+        # isolation_level=None: транзакциями управляем явно через BEGIN/COMMIT
+        conn = sqlite3.connect(self.pool.path, isolation_level=None)
+        for name, value in self.pool.pragmas:
+            conn.execute(f"PRAGMA {name}={value}")
+        self._conn = conn
+        self._conn_path = self.pool.path
+        return conn
+
+    def _close_connection(self) -> None:
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+            self._conn_path = None
+
+    def _write_batch(self, ops: List[WriteOp]) -> List[Tuple[bool, Any]]:
+        """Выполняется в потоке записи: все операции пачки в одной транзакции"""
+        conn = self._connection()
+        conn.execute("BEGIN")
+        try:
+            if len(ops) == 1:
+                # Ошибка единственной операции откатывает всю транзакцию, точка сохранения не нужна
+                try:
+                    results = [(True, ops[0](conn))]
+                except Exception as e:
+                    conn.execute("ROLLBACK")
+                    return [(False, e)]
+            else:
+                results = []
+                for op in ops:
+                    conn.execute("SAVEPOINT write_op")
+                    try:
+                        results.append((True, op(conn)))
+                    except Exception as e:
+                        conn.execute("ROLLBACK TO write_op")
+                        results.append((False, e))
+                    conn.execute("RELEASE write_op")
+            conn.execute("COMMIT")
+        except Exception:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+        return results
+
+    def _record_batch(self, size: int, started: float) -> None:
+        flush_ms = (time.perf_counter() - started) * 1000
+        self.batches += 1
+        self.operations += size
+        self.last_flush_ms = flush_ms
+        if flush_ms > self.max_flush_ms:
+            self.max_flush_ms = flush_ms
+        if size > self.max_batch_seen:
+            self.max_batch_seen = size
+
+    def stats(self) -> Dict[str, Any]:
+        """Возвращает размер очереди и статистику пачек"""
+        return {
+            "queued": len(self._queue),
+            "batches": self.batches,
+            "operations": self.operations,
+            "avg_batch": round(self.operations / self.batches, 2) if self.batches else 0.0,
+            "max_batch": self.max_batch_seen,
+            "failed_operations": self.failed_operations,
+            "last_flush_ms": round(self.last_flush_ms, 3),
+            "max_flush_ms": round(self.max_flush_ms, 3)
+        }
@@ -14,6 +14,20 @@ logger = logging.getLogger("handlers")
 callbacks_router = Router(name="callbacks_router")
 
 
+def _mark_button_done(markup: InlineKeyboardMarkup, callback_data: str, text: str) -> InlineKeyboardMarkup:
+    """
+    Заменяет нажатую кнопку отметкой о выполнении.
+    Остальные кнопки не меняются: в сводке нарушений кнопки разных пользователей
+    находятся в одном сообщении.
+    """
+    return InlineKeyboardMarkup(inline_keyboard=[
+        [
+            InlineKeyboardButton(text=text, callback_data="done") if button.callback_data == callback_data else button
+            for button in row
+        ]
+        for row in markup.inline_keyboard
+    ])
+
 @callbacks_router.callback_query(lambda call: call.data and call.data.startswith("revoke_penalty:"))
 async def revoke_penalty_handler(call: CallbackQuery, bot: Bot, config):
     if not config.logging.enabled or not config.logging.modules.handlers:
@@ -58,17 +72,7 @@ async def _handle_revoke_penalty(call: CallbackQuery, bot: Bot, config):
     if call.message and call.message.reply_markup:
         if config.logging.enabled and config.logging.modules.handlers:
             logger.debug("Обновление клавиатуры сообщения")
-        markup = call.message.reply_markup
-        new_keyboard = []
-        for row in markup.inline_keyboard:
-            new_row = []
-            for button in row:
-                if button.callback_data and button.callback_data.startswith("revoke_penalty:"):
-                    new_row.append(InlineKeyboardButton(text="✅ Выполнено", callback_data="done"))
-                else:
-                    new_row.append(button)
-            new_keyboard.append(new_row)
-        new_markup = InlineKeyboardMarkup(inline_keyboard=new_keyboard)
+        new_markup = _mark_button_done(call.message.reply_markup, call.data, "✅ Выполнено")
         await bot.edit_message_reply_markup(
             chat_id=call.message.chat.id,
             message_id=call.message.message_id,
@@ -108,17 +112,7 @@ async def _handle_reset_violations(call: CallbackQuery, bot: Bot, config):
     if call.message and call.message.reply_markup:
         if config.logging.enabled and config.logging.modules.handlers:
             logger.debug("Обновление клавиатуры сообщения")
-        markup = call.message.reply_markup
-        new_keyboard = []
-        for row in markup.inline_keyboard:
-            new_row = []
-            for button in row:
-                if button.callback_data and button.callback_data.startswith("reset_violations:"):
-                    new_row.append(InlineKeyboardButton(text="✅ Выполнено", callback_data="done"))
-                else:
-                    new_row.append(button)
-            new_keyboard.append(new_row)
-        new_markup = InlineKeyboardMarkup(inline_keyboard=new_keyboard)
+        new_markup = _mark_button_done(call.message.reply_markup, call.data, "✅ Выполнено")
         await bot.edit_message_reply_markup(
             chat_id=call.message.chat.id,
             message_id=call.message.message_id,
@@ -180,17 +174,7 @@ async def _handle_restore_message(call: CallbackQuery, bot: Bot, config):
     if call.message and call.message.reply_markup:
         if config.logging.enabled and config.logging.modules.handlers:
             logger.debug("Обновление клавиатуры сообщения")
-        markup = call.message.reply_markup
-        new_keyboard = []
-        for row in markup.inline_keyboard:
-            new_row = []
-            for button in row:
-                if button.callback_data and button.callback_data.startswith("restore_message:"):
-                    new_row.append(InlineKeyboardButton(text="✅ Восстановлено", callback_data="done"))
-                else:
-                    new_row.append(button)
-            new_keyboard.append(new_row)
-        new_markup = InlineKeyboardMarkup(inline_keyboard=new_keyboard)
+        new_markup = _mark_button_done(call.message.reply_markup, call.data, "✅ Восстановлено")
         await bot.edit_message_reply_markup(
             chat_id=call.message.chat.id,
             message_id=call.message.message_id,
@@ -0,0 +1,131 @@
+"""
+Кэширующий резолвер метаданных чатов.
+
+Избавляет обработчик сообщений от запроса bot.get_chat на каждое сообщение:
+метаданные хранятся в LRU-кэше с TTL, параллельные запросы одного и того же
+чата объединяются в один, а ошибки кэшируются на короткое время.
+"""
+import asyncio
+import logging
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple, Any
+
+from aiogram import Bot
+
+from state.ttl_cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+# Время жизни успешно полученных метаданных (10 минут)
+CHAT_METADATA_TTL = 600
+
+# Время жизни отрицательного результата, если запрос завершился ошибкой (1 минута)
+CHAT_METADATA_NEGATIVE_TTL = 60
+
+# Максимальное количество чатов в кэше
+CHAT_METADATA_MAX_ENTRIES = 1024
+
+_MISSING = object()
+
+
+@dataclass(frozen=True)
+class ChatMetadata:
+    """Метаданные чата, необходимые обработчику сообщений"""
+    chat_id: int
+    linked_chat_id: Optional[int]
+
+
+class ChatMetadataResolver:
+    """LRU-кэш метаданных чатов с TTL, объединением запросов и отрицательным кэшированием"""
+
+    def __init__(
+        self,
+        ttl: float = CHAT_METADATA_TTL,
+        negative_ttl: float = CHAT_METADATA_NEGATIVE_TTL,
+        max_entries: int = CHAT_METADATA_MAX_ENTRIES
+    ):
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        # chat_id -> метаданные или None, если запрос завершился ошибкой
+        self._cache = TTLCache(maxsize=max_entries, ttl=ttl, touch_on_get=True)
+        # chat_id -> future выполняющегося запроса
+        self._inflight: Dict[int, asyncio.Future] = {}
+
+        self.hits = 0
+        self.negative_hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.errors = 0
+
+    async def resolve(self, bot: Bot, chat_id: int) -> Optional[ChatMetadata]:
+        """Возвращает метаданные чата из кэша или запрашивает их у Telegram"""
+        metadata = self._cache.get(chat_id, _MISSING)
+        if metadata is not _MISSING:
+            if metadata is None:
+                self.negative_hits += 1
+            else:
+                self.hits += 1
+            return metadata
+
+        # Если запрос для этого чата уже выполняется, дожидаемся его результата
+        inflight = self._inflight.get(chat_id)
+        if inflight is not None:
+            self.coalesced += 1
+            return await asyncio.shield(inflight)
+
+        self.misses += 1
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[chat_id] = future
+        try:
+            metadata, ttl = await self._fetch(bot, chat_id)
+            # Результат сохраняется, только если чат не был инвалидирован во время запроса
+            if self._inflight.get(chat_id) is future:
+                self._cache.set(chat_id, metadata, ttl)
+            future.set_result(metadata)
+            return metadata
+        finally:
+            if self._inflight.get(chat_id) is future:
+                del self._inflight[chat_id]
+            if not future.done():
+                future.cancel()
+
+    async def _fetch(self, bot: Bot, chat_id: int) -> Tuple[Optional[ChatMetadata], float]:
+        try:
+            chat = await bot.get_chat(chat_id)
+        except Exception as e:
+            self.errors += 1
+            logger.error(f"Ошибка при получении метаданных чата {chat_id}: {str(e)}")
+            return None, self.negative_ttl
+
+        return ChatMetadata(
+            chat_id=chat_id,
+            linked_chat_id=getattr(chat, "linked_chat_id", None)
+        ), self.ttl
+
+    def invalidate(self, chat_id: int) -> None:
+        """Удаляет метаданные чата из кэша (изменение статуса бота, миграция группы)"""
+        self._cache.pop(chat_id, None)
+        # Результат выполняющегося запроса уже может быть устаревшим
+        self._inflight.pop(chat_id, None)
+        logger.debug(f"Метаданные чата {chat_id} инвалидированы")
+
+    def clear(self) -> None:
+        """Полностью очищает кэш"""
+        self._cache.clear()
+        self._inflight.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """Возвращает счетчики попаданий и промахов кэша"""
+        return {
+            "size": len(self._cache),
+            "hits": self.hits,
+            "negative_hits": self.negative_hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "errors": self.errors,
+            "evictions": self._cache.evictions
+        }
+
+
+# Общий резолвер, используемый обработчиками сообщений
+chat_metadata_resolver = ChatMetadataResolver()
@@ -1,21 +1,43 @@
 import time
 import asyncio
 import datetime
+import functools
 import pytz
 import logging
-from typing import Dict, Tuple, Optional, Any, List
-from collections import defaultdict
+from typing import Dict, Tuple, Optional, Any, List, Callable, Awaitable
+from collections import Counter
 
 from aiogram import Router, F, Bot
-from aiogram.types import Message, ChatPermissions, User
+from aiogram.types import Message, ChatPermissions, User, ChatMemberUpdated
 from data.texts import TEXTS
 from config import Config
+from handlers.chat_metadata import chat_metadata_resolver
+from state.chat_state import ChatState
+from state.expiry_wheel import ExpiryWheel
+from state.ttl_cache import TTLCache
+from rules.engine import MessageEvent, RuleEngine
+from services.deferred_dispatch import DeferredDispatcher
+from services.deletion_scheduler import DeletionScheduler
+from services.update_shards import update_shards
+from services.send_queue import (
+    send_queue,
+    PRIORITY_PENALTY,
+    PRIORITY_ADMIN,
+    PRIORITY_WARNING,
+    PRIORITY_COSMETIC
+)
 from db.operations import (
+    db_pool,
+    db_writer,
+    db_cache_stats,
+    deletion_store,
+    penalty_expiry,
+    retention_purger,
     record_violation,
     record_deleted_message,
     get_incidents_count
 )
-from admin_notifications import send_admin_notification
+from admin_notifications import admin_digest, send_admin_notification
 from data.admin_texts import VIOLATION_DESCRIPTIONS, ADMIN_VIOLATION_WARNING
 from db.models import Violation
 from db.operations import (
@@ -33,67 +55,130 @@ logging.basicConfig(
 
 message_router = Router(name="message_router")
 
-# Кэш для хранения информации о последних сообщениях пользователя
-# user_id -> List[Tuple[message_id, reply_to_message_id, timestamp]]
-user_messages: Dict[int, List[Tuple[int, Optional[int], float]]] = defaultdict(list)
-
-# Кэш для отслеживания всех сообщений в группе (для проверки сообщений между сообщениями пользователя)
-# chat_id -> List[Tuple[message_id, user_id, timestamp]]
-chat_messages: Dict[int, List[Tuple[int, int, float]]] = defaultdict(list)
+# Состояние чатов для правил проверки:
+# ленты сообщений групп (chat_id -> ChatTimeline) и история последних сообщений пользователей
+# ((chat_id, user_id) -> кольцевой буфер (message_id, reply_to_message_id, timestamp, seq))
+chat_state = ChatState()
 
 # Время жизни записи в кэше (60 минут)
 CACHE_TTL = 3600
 
+# Правила проверки сообщений
+rule_engine = RuleEngine(history_ttl=CACHE_TTL)
+
+# Время жизни записи в кэше медиагрупп (10 секунд) и максимальный размер кэша
+MEDIA_GROUP_TTL = 10
+MEDIA_GROUPS_CACHE_SIZE = 10000
+
+# Счетчики отброшенных обновлений по причинам отсева
+reject_stats: Counter = Counter()
+
+# Кэш уже обработанных медиагрупп (альбомов)
+# media_group_id -> True
+media_groups_cache = TTLCache(maxsize=MEDIA_GROUPS_CACHE_SIZE, ttl=MEDIA_GROUP_TTL)
+
+# Отложенное удаление сообщений бота и сообщений-нарушений
+deletion_scheduler = DeletionScheduler(store=deletion_store)
+
+# Отложенная отправка ответов бота (пауза bot_message_delay_seconds не держит обработчик)
+deferred_dispatcher = DeferredDispatcher()
+
+# Интервал между тиками очистки кэша в секундах
+CACHE_EXPIRY_TICK_SECONDS = 1
+
+# Интервал вывода статистики кэшей в лог (5 минут)
+CACHE_STATS_INTERVAL = 300
+
 logger = logging.getLogger(__name__)
 
-async def cleanup_old_cache_entries():
-    """Периодически очищает старые записи из кэша user_messages и chat_messages"""
+def _expire_timeline(chat_id: int, now: float) -> Tuple[int, Optional[float]]:
+    """Удаляет устаревшие записи ленты чата и возвращает срок следующей проверки"""
+    timeline = chat_state.timelines.get(chat_id)
+    if timeline is None:
+        return 0, None
+    expired = timeline.expire(now - CACHE_TTL)
+    oldest_ts = timeline.oldest_timestamp()
+    if oldest_ts is None:
+        del chat_state.timelines[chat_id]
+        return expired, None
+    return expired, oldest_ts + CACHE_TTL
+
+def _expire_user_history(key: Tuple[int, int], now: float) -> Tuple[int, Optional[float]]:
+    """Удаляет историю пользователя, если его последнее сообщение устарело"""
+    chat_id, user_id = key
+    last_msg = chat_state.previous(chat_id, user_id)
+    if last_msg is None:
+        return 0, None
+    if last_msg[2] < now - CACHE_TTL:
+        chat_state.history.discard(chat_id, user_id)
+        return 1, None
+    return 0, last_msg[2] + CACHE_TTL
+
+# Колёса таймеров для порционной очистки кэшей
+timeline_expiry = ExpiryWheel(_expire_timeline)
+user_history_expiry = ExpiryWheel(_expire_user_history)
+
+async def cleanup_old_cache_entries(budget_ms: Optional[float] = None):
+    """Порционно очищает устаревшие записи лент чатов и истории пользователей"""
+    if budget_ms is not None:
+        timeline_expiry.budget_ms = budget_ms
+        user_history_expiry.budget_ms = budget_ms
+
+    last_report = time.monotonic()
     while True:
         try:
             current_time = time.time()
-            # Очистка кэша пользовательских сообщений
-            for user_id in list(user_messages.keys()):
-                user_messages[user_id] = [
-                    msg for msg in user_messages[user_id]
-                    if current_time - msg[2] <= CACHE_TTL
-                ]
-                if not user_messages[user_id]:
-                    del user_messages[user_id]
-            
-            # Очистка кэша сообщений чата
-            for chat_id in list(chat_messages.keys()):
-                chat_messages[chat_id] = [
-                    msg for msg in chat_messages[chat_id]
-                    if current_time - msg[2] <= CACHE_TTL
-                ]
-                if not chat_messages[chat_id]:
-                    del chat_messages[chat_id]
-                    
-            await asyncio.sleep(300)  # Проверяем каждые 5 минут
+            expired = await timeline_expiry.tick(current_time)
+            expired += await user_history_expiry.tick(current_time)
+            if expired:
+                logger.debug(
+                    f"Удалено устаревших записей кэша: {expired}, "
+                    f"максимальная пауза: {max(timeline_expiry.max_pause_ms, user_history_expiry.max_pause_ms):.3f} мс"
+                )
+
+            if time.monotonic() - last_report >= CACHE_STATS_INTERVAL:
+                last_report = time.monotonic()
+                logger.debug(f"Статистика кэша метаданных чатов: {chat_metadata_resolver.stats()}")
+                logger.debug(f"Статистика кэша медиагрупп: {media_groups_cache.stats()}")
+                logger.debug(f"Отброшено обновлений по причинам: {dict(reject_stats)}")
+                logger.debug(f"Пул соединений с базой данных: {db_pool.stats()}")
+                logger.debug(f"Пакетная запись в базу данных: {db_writer.stats()}")
+                logger.debug(f"Кэш счетчиков и наказаний: {db_cache_stats()}")
+                logger.debug(f"Удаление устаревших записей: {retention_purger.stats()}")
+                logger.debug(f"Снятие истёкших наказаний: {penalty_expiry.stats()}")
+                logger.debug(f"Отложенное удаление сообщений: {deletion_scheduler.stats()}")
+                logger.debug(f"Очередь исходящих действий: {send_queue.stats()}")
+                logger.debug(f"Отложенные ответы бота: {deferred_dispatcher.stats()}")
+                logger.debug(f"Шарды обработки обновлений: {update_shards.stats()}")
+                logger.debug(f"Сводки уведомлений в админ-чат: {admin_digest.stats()}")
+                logger.debug(f"Очистка лент чатов: {timeline_expiry.stats()}")
+                logger.debug(f"Очистка истории пользователей: {user_history_expiry.stats()}")
+                logger.debug(f"Память истории сообщений пользователей: {chat_state.history.memory_report()}")
+                logger.debug(
+                    f"Память лент сообщений чатов: "
+                    f"{sum(timeline.memory_bytes() for timeline in chat_state.timelines.values())} байт"
+                )
+
+            await asyncio.sleep(CACHE_EXPIRY_TICK_SECONDS)
         except Exception as e:
             logging.error(f"Error in cache cleanup: {str(e)}", exc_info=True)
             await asyncio.sleep(60)
 
-async def init_message_handler():
+async def init_message_handler(config: Optional[Config] = None):
     """
     Инициализация обработчика сообщений и запуск фоновых задач
     """
     # Запускаем очистку кэша в фоновом режиме
-    asyncio.create_task(cleanup_old_cache_entries())
+    budget_ms = config.cache_cleanup_budget_ms if config else None
+    asyncio.create_task(cleanup_old_cache_entries(budget_ms))
 
 def is_admin(user_id: int, config: Config) -> bool:
-    return user_id in config.admin_ids
+    return user_id in config.policy.admin_ids
 
-async def schedule_delete(bot: Bot, chat_id: int, message_id: int, delay_seconds: int) -> None:
+def schedule_delete(bot: Bot, chat_id: int, message_id: int, delay_seconds: int) -> None:
     """Планирует удаление сообщения через указанное время"""
-    try:
-        logger.debug(f"Запланировано удаление сообщения {message_id} в чате {chat_id} через {delay_seconds} секунд")
-        await asyncio.sleep(delay_seconds)
-        logger.debug(f"Попытка удаления сообщения {message_id} в чате {chat_id}")
-        await bot.delete_message(chat_id, message_id)
-        logger.info(f"Сообщение {message_id} успешно удалено из чата {chat_id}")
-    except Exception as e:
-        logger.error(f"Ошибка при удалении сообщения {message_id} из чата {chat_id}: {str(e)}")
+    logger.debug(f"Запланировано удаление сообщения {message_id} в чате {chat_id} через {delay_seconds} секунд")
+    deletion_scheduler.schedule(bot, chat_id, message_id, delay_seconds)
 
 async def safe_delete_bot_message(bot: Bot, message: Message, config: Config, is_penalty_message: bool = False) -> None:
     """Безопасно удаляет сообщение бота с учетом настроек"""
@@ -104,17 +189,17 @@ async def safe_delete_bot_message(bot: Bot, message: Message, config: Config, is
     if is_penalty_message and config.delete_penalty_messages:
         if config.logging.message_deletion:
             logger.info(f"Планирование удаления штрафного сообщения {message.message_id} через {config.penalty_message_lifetime_seconds} секунд")
-        asyncio.create_task(schedule_delete(
+        schedule_delete(
             bot, message.chat.id, message.message_id,
             config.penalty_message_lifetime_seconds
-        ))
+        )
     elif not is_penalty_message and config.delete_bot_messages:
         if config.logging.message_deletion:
             logger.info(f"Планирование удаления сообщения бота {message.message_id} через {config.bot_message_lifetime_seconds} секунд")
-        asyncio.create_task(schedule_delete(
+        schedule_delete(
             bot, message.chat.id, message.message_id,
             config.bot_message_lifetime_seconds
-        ))
+        )
 
 async def _delete_message_safe(message: Message):
     try:
@@ -122,173 +207,117 @@ async def _delete_message_safe(message: Message):
     except Exception:
         pass
 
-def has_other_messages_between(chat_id: int, user_id: int, prev_ts: float, current_ts: float) -> bool:
-    """
-    Проверяет, были ли сообщения от других пользователей между двумя сообщениями текущего пользователя
-    
-    Args:
-        chat_id: ID чата
-        user_id: ID пользователя, чьи сообщения проверяются
-        prev_ts: Временная метка предыдущего сообщения пользователя
-        current_ts: Временная метка текущего сообщения пользователя
-        
-    Returns:
-        True, если между сообщениями были сообщения других пользователей
-    """
-    if chat_id not in chat_messages:
-        return False
-        
-    # Фильтруем сообщения в указанном временном диапазоне
-    messages_between = [
-        msg for msg in chat_messages[chat_id]
-        if prev_ts < msg[2] < current_ts  # сообщение находится между предыдущим и текущим
-        and msg[1] != user_id  # сообщение от другого пользователя
-    ]
-    
-    return len(messages_between) > 0
+@message_router.my_chat_member()
+async def process_my_chat_member(event: ChatMemberUpdated, **data):
+    """Сбрасывает кэш метаданных чата при изменении статуса бота в нём"""
+    chat_metadata_resolver.invalidate(event.chat.id)
+
+@message_router.message(F.migrate_to_chat_id | F.migrate_from_chat_id)
+async def process_chat_migration(message: Message, **data):
+    """Сбрасывает кэш метаданных при миграции группы в супергруппу"""
+    chat_metadata_resolver.invalidate(message.chat.id)
+    for migrated_chat_id in (message.migrate_to_chat_id, message.migrate_from_chat_id):
+        if migrated_chat_id:
+            chat_metadata_resolver.invalidate(migrated_chat_id)
 
 @message_router.message(F.chat.type.in_({"group", "supergroup"}))
 async def process_group_message(message: Message, bot: Bot, event_from_user: User = None, **data):
+    handler_started = time.perf_counter()
     config = data["config"]
-    chat_id = message.chat.id
+    policy = config.policy
+
+    # Быстрый отсев неинтересных обновлений: до выделения памяти и изменения кэшей
     user = message.from_user
     if not user:
-        return
-
-    # Игнорируем сообщения в админ-чате и его тредах
-    main_chat_id = message.chat.id
-    if hasattr(message, 'message_thread_id'):
-        # Если это тред, получаем ID основного чата
-        try:
-            chat = await bot.get_chat(message.chat.id)
-            if hasattr(chat, 'linked_chat_id') and chat.linked_chat_id:
-                main_chat_id = chat.linked_chat_id
-        except Exception as e:
-            logger.error(f"Ошибка при получении основного чата для треда: {str(e)}")
-
-    # Проверяем, является ли чат админ-чатом
-    admin_chat_id = config.admin_chat_id
-    if '_' in str(admin_chat_id):
-        admin_chat_id = int(str(admin_chat_id).split('_')[0])
-    else:
-        admin_chat_id = int(admin_chat_id)  # Преобразуем простой ID в число
-    
-    if main_chat_id == admin_chat_id:
+        reject_stats["no_user"] += 1
         return
 
     # Проверяем, что группа входит в список разрешённых
-    if chat_id not in config.allowed_groups:
+    chat_id = message.chat.id
+    if chat_id not in policy.allowed_groups:
+        reject_stats["not_allowed_chat"] += 1
         return
 
     # Игнорируем сообщения от ботов или отправленные от имени канала
     if user.is_bot or message.sender_chat:
+        reject_stats["bot"] += 1
         return
 
     # Игнорируем служебные сообщения (вход/выход из группы и т.д.)
-    if message.new_chat_members is not None or message.left_chat_member is not None:
-        return
-    if message.new_chat_title or message.new_chat_photo or message.delete_chat_photo or message.group_chat_created:
+    if (message.new_chat_members is not None or message.left_chat_member is not None
+            or message.new_chat_title or message.new_chat_photo or message.delete_chat_photo
+            or message.group_chat_created or message.message_auto_delete_timer_changed
+            or message.pinned_message):
+        reject_stats["service"] += 1
         return
-    if message.message_auto_delete_timer_changed or message.pinned_message:
+
+    # Игнорируем сообщения в админ-чате и его тредах.
+    # Метаданные чата берутся из кэша, запрос к Telegram выполняется только при промахе
+    chat_metadata = await chat_metadata_resolver.resolve(bot, chat_id)
+    main_chat_id = chat_metadata.linked_chat_id if chat_metadata and chat_metadata.linked_chat_id else chat_id
+    if main_chat_id == policy.admin_chat_id:
+        reject_stats["admin_chat"] += 1
         return
 
     # Проверяем, содержит ли сообщение несколько медиафайлов (альбом с изображениями)
     # Сообщения с альбомами генерируют несколько событий, но должны считаться как одно сообщение
     if message.media_group_id:
-        # Проверяем, обработали ли мы уже сообщение из этой группы медиа
-        group_id = message.media_group_id
-        user_id = user.id
-        now_ts = time.time()
-        
-        # Используем временный кэш для отслеживания групп медиафайлов
-        if not hasattr(process_group_message, 'media_groups_cache'):
-            process_group_message.media_groups_cache = {}
-            
-        # Если эта группа медиа уже обрабатывалась за последние 10 секунд, пропускаем
-        if group_id in process_group_message.media_groups_cache:
-            last_ts = process_group_message.media_groups_cache[group_id]
-            if now_ts - last_ts < 10:  # 10 секунд - время жизни записи в кэше медиагрупп
-                return  # Пропускаем дубликаты медиагруппы
-                
-        # Сохраняем время обработки медиагруппы
-        process_group_message.media_groups_cache[group_id] = now_ts
-        
-        # Очистка старых записей каждые 100 запросов
-        if hasattr(process_group_message, 'cleanup_counter'):
-            process_group_message.cleanup_counter += 1
-            if process_group_message.cleanup_counter > 100:
-                for old_group_id in list(process_group_message.media_groups_cache.keys()):
-                    if now_ts - process_group_message.media_groups_cache[old_group_id] > 60:
-                        del process_group_message.media_groups_cache[old_group_id]
-                process_group_message.cleanup_counter = 0
-        else:
-            process_group_message.cleanup_counter = 1
+        # Если эта группа медиа уже обрабатывалась за последние MEDIA_GROUP_TTL секунд, пропускаем
+        # get(), а не проверка `in`: так повторы учитываются в статистике попаданий кэша
+        if media_groups_cache.get(message.media_group_id) is not None:
+            reject_stats["media_group_duplicate"] += 1
+            return  # Пропускаем дубликаты медиагруппы
+
+        # Сохраняем факт обработки медиагруппы
+        media_groups_cache.set(message.media_group_id, True)
 
     user_id = user.id
-    user_name = f"@{user.username}" if user.username else user.full_name
     now_ts = time.time()
-    
-    # Добавляем сообщение в общий кэш сообщений чата
-    chat_messages[chat_id].append((message.message_id, user_id, now_ts))
-    
-    # Сортируем сообщения по времени
-    chat_messages[chat_id].sort(key=lambda x: x[2])
+
+    # Добавляем сообщение в ленту чата и получаем его порядковый номер.
+    # Длинные сообщения тоже попадают в ленту: они прерывают серию сообщений других пользователей
+    seq = chat_state.timeline(chat_id).append(message.message_id, user_id, now_ts)
+    timeline_expiry.schedule(chat_id, now_ts + CACHE_TTL)
+
+    text = message.text or message.caption or ""
+
+    # Если сообщение длинное — пропускаем проверки
+    if len(text) >= config.message_length_limit:
+        reject_stats["long_message"] += 1
+        return
+
+    user_name = f"@{user.username}" if user.username else user.full_name
 
     # Проверяем, является ли пользователь администратором
-    is_admin_user = is_admin(user_id, config)
+    is_admin_user = user_id in policy.admin_ids
     # Добавляем пометку администратора к имени
     if is_admin_user:
         user_name = f"👮‍♂️ {user_name} (Администратор)"
 
-    text = message.text or message.caption or ""
-    text_len = len(text)
+    # Получаем ID сообщения, на которое отвечают (если есть), и его автора
+    reply_to_msg_id = None
+    reply_to_user_id = None
+    if message.reply_to_message:
+        reply_to_msg_id = message.reply_to_message.message_id
+        if message.reply_to_message.from_user:
+            reply_to_user_id = message.reply_to_message.from_user.id
+
+    event = MessageEvent(
+        chat_id=chat_id,
+        user_id=user_id,
+        message_id=message.message_id,
+        reply_to_message_id=reply_to_msg_id,
+        reply_to_user_id=reply_to_user_id,
+        timestamp=now_ts,
+        is_admin=is_admin_user
+    )
 
-    # Если сообщение длинное — пропускаем проверки
-    if text_len >= config.message_length_limit:
-        return
+    # Проверяем сообщение правилами до добавления его в историю пользователя
+    cooldown_seconds = config.reply_cooldown_seconds if config.check_reply_cooldown else 0
+    violation_type, delete_msg = rule_engine.evaluate(event, chat_state, cooldown_seconds)
 
-    # Получаем ID сообщения, на которое отвечают (если есть)
-    reply_to_msg_id = message.reply_to_message.message_id if message.reply_to_message else None
-    
-    # Добавляем текущее сообщение в историю
-    user_messages[user_id].append((message.message_id, reply_to_msg_id, now_ts))
-    
-    # Сортируем сообщения по времени
-    user_messages[user_id].sort(key=lambda x: x[2])
-    
-    violation_type = None
-    delete_msg = False
-
-    # Получаем предыдущее сообщение пользователя
-    prev_messages = [msg for msg in user_messages[user_id][:-1] if now_ts - msg[2] <= CACHE_TTL]
-    
-    if prev_messages:
-        prev_msg = prev_messages[-1]
-        prev_msg_id, prev_reply_id, prev_ts = prev_msg
-
-        # Проверяем временной интервал только если включена соответствующая опция
-        time_violation = False
-        if config.check_reply_cooldown and config.reply_cooldown_seconds:
-            time_violation = (now_ts - prev_ts) < config.reply_cooldown_seconds
-
-        if reply_to_msg_id:
-            if message.reply_to_message.from_user:
-                # Self-reply: реплай на своё сообщение
-                if message.reply_to_message.from_user.id == user_id:
-                    if time_violation:
-                        violation_type = "self_reply"
-                        delete_msg = not is_admin_user
-                # Double-reply: повторный ответ на то же сообщение
-                elif prev_reply_id == reply_to_msg_id and time_violation:
-                    violation_type = "double_reply"
-                    delete_msg = not is_admin_user
-        else:
-            # No-reply: сообщение без реплая после предыдущего без реплая
-            if not prev_reply_id and time_violation:
-                # Проверяем, были ли сообщения других пользователей между предыдущим и текущим
-                if not has_other_messages_between(chat_id, user_id, prev_ts, now_ts):
-                    violation_type = "no_reply"
-                    delete_msg = not is_admin_user
+    chat_state.history.append(chat_id, user_id, (message.message_id, reply_to_msg_id, now_ts, seq))
+    user_history_expiry.schedule((chat_id, user_id), now_ts + CACHE_TTL)
 
     if violation_type:
         try:
@@ -302,22 +331,22 @@ async def process_group_message(message: Message, bot: Bot, event_from_user: Use
                         msg_text=text
                     )
                     
-                    # Обработка составного ID чата и топика
-                    chat_id = config.admin_chat_id
-                    message_thread_id = None
-                    
-                    if '_' in str(chat_id):
-                        chat_id, message_thread_id = str(chat_id).split('_')
-                        chat_id = int(chat_id)
-                        message_thread_id = int(message_thread_id)
-                    else:
-                        chat_id = int(chat_id)  # Преобразуем простой ID в число
+                    # Админ-чат и топик заранее разобраны в политике
+                    admin_chat_id, message_thread_id = policy.admin_chat_target
                     
-                    await bot.send_message(
-                        chat_id=chat_id,
-                        text=warning_text,
-                        parse_mode="HTML",
-                        message_thread_id=message_thread_id
+                    send_individual = functools.partial(
+                        send_queue.enqueue, admin_chat_id, PRIORITY_ADMIN, functools.partial(
+                            bot.send_message,
+                            chat_id=admin_chat_id,
+                            text=warning_text,
+                            parse_mode="HTML",
+                            message_thread_id=message_thread_id
+                        )
+                    )
+                    # При частых нарушениях предупреждения объединяются в сводку;
+                    # обработчик только ставит предупреждение в очередь, не дожидаясь админ-чата
+                    admin_digest.notify(
+                        bot, config, chat_id, violation_type, user_id, user_name, send_individual, admins=True
                     )
             else:
                 if delete_msg:
@@ -327,51 +356,83 @@ async def process_group_message(message: Message, bot: Bot, event_from_user: Use
                         # Проверяем, задан ли таймер для удаления
                         if config.violationg_user_messages_lifetime_seconds > 0:
                             # Планируем удаление сообщения через указанное время
-                            asyncio.create_task(schedule_delete(
+                            schedule_delete(
                                 bot, message.chat.id, message.message_id,
                                 config.violationg_user_messages_lifetime_seconds
-                            ))
+                            )
                             if config.logging.message_deletion:
                                 logger.info(f"Запланировано удаление сообщения {message.message_id} через {config.violationg_user_messages_lifetime_seconds} секунд")
                         else:
                             # Если таймер не задан, удаляем сообщение немедленно
                             await _delete_message_safe(message)
                 
-                # Записываем удалённое сообщение и нарушение
-                deleted_msg_id = await record_deleted_message(user_id, user_name, chat_id, text)
-                await record_violation(user_id, user_name, chat_id, violation_type, config)
+                # Записываем удалённое сообщение и нарушение: обе записи попадают в одну пачку
+                deleted_msg_id, outcome = await asyncio.gather(
+                    record_deleted_message(user_id, user_name, chat_id, text),
+                    record_violation(user_id, user_name, chat_id, violation_type, config)
+                )
 
-                # Формируем уведомление о нарушении
-                notification_text = None
-                delete_warning = ""
-                
-                # Добавляем предупреждение об удалении, если включено отложенное удаление
-                if config.delete_violationg_user_messages and config.violationg_user_messages_lifetime_seconds > 0:
-                    delete_warning = TEXTS["delete_warning"].format(seconds=config.violationg_user_messages_lifetime_seconds)
-                
-                if violation_type == "no_reply":
-                    notification_text = TEXTS["no_reply"].format(name=user_name, delete_warning=delete_warning)
-                elif violation_type == "double_reply":
-                    notification_text = TEXTS["double_reply"].format(name=user_name, delete_warning=delete_warning)
-                elif violation_type == "self_reply":
-                    minutes = max(1, (config.reply_cooldown_seconds + 59) // 60)  # округление вверх
-                    notification_text = TEXTS["self_reply"].format(name=user_name, minutes=minutes, delete_warning=delete_warning)
+                # Формируем уведомление о нарушении (с предупреждением об удалении, если оно включено)
+                notification_text = policy.violation_text(violation_type, user_name)
 
                 if notification_text:
                     # Если наказания отключены, отвечаем на нарушающее сообщение
                     if not config.features.get("penalties", False):
-                        # Отправляем ответ на нарушающее сообщение
-                        sent_msg = await message.reply(notification_text, parse_mode="HTML")
-                        if sent_msg and config.delete_bot_messages:
-                            await safe_delete_bot_message(bot, sent_msg, config, is_penalty_message=False)
+                        # Отправляем ответ на нарушающее сообщение, не дожидаясь Telegram
+                        send_queue.enqueue(chat_id, PRIORITY_COSMETIC, functools.partial(
+                            _reply_and_schedule_delete, bot, chat_id, message, config, notification_text
+                        ))
                     # Если наказания включены, уведомление будет отправлено в функции apply_penalties_if_needed
                 
                 # Проверяем необходимость применения санкций
-                await apply_penalties_if_needed(user_id, user_name, chat_id, config, violation_type, text, bot, deleted_msg_id, message)
+                await apply_penalties_if_needed(
+                    user_id, user_name, chat_id, config, violation_type, text, bot, deleted_msg_id, message,
+                    count_incidents=outcome.incident_count if outcome else None
+                )
 
         except Exception as e:
             logging.error(f"Error processing violation for user {user_name}: {str(e)}", exc_info=True)
 
+        # Время обработчика сравнивается со временем доставки ответов в статистике
+        deferred_dispatcher.observe_handler(time.perf_counter() - handler_started)
+
+def _group_text_factory(
+    bot: Bot,
+    group_id: int,
+    original_message: Optional[Message],
+    text: str
+) -> Callable[[], Awaitable[Optional[Message]]]:
+    """Возвращает отправку текста в группу: ответом на исходное сообщение, если оно есть"""
+    if original_message:
+        return functools.partial(original_message.reply, text, parse_mode="HTML")
+    # Запасной вариант, если нет доступа к оригинальному сообщению
+    return functools.partial(bot.send_message, group_id, text, parse_mode="HTML")
+
+async def _send_group_text(
+    bot: Bot,
+    group_id: int,
+    original_message: Optional[Message],
+    text: str,
+    priority: int
+) -> Optional[Message]:
+    """Отправляет текст в группу через очередь и ждёт отправки (только из отложенных задач)"""
+    return await send_queue.submit(group_id, priority, _group_text_factory(bot, group_id, original_message, text))
+
+async def _reply_and_schedule_delete(
+    bot: Bot,
+    group_id: int,
+    message: Optional[Message],
+    config: Config,
+    text: str
+) -> None:
+    """
+    Отвечает на нарушающее сообщение (или пишет в группу) и планирует удаление ответа.
+    Вызывает Bot API напрямую: это действие ставится в очередь отправки целиком.
+    """
+    sent_msg = await _group_text_factory(bot, group_id, message, text)()
+    if sent_msg and config.delete_bot_messages:
+        await safe_delete_bot_message(bot, sent_msg, config, is_penalty_message=False)
+
 async def apply_penalties_if_needed(
     user_id: int,
     user_name: str,
@@ -381,7 +442,8 @@ async def apply_penalties_if_needed(
     msg_text: str,
     bot: Bot,
     deleted_msg_id: int = None,
-    original_message: Message = None
+    original_message: Message = None,
+    count_incidents: Optional[int] = None
 ):
     # Проверяем, включены ли наказания
     if not config.features.get("penalties", False):
@@ -389,169 +451,147 @@ async def apply_penalties_if_needed(
             logger.debug("Система наказаний отключена")
         return
 
-    count_incidents = await get_incidents_count(user_id)
+    # Количество инцидентов уже известно, если его вернула запись нарушения;
+    # отдельный запрос нужен, только если правило отключено и нарушение не записывалось
+    if count_incidents is None:
+        count_incidents = await get_incidents_count(user_id)
+
+    # Наказание применяется сразу, без паузы: отложенная задача может не выполниться,
+    # если бот перезапустится, а нарушение уже записано
+    penalty_to_apply = config.policy.current_penalty(count_incidents)
+    until_date = None
+    if penalty_to_apply:
+        until_date = await _apply_penalty_action(user_id, group_id, config, bot, penalty_to_apply)
+
+    # Видимые сообщения отправляются отложенно: обработчик не ждёт ни паузы
+    # bot_message_delay_seconds, ни ответов Telegram
+    delay = config.bot_message_delay_seconds if config.notifications.get("violation_rules", True) else 0
+    deferred_dispatcher.defer(delay, functools.partial(
+        _deliver_penalty_notices, user_name, group_id, config, violation_type, bot,
+        original_message, count_incidents, penalty_to_apply, until_date
+    ))
+
+async def _deliver_penalty_notices(
+    user_name: str,
+    group_id: int,
+    config: Config,
+    violation_type: str,
+    bot: Bot,
+    original_message: Optional[Message],
+    count_incidents: int,
+    penalty_to_apply: Optional[str],
+    until_date: Optional[int]
+) -> None:
+    """Отправляет уведомление о нарушении, затем сообщение о применённом наказании"""
+    policy = config.policy
 
     # Проверяем, нужно ли отправлять уведомление о нарушении
     if config.notifications.get("violation_rules", True):
-        violation_desc = VIOLATION_DESCRIPTIONS.get(violation_type, violation_type)
-        
-        # Добавляем задержку перед отправкой сообщения
-        await asyncio.sleep(config.bot_message_delay_seconds)
-        
-        # Формируем предупреждение об удалении, если оно включено
-        delete_warning = ""
-        if config.delete_violationg_user_messages and config.violationg_user_messages_lifetime_seconds > 0 and original_message:
-            delete_warning = TEXTS["delete_warning"].format(seconds=config.violationg_user_messages_lifetime_seconds)
-            
-        if violation_type == "no_reply":
-            notification_text = TEXTS["no_reply"].format(name=user_name, delete_warning=delete_warning)
-        elif violation_type == "double_reply":
-            notification_text = TEXTS["double_reply"].format(name=user_name, delete_warning=delete_warning)
-        elif violation_type == "self_reply":
-            minutes = max(1, (config.reply_cooldown_seconds + 59) // 60)
-            notification_text = TEXTS["self_reply"].format(name=user_name, minutes=minutes, delete_warning=delete_warning)
-            
-        if notification_text:
-            sent_msg = None
-            # Используем reply, если доступно оригинальное сообщение
-            if original_message:
-                sent_msg = await original_message.reply(notification_text, parse_mode="HTML")
-            else:
-                # Запасной вариант, если нет доступа к оригинальному сообщению
-                sent_msg = await bot.send_message(group_id, notification_text, parse_mode="HTML")
-                
-            if sent_msg and config.delete_bot_messages:
-                await safe_delete_bot_message(bot, sent_msg, config, is_penalty_message=False)
-
-    # Проверяем, включены ли наказания
-    if not config.features.get("penalties", False):
-        return
+        # Предупреждение об удалении добавляется, только если есть исходное сообщение
+        notification_text = policy.violation_text(
+            violation_type, user_name, with_delete_warning=original_message is not None
+        )
 
-    # Определяем наказание на основе количества нарушений
-    penalty_to_apply = None
-    for violations_threshold, penalty in sorted(config.penalties.items(), key=lambda x: int(x[0])):
-        if count_incidents >= int(violations_threshold):
-            penalty_to_apply = penalty
+        if notification_text:
+            # Ждём отправки, чтобы уведомление пришло раньше сообщения о наказании
+            await send_queue.submit(group_id, PRIORITY_COSMETIC, functools.partial(
+                _reply_and_schedule_delete, bot, group_id, original_message, config, notification_text
+            ))
 
     if not penalty_to_apply:
         return
 
-    # Применяем наказание
-    if penalty_to_apply == "warning" and config.notifications.get("official_warning", True):
-        # Отправляем официальное предупреждение
-        next_threshold = None
-        next_penalty = None
-        for threshold, penalty in sorted(config.penalties.items(), key=lambda x: int(x[0])):
-            if int(threshold) > count_incidents:
-                next_threshold = int(threshold)
-                next_penalty = penalty
-                break
+    txt = _penalty_announcement(user_name, config, penalty_to_apply, count_incidents, until_date)
+    if txt:
+        sent_msg = await _send_group_text(bot, group_id, original_message, txt, PRIORITY_WARNING)
+        if sent_msg and config.delete_penalty_messages:
+            await safe_delete_bot_message(bot, sent_msg, config, is_penalty_message=True)
 
-        if next_threshold and next_penalty:
-            violations_until_next = next_threshold - count_incidents
-            txt = TEXTS["official_warning"].format(
-                name=user_name,
-                current_violations=count_incidents,
-                next_penalty_description=next_penalty,
-                violations_until_next=violations_until_next
-            )
-            sent_msg = None
-            if original_message:
-                sent_msg = await original_message.reply(txt, parse_mode="HTML")
-            else:
-                sent_msg = await bot.send_message(group_id, txt, parse_mode="HTML")
-            if sent_msg and config.delete_penalty_messages:
-                await safe_delete_bot_message(bot, sent_msg, config, is_penalty_message=True)
-
-    elif penalty_to_apply == "read-only":
-        try:
+async def _apply_penalty_action(
+    user_id: int,
+    group_id: int,
+    config: Config,
+    bot: Bot,
+    penalty_to_apply: str
+) -> Optional[int]:
+    """Ограничивает или банит пользователя; возвращает срок наказания, если он есть"""
+    until_date = None
+    try:
+        if penalty_to_apply == "read-only":
             until_date = int(time.time()) + config.mute_duration_seconds
-            await bot.restrict_chat_member(
+            await send_queue.submit(None, PRIORITY_PENALTY, functools.partial(
+                bot.restrict_chat_member,
                 chat_id=group_id,
                 user_id=user_id,
                 permissions=ChatPermissions(can_send_messages=False),
                 until_date=until_date
-            )
-        except Exception:
-            pass
-
-        if config.notifications.get("mute_applied", True):
-            msk = pytz.timezone("Europe/Moscow")
-            msk_time = datetime.datetime.fromtimestamp(until_date, msk).strftime("%d.%m.%Y %H:%M")
-            minutes = max(1, (config.mute_duration_seconds + 59) // 60)
-            
-            txt = TEXTS["mute_applied"].format(
-                name=user_name,
-                violations_count=count_incidents,
-                minutes=minutes,
-                datetime=msk_time
-            )
-            sent_msg = None
-            if original_message:
-                sent_msg = await original_message.reply(txt, parse_mode="HTML")
-            else:
-                sent_msg = await bot.send_message(group_id, txt, parse_mode="HTML")
-            if sent_msg and config.delete_penalty_messages:
-                await safe_delete_bot_message(bot, sent_msg, config, is_penalty_message=True)
+            ))
+        elif penalty_to_apply == "kick":
+            await send_queue.submit(None, PRIORITY_PENALTY, functools.partial(
+                bot.ban_chat_member, group_id, user_id, until_date=int(time.time()) + 60
+            ))
+            await send_queue.submit(None, PRIORITY_PENALTY, functools.partial(bot.unban_chat_member, group_id, user_id))
+        elif penalty_to_apply == "kick+ban":
+            until_date = int(time.time()) + config.temp_ban_duration_seconds
+            await send_queue.submit(None, PRIORITY_PENALTY, functools.partial(
+                bot.ban_chat_member, group_id, user_id, until_date=until_date
+            ))
+        elif penalty_to_apply == "ban":
+            await send_queue.submit(None, PRIORITY_PENALTY, functools.partial(bot.ban_chat_member, group_id, user_id))
+    except Exception:
+        pass
+    return until_date
 
-    elif penalty_to_apply == "kick":
-        try:
-            await bot.ban_chat_member(group_id, user_id, until_date=int(time.time()) + 60)
-            await bot.unban_chat_member(group_id, user_id)
-        except Exception:
-            pass
-
-        if config.notifications.get("kick_applied", True):
-            txt = TEXTS["kick_applied"].format(name=user_name, violations_count=count_incidents)
-            sent_msg = None
-            if original_message:
-                sent_msg = await original_message.reply(txt, parse_mode="HTML")
-            else:
-                sent_msg = await bot.send_message(group_id, txt, parse_mode="HTML")
-            if sent_msg and config.delete_penalty_messages:
-                await safe_delete_bot_message(bot, sent_msg, config, is_penalty_message=True)
+def _penalty_announcement(
+    user_name: str,
+    config: Config,
+    penalty_to_apply: str,
+    count_incidents: int,
+    until_date: Optional[int]
+) -> Optional[str]:
+    """Формирует сообщение о наказании для группы, если оно включено в настройках"""
+    policy = config.policy
 
-    elif penalty_to_apply == "kick+ban":
-        try:
-            until_date = int(time.time()) + config.temp_ban_duration_seconds
-            await bot.ban_chat_member(group_id, user_id, until_date=until_date)
-        except Exception:
-            pass
-
-        if config.notifications.get("kick_ban_applied", True):
-            msk = pytz.timezone("Europe/Moscow")
-            msk_time = datetime.datetime.fromtimestamp(until_date, msk).strftime("%d.%m.%Y %H:%M")
-            minutes = max(1, (config.temp_ban_duration_seconds + 59) // 60)
-            
-            txt = TEXTS["kick_ban_applied"].format(
+    if penalty_to_apply == "warning" and config.notifications.get("official_warning", True):
+        # Официальное предупреждение
+        next_threshold, next_penalty = policy.next_penalty(count_incidents)
+
+        if next_threshold and next_penalty:
+            violations_until_next = next_threshold - count_incidents
+            return TEXTS["official_warning"].format(
                 name=user_name,
-                violations_count=count_incidents,
-                minutes=minutes,
-                date_str=msk_time
+                current_violations=count_incidents,
+                next_penalty_description=next_penalty,
+                violations_until_next=violations_until_next
             )
-            sent_msg = None
-            if original_message:
-                sent_msg = await original_message.reply(txt, parse_mode="HTML")
-            else:
-                sent_msg = await bot.send_message(group_id, txt, parse_mode="HTML")
-            if sent_msg and config.delete_penalty_messages:
-                await safe_delete_bot_message(bot, sent_msg, config, is_penalty_message=True)
 
-    elif penalty_to_apply == "ban":
-        try:
-            await bot.ban_chat_member(group_id, user_id)
-        except Exception:
-            pass
-
-        if config.notifications.get("ban_applied", True):
-            txt = TEXTS["ban_applied"].format(name=user_name, violations_count=count_incidents)
-            sent_msg = None
-            if original_message:
-                sent_msg = await original_message.reply(txt, parse_mode="HTML")
-            else:
-                sent_msg = await bot.send_message(group_id, txt, parse_mode="HTML")
-            if sent_msg and config.delete_penalty_messages:
-                await safe_delete_bot_message(bot, sent_msg, config, is_penalty_message=True)
+    elif penalty_to_apply == "read-only" and config.notifications.get("mute_applied", True):
+        msk = pytz.timezone("Europe/Moscow")
+        msk_time = datetime.datetime.fromtimestamp(until_date, msk).strftime("%d.%m.%Y %H:%M")
+        return TEXTS["mute_applied"].format(
+            name=user_name,
+            violations_count=count_incidents,
+            minutes=policy.mute_minutes,
+            datetime=msk_time
+        )
+
+    elif penalty_to_apply == "kick" and config.notifications.get("kick_applied", True):
+        return TEXTS["kick_applied"].format(name=user_name, violations_count=count_incidents)
+
+    elif penalty_to_apply == "kick+ban" and config.notifications.get("kick_ban_applied", True):
+        msk = pytz.timezone("Europe/Moscow")
+        msk_time = datetime.datetime.fromtimestamp(until_date, msk).strftime("%d.%m.%Y %H:%M")
+        return TEXTS["kick_ban_applied"].format(
+            name=user_name,
+            violations_count=count_incidents,
+            minutes=policy.temp_ban_minutes,
+            date_str=msk_time
+        )
+
+    elif penalty_to_apply == "ban" and config.notifications.get("ban_applied", True):
+        return TEXTS["ban_applied"].format(name=user_name, violations_count=count_incidents)
+
+    return None
 
 async def process_violation(
     bot: Bot,
@@ -581,10 +621,10 @@ async def process_violation(
                 # Проверяем, задан ли таймер для удаления
                 if config.violationg_user_messages_lifetime_seconds > 0:
                     # Планируем удаление сообщения через указанное время
-                    asyncio.create_task(schedule_delete(
+                    schedule_delete(
                         bot, message.chat.id, message.message_id,
                         config.violationg_user_messages_lifetime_seconds
-                    ))
+                    )
                     if config.logging.violations:
                         logger.debug(f"Запланировано удаление сообщения {message.message_id} через {config.violationg_user_messages_lifetime_seconds} секунд")
                 else:
@@ -626,10 +666,7 @@ async def process_violation(
         logger.debug(f"Активных нарушений у пользователя {message.from_user.id}: {violations_count}")
 
     # Определяем наказание на основе количества нарушений
-    penalty = None
-    for threshold, penalty_type in sorted(config.penalties.items(), key=lambda x: int(x[0])):
-        if violations_count >= int(threshold):
-            penalty = penalty_type
+    penalty = config.policy.current_penalty(violations_count)
 
     if config.logging.penalties and penalty:
         logger.info(f"Применяется наказание {penalty} к пользователю {message.from_user.id}")
@@ -655,10 +692,10 @@ async def apply_penalty(
             # Проверяем, задан ли таймер для удаления
             if config.violationg_user_messages_lifetime_seconds > 0:
                 # Планируем удаление сообщения через указанное время
-                asyncio.create_task(schedule_delete(
+                schedule_delete(
                     bot, message.chat.id, message.message_id,
                     config.violationg_user_messages_lifetime_seconds
-                ))
+                )
                 if config.logging.penalties:
                     logger.debug(f"Запланировано удаление сообщения-нарушения {message.message_id} через {config.violationg_user_messages_lifetime_seconds} секунд")
             else:
@@ -1,3 +1,8 @@
+import time
+
+# Момент запуска процесса, до импорта aiogram и обработчиков: от него отсчитывается время старта
+PROCESS_STARTED = time.perf_counter()
+
 import asyncio
 import logging
 import sys
@@ -8,9 +13,25 @@ from typing import Any, Callable, Dict, Awaitable
 from aiogram.types import TelegramObject
 
 from config import Config
-from handlers.message_handlers import message_router, init_message_handler
+from handlers.message_handlers import (
+    message_router,
+    init_message_handler,
+    deletion_scheduler,
+    deferred_dispatcher
+)
+from services.send_queue import send_queue
+from services.update_shards import update_shards
+from admin_notifications import admin_digest
 from handlers.callbacks import callbacks_router
-from db.operations import init_db, cleanup_old_violations
+from db.operations import (
+    init_db,
+    cleanup_old_violations,
+    close_connection_pool,
+    db_writer,
+    penalty_expiry,
+    retention_purger
+)
+from db.serializers import set_default_serializer
 
 def setup_logging(config: Config):
     """Настраивает логирование на основе конфигурации"""
@@ -82,8 +103,15 @@ async def main():
     logger = logging.getLogger(__name__)
     logger.info("Запуск бота...")
 
-    # Инициализируем базу данных
+    # Инициализируем базу данных (миграция контекста пишет в выбранном формате)
+    set_default_serializer(config.context_format)
+    db_started = time.perf_counter()
     await init_db()
+    db_init_ms = (time.perf_counter() - db_started) * 1000
+    db_writer.flush_interval_ms = config.db_write_flush_interval_ms
+    retention_purger.chunk_size = config.retention_chunk_size
+    send_queue.configure(config.send_rate_per_second, config.send_rate_per_chat_per_minute)
+    update_shards.configure(config.update_shards, config.update_shard_queue_size)
     logger.info("База данных инициализирована")
 
     # Создаем бота и диспетчер с новыми настройками
@@ -95,26 +123,53 @@ async def main():
 
     # Добавляем middleware для конфигурации
     dp.update.outer_middleware(ConfigMiddleware(config))
+    # Обновления одного чата обрабатываются по порядку, разных чатов - параллельно по шардам
+    dp.update.outer_middleware(update_shards)
 
     # Регистрируем обработчики
     dp.include_router(message_router)
     dp.include_router(callbacks_router)
-    await init_message_handler()
+    await init_message_handler(config)
     logger.info("Обработчики сообщений и callback-запросов зарегистрированы")
 
+    # Восстанавливаем удаления сообщений, запланированные до перезапуска
+    await deletion_scheduler.restore(bot)
+
     # Запускаем задачу очистки старых нарушений
     asyncio.create_task(cleanup_old_violations(config))
     logger.info("Запущена задача очистки старых нарушений")
 
+    # Запускаем снятие наказаний по истечении срока
+    await penalty_expiry.load()
+    penalty_expiry.start()
+
+    # Время старта: от запуска процесса до начала поллинга
+    async def log_startup_time():
+        logger.info(
+            f"Бот готов к работе через {(time.perf_counter() - PROCESS_STARTED) * 1000:.0f} мс после запуска "
+            f"(инициализация базы данных: {db_init_ms:.0f} мс)"
+        )
+
+    dp.startup.register(log_startup_time)
+
     try:
         # Запускаем поллинг
         logger.info("Запуск поллинга...")
-        await dp.start_polling(bot)
+        # Поллинг только раскладывает обновления по шардам и ждёт, если очередь шарда заполнена
+        await dp.start_polling(bot, handle_as_tasks=False)
     except Exception as e:
         logger.error(f"Ошибка при работе бота: {str(e)}")
     finally:
         logger.info("Завершение работы бота")
+        await update_shards.stop()
+        await deletion_scheduler.stop()
+        # Уже наступившие отложенные ответы отправляются до остановки очереди отправки
+        await deferred_dispatcher.stop()
+        # Накопленные сводки отправляются до остановки очереди отправки
+        await admin_digest.flush_all()
+        await send_queue.stop()
         await bot.session.close()
+        await close_connection_pool()
 
 if __name__ == "__main__":
     try:
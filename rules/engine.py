@@ -0,0 +1,114 @@
+"""
+Движок правил проверки сообщений.
+
+Правила - чистые синхронные функции без обращений к Telegram и базе данных.
+Обработчик сообщений преобразует обновление в компактное событие MessageEvent,
+получает от движка вердикт и сам выполняет побочные действия (удаление
+сообщения, запись нарушения, уведомления). Благодаря этому пропускную
+способность правил можно измерять отдельно, а новое правило добавляется в
+список правил без изменения кода ввода-вывода.
+"""
+from typing import Callable, Dict, NamedTuple, Optional, Sequence, Tuple
+
+from state.chat_state import ChatState
+from state.user_history import HistoryEntry
+
+# Время, в течение которого предыдущее сообщение пользователя учитывается правилами (60 минут)
+HISTORY_TTL = 3600
+
+
+class MessageEvent(NamedTuple):
+    """Компактное представление сообщения группы"""
+    chat_id: int
+    user_id: int
+    message_id: int
+    reply_to_message_id: Optional[int]
+    reply_to_user_id: Optional[int]  # Автор сообщения, на которое отвечают (если известен)
+    timestamp: float
+    is_admin: bool = False
+
+
+class Verdict(NamedTuple):
+    """Результат проверки сообщения"""
+    violation_type: Optional[str]
+    delete: bool  # Нужно ли удалить сообщение (сообщения администраторов не удаляются)
+
+
+NO_VIOLATION = Verdict(None, False)
+
+# Правило получает событие, предыдущее сообщение пользователя и состояние чатов
+# и возвращает True, если сообщение нарушает правило
+Rule = Callable[[MessageEvent, HistoryEntry, ChatState], bool]
+
+
+def self_reply(event: MessageEvent, prev: HistoryEntry, state: ChatState) -> bool:
+    """Реплай на своё сообщение"""
+    return bool(event.reply_to_message_id) and event.reply_to_user_id == event.user_id
+
+
+def double_reply(event: MessageEvent, prev: HistoryEntry, state: ChatState) -> bool:
+    """Повторный ответ на то же сообщение другого пользователя"""
+    return (
+        bool(event.reply_to_message_id)
+        and event.reply_to_user_id is not None
+        and event.reply_to_user_id != event.user_id
+        and prev[1] == event.reply_to_message_id
+    )
+
+
+def no_reply(event: MessageEvent, prev: HistoryEntry, state: ChatState) -> bool:
+    """Сообщение без реплая сразу после своего же сообщения без реплая"""
+    return (
+        not event.reply_to_message_id
+        and not prev[1]
+        and not state.has_other_messages_since(event.chat_id, event.user_id, prev[3])
+    )
+
+
+# Правила в порядке проверки: срабатывает первое подходящее
+DEFAULT_RULES: Tuple[Tuple[str, Rule], ...] = (
+    ("self_reply", self_reply),
+    ("double_reply", double_reply),
+    ("no_reply", no_reply),
+)
+
+
+class RuleEngine:
+    """Синхронная проверка сообщения набором правил"""
+
+    def __init__(self, rules: Sequence[Tuple[str, Rule]] = DEFAULT_RULES, history_ttl: float = HISTORY_TTL):
+        self.rules = tuple(rules)
+        self.history_ttl = history_ttl
+        # Вердикты создаются заранее, чтобы проверка не выделяла память:
+        # violation_type -> (вердикт для пользователя, вердикт для администратора)
+        self._verdicts: Dict[str, Tuple[Verdict, Verdict]] = {
+            name: (Verdict(name, True), Verdict(name, False)) for name, _ in self.rules
+        }
+
+    def evaluate(self, event: MessageEvent, state: ChatState, cooldown_seconds: float) -> Verdict:
+        """
+        Проверяет сообщение до того, как оно добавлено в историю пользователя
+
+        Args:
+            event: Проверяемое сообщение
+            state: Состояние чатов; сообщение уже может быть добавлено в ленту чата
+            cooldown_seconds: Минимальный интервал между сообщениями пользователя
+                (0 - проверка интервала отключена)
+
+        Returns:
+            Вердикт с типом нарушения или NO_VIOLATION
+        """
+        # Все правила проверяют только сообщения, отправленные быстрее интервала
+        if not cooldown_seconds:
+            return NO_VIOLATION
+        prev = state.history.previous(event.chat_id, event.user_id)
+        if prev is None:
+            return NO_VIOLATION
+        elapsed = event.timestamp - prev[2]
+        if elapsed >= cooldown_seconds or elapsed > self.history_ttl:
+            return NO_VIOLATION
+
+        for name, rule in self.rules:
+            if rule(event, prev, state):
+                return self._verdicts[name][event.is_admin]
+        return NO_VIOLATION
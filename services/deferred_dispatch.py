@@ -0,0 +1,146 @@
+"""
+Отложенная отправка видимых ответов бота.
+
+Обработчик обновления не ждёт ни паузы bot_message_delay_seconds, ни ответа
+Telegram: он передаёт готовое действие планировщику и завершается сразу после
+вердикта и записи в базу. Все отложенные действия хранятся в одной min-куче по
+моменту выполнения; одна фоновая задача спит до ближайшего срока и запускает
+наступившие действия отдельными задачами.
+
+Планировщик хранит только видимые сообщения: наказания применяются сразу в
+обработчике, поэтому сообщения, не отправленные при остановке, отбрасываются
+без потери самих наказаний.
+
+Статистика позволяет сравнить, сколько обработчик занят обновлением, с тем,
+через сколько ответ реально доставлен.
+"""
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class DeferredDispatcher:
+    """Одна задача, выполняющая отложенные действия в порядке их сроков"""
+
+    def __init__(self):
+        # Куча (момент выполнения по time.monotonic(), seq, момент постановки, действие)
+        self._heap: List[Tuple[float, int, float, Callable[[], Awaitable[Any]]]] = []
+        self._seq = itertools.count()
+        self._inflight: Set[asyncio.Task] = set()
+        # Событие и задача создаются в работающем цикле событий
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+
+        self.deferred = 0
+        self.delivered = 0
+        self.failed = 0
+        self._handler_count = 0
+        self._handler_total = 0.0
+        self._handler_max = 0.0
+        self._delivery_total = 0.0
+        self._delivery_max = 0.0
+        self._lateness_max = 0.0
+
+    def defer(self, delay_seconds: float, job: Callable[[], Awaitable[Any]]) -> None:
+        """Выполняет job не раньше чем через delay_seconds; ошибки job только логируются"""
+        now = time.monotonic()
+        due = now + max(delay_seconds, 0)
+        entry = (due, next(self._seq), now, job)
+        heapq.heappush(self._heap, entry)
+        self.deferred += 1
+
+        self._ensure_started()
+        if self._heap[0] is entry:
+            self._wakeup.set()
+
+    def observe_handler(self, seconds: float) -> None:
+        """Учитывает время, которое обработчик обновления провёл до передачи ответа"""
+        self._handler_count += 1
+        self._handler_total += seconds
+        if seconds > self._handler_max:
+            self._handler_max = seconds
+
+    def _ensure_started(self) -> None:
+        if self._task is not None and not self._task.done():
+            return
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Останавливает задачу и дожидается запущенных действий; невыполненные отбрасываются"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._inflight:
+            await asyncio.gather(*self._inflight, return_exceptions=True)
+        if self._heap:
+            logger.info(f"Не отправлено отложенных ответов при остановке: {len(self._heap)}")
+            self._heap.clear()
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                self._wakeup.clear()
+                if not self._heap:
+                    await self._wakeup.wait()
+                    continue
+
+                now = time.monotonic()
+                delay = self._heap[0][0] - now
+                if delay > 0:
+                    try:
+                        await asyncio.wait_for(self._wakeup.wait(), delay)
+                    except asyncio.TimeoutError:
+                        pass
+                    continue
+
+                while self._heap and self._heap[0][0] <= now:
+                    due, _, queued_at, job = heapq.heappop(self._heap)
+                    lateness = now - due
+                    if lateness > self._lateness_max:
+                        self._lateness_max = lateness
+                    task = asyncio.create_task(self._execute(queued_at, job))
+                    self._inflight.add(task)
+                    task.add_done_callback(self._inflight.discard)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Ошибка в планировщике отложенных ответов: {str(e)}")
+                await asyncio.sleep(1)
+
+    async def _execute(self, queued_at: float, job: Callable[[], Awaitable[Any]]) -> None:
+        try:
+            await job()
+        except Exception as e:
+            self.failed += 1
+            logger.error(f"Ошибка при отправке отложенного ответа: {str(e)}")
+            return
+        self.delivered += 1
+        elapsed = time.monotonic() - queued_at
+        self._delivery_total += elapsed
+        if elapsed > self._delivery_max:
+            self._delivery_max = elapsed
+
+    def stats(self) -> Dict[str, Any]:
+        """Возвращает время обработчика и время доставки ответов (включая паузу)"""
+        return {
+            "pending": len(self._heap),
+            "inflight": len(self._inflight),
+            "deferred": self.deferred,
+            "delivered": self.delivered,
+            "failed": self.failed,
+            "handler_avg_ms": round(self._handler_total / self._handler_count * 1000, 2) if self._handler_count else 0.0,
+            "handler_max_ms": round(self._handler_max * 1000, 2),
+            "delivery_avg_ms": round(self._delivery_total / self.delivered * 1000, 2) if self.delivered else 0.0,
+            "delivery_max_ms": round(self._delivery_max * 1000, 2),
+            "lateness_max_ms": round(self._lateness_max * 1000, 2)
+        }
@@ -0,0 +1,323 @@
+"""
+Отложенное удаление сообщений одним планировщиком.
+
+Вместо отдельной спящей задачи и отдельного вызова deleteMessage на каждое
+сообщение все отложенные удаления хранятся в очередях по чатам (min-куча по
+моменту удаления). Одна фоновая задача спит до ближайшего срока, забирает из
+каждого наступившего чата все сообщения, срок которых наступил или наступит в
+пределах coalesce_seconds, и удаляет их вызовом deleteMessages - до 100
+сообщений за вызов.
+
+Если задано хранилище (store), удаления с задержкой не меньше
+persist_min_delay сохраняются в базу, чтобы пережить перезапуск бота: при
+старте restore загружает их, и просроченные удаляются сразу, одной пачкой.
+Запись в базу не выполняется в обработчике: новые и выполненные удаления
+копятся в буферах, и одна фоновая задача сбрасывает их общей операцией.
+Если запись не удалась, пачка возвращается в буферы и записывается повторно
+с растущей паузой.
+"""
+import asyncio
+import heapq
+import logging
+import time
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramNetworkError, TelegramRetryAfter, TelegramServerError
+
+logger = logging.getLogger(__name__)
+
+# Ограничение Bot API на количество сообщений в одном вызове deleteMessages
+DELETE_MESSAGES_LIMIT = 100
+
+# Сообщения, срок удаления которых наступит в пределах этого окна, удаляются вместе с наступившими
+DELETE_COALESCE_SECONDS = 1.0
+
+# Удаления с меньшей задержкой не сохраняются в базу: потерять их при сбое почти невозможно
+DELETE_PERSIST_MIN_DELAY = 5
+
+# Пауза перед повторной записью в базу после ошибки: удваивается до максимума
+DELETE_FLUSH_RETRY_DELAY = 1
+DELETE_FLUSH_RETRY_MAX_DELAY = 60
+
+# Сколько секунд при остановке ждать записи буферов в базу
+DELETE_FLUSH_STOP_TIMEOUT = 10
+
+# Временные ошибки: удаление повторяется через retry_after из ответа Telegram или с растущей
+# паузой, не больше DELETE_MAX_RETRIES раз. После этого сохранённое удаление остаётся в базе
+# до перезапуска. При остальных ошибках (сообщение не найдено, нет прав, бот исключён из чата)
+# повтор не поможет, и запись убирается из базы
+RETRYABLE_DELETE_ERRORS = (TelegramRetryAfter, TelegramNetworkError, TelegramServerError)
+DELETE_MAX_RETRIES = 5
+DELETE_RETRY_DELAY = 1
+DELETE_RETRY_MAX_DELAY = 60
+
+
+class DeletionScheduler:
+    """Очереди отложенных удалений по чатам и одна задача, удаляющая сообщения пачками"""
+
+    def __init__(
+        self,
+        coalesce_seconds: float = DELETE_COALESCE_SECONDS,
+        batch_limit: int = DELETE_MESSAGES_LIMIT,
+        store: Optional[Any] = None,
+        persist_min_delay: float = DELETE_PERSIST_MIN_DELAY
+    ):
+        self.coalesce_seconds = coalesce_seconds
+        self.batch_limit = batch_limit
+        # Хранилище с методами load() и apply(saves, removes), например db.deletion_store.DeletionStore
+        self.store = store
+        self.persist_min_delay = persist_min_delay
+        # Сохранённые в базу удаления, ещё не выполненные
+        self._persisted: Set[Tuple[int, int]] = set()
+        # (chat_id, message_id) -> число неудачных попыток удаления из-за временных ошибок
+        self._attempts: Dict[Tuple[int, int], int] = {}
+        # Буферы записи в базу: новые (chat_id, message_id, due_ts) и выполненные (chat_id, message_id)
+        self._unsaved: List[Tuple[int, int, int]] = []
+        self._removed: List[Tuple[int, int]] = []
+        self._flush_task: Optional[asyncio.Task] = None
+        # chat_id -> куча (момент удаления по time.monotonic(), message_id)
+        self._chats: Dict[int, List[Tuple[float, int]]] = {}
+        # Куча (ближайший момент удаления в чате, chat_id); может содержать устаревшие записи
+        self._due: List[Tuple[float, int]] = []
+        self._pending = 0
+        self._bot: Optional[Bot] = None
+        # Событие и задача создаются в работающем цикле событий
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+
+        self.scheduled = 0
+        self.deleted = 0
+        self.api_calls = 0
+        self.failed_calls = 0
+        # Повторно поставленные в очередь сообщения и сообщения, для которых повторы исчерпаны
+        self.retries = 0
+        self.retries_exhausted = 0
+        # Сообщения, удаление которых отменено из-за постоянной ошибки
+        self.dropped = 0
+        self.persist_batches = 0
+        self.persist_failures = 0
+        self.restored = 0
+
+    def schedule(self, bot: Bot, chat_id: int, message_id: int, delay_seconds: float) -> None:
+        """Ставит сообщение в очередь на удаление через delay_seconds"""
+        self._push(bot, chat_id, message_id, delay_seconds)
+        self.scheduled += 1
+        if self.store is not None and delay_seconds >= self.persist_min_delay:
+            self._persisted.add((chat_id, message_id))
+            self._unsaved.append((chat_id, message_id, int(time.time() + delay_seconds)))
+            self._schedule_flush()
+
+    async def restore(self, bot: Bot) -> int:
+        """Загружает сохранённые удаления; просроченные будут выполнены сразу"""
+        if self.store is None:
+            return 0
+        rows = await self.store.load()
+        now = time.time()
+        overdue = 0
+        for chat_id, message_id, due_ts in rows:
+            self._persisted.add((chat_id, message_id))
+            self._push(bot, chat_id, message_id, due_ts - now)
+            if due_ts <= now:
+                overdue += 1
+        self.scheduled += len(rows)
+        self.restored += len(rows)
+        logger.info(f"Восстановлено отложенных удалений: {len(rows)}, из них просроченных: {overdue}")
+        return len(rows)
+
+    def _push(self, bot: Bot, chat_id: int, message_id: int, delay_seconds: float) -> None:
+        self._bot = bot
+        due = time.monotonic() + max(delay_seconds, 0)
+        queue = self._chats.get(chat_id)
+        if queue is None:
+            queue = self._chats[chat_id] = []
+        heapq.heappush(queue, (due, message_id))
+        self._pending += 1
+
+        self._ensure_started()
+        # Новое сообщение стало первым в очереди чата: чат нужно разбудить раньше
+        if queue[0] == (due, message_id):
+            heapq.heappush(self._due, (due, chat_id))
+            if self._due[0] == (due, chat_id):
+                self._wakeup.set()
+
+    def _ensure_started(self) -> None:
+        if self._task is not None and not self._task.done():
+            return
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Останавливает задачу и сохраняет буферы; неудалённые сообщения остаются в очереди"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if (self._flush_task is None or self._flush_task.done()) and (self._unsaved or self._removed):
+            self._schedule_flush()
+        if self._flush_task is not None and not self._flush_task.done():
+            try:
+                await asyncio.wait_for(self._flush_task, DELETE_FLUSH_STOP_TIMEOUT)
+            except asyncio.TimeoutError:
+                logger.error(
+                    f"Не сохранено отложенных удалений при остановке: "
+                    f"новых {len(self._unsaved)}, выполненных {len(self._removed)}"
+                )
+
+    def _schedule_flush(self) -> None:
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self._flush())
+
+    async def _flush(self) -> None:
+        """Сохраняет новые удаления и удаляет из базы выполненные"""
+        # Даём накопиться удалениям, запланированным в той же итерации цикла событий
+        await asyncio.sleep(0)
+        retry_delay = DELETE_FLUSH_RETRY_DELAY
+        while self._unsaved or self._removed:
+            saves, self._unsaved = self._unsaved, []
+            removes, self._removed = self._removed, []
+            try:
+                await self.store.apply(saves, removes)
+                self.persist_batches += 1
+                retry_delay = DELETE_FLUSH_RETRY_DELAY
+            except Exception as e:
+                self.persist_failures += 1
+                # Пачка возвращается в буферы перед изменениями, накопленными за время записи
+                self._unsaved = saves + self._unsaved
+                self._removed = removes + self._removed
+                logger.error(f"Ошибка при сохранении отложенных удалений, повтор через {retry_delay} с: {str(e)}")
+                await asyncio.sleep(retry_delay)
+                retry_delay = min(retry_delay * 2, DELETE_FLUSH_RETRY_MAX_DELAY)
+
+    def _take_due(self, now: float) -> List[Tuple[int, List[int]]]:
+        """Забирает из очередей все наступившие сообщения, сгруппированные по чатам"""
+        batches = []
+        limit = now + self.coalesce_seconds
+        while self._due and self._due[0][0] <= now:
+            due, chat_id = heapq.heappop(self._due)
+            queue = self._chats.get(chat_id)
+            if not queue or queue[0][0] != due:
+                # Запись устарела: у чата уже есть запись для его текущего первого сообщения
+                continue
+            message_ids = []
+            while queue and queue[0][0] <= limit:
+                message_ids.append(heapq.heappop(queue)[1])
+            self._pending -= len(message_ids)
+            if queue:
+                heapq.heappush(self._due, (queue[0][0], chat_id))
+            else:
+                del self._chats[chat_id]
+            for start in range(0, len(message_ids), self.batch_limit):
+                batches.append((chat_id, message_ids[start:start + self.batch_limit]))
+        return batches
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                self._wakeup.clear()
+                if not self._due:
+                    await self._wakeup.wait()
+                    continue
+
+                delay = self._due[0][0] - time.monotonic()
+                if delay > 0:
+                    try:
+                        await asyncio.wait_for(self._wakeup.wait(), delay)
+                    except asyncio.TimeoutError:
+                        pass
+                    continue
+
+                batches = self._take_due(time.monotonic())
+                if batches:
+                    await asyncio.gather(*(self._delete(chat_id, ids) for chat_id, ids in batches))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Ошибка в планировщике удаления сообщений: {str(e)}")
+                await asyncio.sleep(1)
+
+    async def _delete(self, chat_id: int, message_ids: List[int]) -> None:
+        self.api_calls += 1
+        try:
+            if len(message_ids) == 1:
+                await self._bot.delete_message(chat_id, message_ids[0])
+            else:
+                # Сообщения, которые уже удалены или не найдены, Bot API пропускает
+                await self._bot.delete_messages(chat_id, message_ids)
+            self.deleted += len(message_ids)
+            logger.info(f"Удалено сообщений из чата {chat_id}: {len(message_ids)}")
+        except RETRYABLE_DELETE_ERRORS as e:
+            self.failed_calls += 1
+            self._retry(chat_id, message_ids, e)
+            return
+        except Exception as e:
+            self.failed_calls += 1
+            self.dropped += len(message_ids)
+            logger.error(f"Ошибка при удалении сообщений {message_ids} из чата {chat_id}, удаление отменено: {str(e)}")
+
+        if self._attempts:
+            for message_id in message_ids:
+                self._attempts.pop((chat_id, message_id), None)
+        if self._persisted:
+            for message_id in message_ids:
+                key = (chat_id, message_id)
+                if key in self._persisted:
+                    self._persisted.remove(key)
+                    self._removed.append(key)
+            if self._removed:
+                self._schedule_flush()
+
+    def _retry(self, chat_id: int, message_ids: List[int], error: Exception) -> None:
+        """Возвращает сообщения в очередь после временной ошибки"""
+        retry_after = error.retry_after if isinstance(error, TelegramRetryAfter) else None
+        exhausted = []
+        for message_id in message_ids:
+            key = (chat_id, message_id)
+            attempt = self._attempts.get(key, 0) + 1
+            if attempt > DELETE_MAX_RETRIES:
+                del self._attempts[key]
+                # Сохранённое удаление остаётся в базе и будет повторено после перезапуска
+                self._persisted.discard(key)
+                exhausted.append(message_id)
+                continue
+            self._attempts[key] = attempt
+            if retry_after is not None:
+                delay = retry_after
+            else:
+                delay = min(DELETE_RETRY_DELAY * 2 ** (attempt - 1), DELETE_RETRY_MAX_DELAY)
+            self._push(self._bot, chat_id, message_id, delay)
+            self.retries += 1
+
+        if exhausted:
+            self.retries_exhausted += len(exhausted)
+            logger.error(
+                f"Не удалось удалить сообщения {exhausted} из чата {chat_id} "
+                f"за {DELETE_MAX_RETRIES} повторов: {str(error)}"
+            )
+        if len(exhausted) < len(message_ids):
+            logger.warning(
+                f"Временная ошибка при удалении сообщений из чата {chat_id}, "
+                f"удаление повторится: {str(error)}"
+            )
+
+    def stats(self) -> Dict[str, Any]:
+        """Возвращает количество ожидающих удалений и сэкономленных вызовов API"""
+        return {
+            "pending": self._pending,
+            "chats": len(self._chats),
+            "scheduled": self.scheduled,
+            "deleted": self.deleted,
+            "api_calls": self.api_calls,
+            "calls_saved": self.deleted - (self.api_calls - self.failed_calls),
+            "failed_calls": self.failed_calls,
+            "dropped": self.dropped,
+            "retries": self.retries,
+            "retries_exhausted": self.retries_exhausted,
+            "persisted": len(self._persisted),
+            "persist_batches": self.persist_batches,
+            "persist_failures": self.persist_failures,
+            "restored": self.restored
+        }
@@ -0,0 +1,392 @@
+"""
+Очередь исходящих действий бота с ограничением скорости.
+
+Ответы, уведомления и наказания не вызывают Bot API напрямую, а ставятся в
+очередь с классом приоритета. Одна фоновая задача выбирает самое приоритетное
+действие среди чатов, которые сейчас можно обслужить, и запускает его, соблюдая
+два ограничения (token bucket): общее для бота (~30 сообщений в секунду) и
+отдельное для каждого чата (~20 сообщений в минуту в группе). Действия без
+chat_id (ограничения и баны участников) учитываются только в общем лимите.
+
+Если Telegram всё же отвечает RetryAfter, чат (или вся очередь для действий
+без chat_id) приостанавливается на указанное время, а действие возвращается в
+очередь на своё место.
+
+submit ждёт результат действия как при прямом вызове и возвращает его
+исключение, если действие не удалось. Ожидание длится до ответа Telegram и
+включает паузы лимитов, поэтому submit ждут только там, где результат нужен
+(наказания, отложенные задачи). Обработчик обновления ставит косметические
+ответы и уведомления через enqueue: действие встаёт в очередь, а его ошибка
+логируется самой очередью.
+"""
+import asyncio
+import functools
+import heapq
+import itertools
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+from aiogram.exceptions import TelegramRetryAfter
+
+logger = logging.getLogger(__name__)
+
+# Классы приоритета: меньшее значение обслуживается раньше
+PRIORITY_PENALTY = 0
+PRIORITY_ADMIN = 1
+PRIORITY_WARNING = 2
+PRIORITY_COSMETIC = 3
+
+PRIORITY_NAMES = {
+    PRIORITY_PENALTY: "penalty",
+    PRIORITY_ADMIN: "admin",
+    PRIORITY_WARNING: "warning",
+    PRIORITY_COSMETIC: "cosmetic",
+}
+
+# Лимиты Bot API: сообщений в секунду для бота и сообщений в минуту для одной группы
+GLOBAL_RATE_PER_SECOND = 30
+CHAT_RATE_PER_MINUTE = 20
+
+# Сколько раз повторять действие после RetryAfter, прежде чем вернуть ошибку
+MAX_RETRIES = 3
+
+# Сколько секунд при остановке ждать отправки уже поставленных действий
+SEND_QUEUE_DRAIN_TIMEOUT = 5
+
+# Действие в очереди: [priority, seq, момент постановки, factory, future, число повторов]
+_Item = List[Any]
+
+
+class TokenBucket:
+    """Token bucket: capacity токенов, пополняется со скоростью rate токенов в секунду"""
+
+    __slots__ = ("rate", "capacity", "tokens", "updated")
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        if now > self.updated:
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+
+    def delay(self, now: float) -> float:
+        """Сколько секунд ждать до появления токена (0 - токен есть)"""
+        self._refill(now)
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def take(self, now: float) -> None:
+        self._refill(now)
+        self.tokens -= 1
+
+    def drain(self, now: float, seconds: float) -> None:
+        """Забирает токены так, чтобы следующий появился не раньше чем через seconds"""
+        self._refill(now)
+        self.tokens = min(self.tokens, 1 - seconds * self.rate)
+
+    def is_full(self, now: float) -> bool:
+        self._refill(now)
+        return self.tokens >= self.capacity
+
+
+class OutboundQueue:
+    """Приоритетная очередь исходящих действий с общим и поканальным лимитом скорости"""
+
+    def __init__(
+        self,
+        global_rate: float = GLOBAL_RATE_PER_SECOND,
+        chat_rate_per_minute: float = CHAT_RATE_PER_MINUTE,
+        max_retries: int = MAX_RETRIES
+    ):
+        self.max_retries = max_retries
+        self._global = TokenBucket(global_rate, global_rate)
+        self._chat_rate = chat_rate_per_minute
+        # chat_id -> лимит чата; полные лимиты простаивающих чатов удаляются
+        self._buckets: Dict[int, TokenBucket] = {}
+        # chat_id (None - действия без лимита чата) -> куча действий по (priority, seq)
+        self._chats: Dict[Optional[int], List[_Item]] = {}
+        # Куча (priority, seq, chat_id) первых действий чатов, которые можно обслужить;
+        # может содержать устаревшие записи
+        self._ready: List[Tuple[int, int, Optional[int]]] = []
+        # Куча (момент готовности, chat_id) приостановленных чатов и множество этих чатов
+        self._throttled: List[Tuple[float, Optional[int]]] = []
+        self._throttled_chats: Set[Optional[int]] = set()
+        self._seq = itertools.count()
+        self._inflight: Set[asyncio.Task] = set()
+        self._depth = {priority: 0 for priority in PRIORITY_NAMES}
+        # Событие и задача создаются в работающем цикле событий
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+
+        self.submitted = 0
+        self.sent = 0
+        self.failed = 0
+        self.retry_after = 0
+        self.max_depth = 0
+        self._started = 0
+        self._latency_total = 0.0
+        self._latency_max = 0.0
+
+    def configure(self, global_rate: float, chat_rate_per_minute: float) -> None:
+        """Меняет лимиты; уже созданные лимиты чатов сбрасываются"""
+        self._global = TokenBucket(global_rate, global_rate)
+        self._chat_rate = chat_rate_per_minute
+        self._buckets.clear()
+
+    async def submit(
+        self,
+        chat_id: Optional[int],
+        priority: int,
+        factory: Callable[[], Awaitable[Any]]
+    ) -> Any:
+        """
+        Ставит действие в очередь и возвращает его результат.
+        factory создаёт новую корутину при каждом вызове, чтобы действие можно было повторить.
+        chat_id=None - действие не считается сообщением в чат и ограничено только общим лимитом.
+        Ждёт ответа Telegram и пауз лимитов: в обработчике обновления используйте enqueue.
+        """
+        return await self._enqueue(chat_id, priority, factory)
+
+    def enqueue(
+        self,
+        chat_id: Optional[int],
+        priority: int,
+        factory: Callable[[], Awaitable[Any]]
+    ) -> "asyncio.Future[Any]":
+        """
+        Ставит действие в очередь, не дожидаясь его выполнения.
+        Ошибка действия логируется; возвращаемый future ждать не обязательно.
+        """
+        future = self._enqueue(chat_id, priority, factory)
+        future.add_done_callback(functools.partial(self._log_failure, chat_id, priority))
+        return future
+
+    def _enqueue(
+        self,
+        chat_id: Optional[int],
+        priority: int,
+        factory: Callable[[], Awaitable[Any]]
+    ) -> "asyncio.Future[Any]":
+        future = asyncio.get_running_loop().create_future()
+        item = [priority, next(self._seq), time.monotonic(), factory, future, 0]
+        self.submitted += 1
+        self._push(chat_id, item)
+        return future
+
+    @staticmethod
+    def _log_failure(chat_id: Optional[int], priority: int, future: "asyncio.Future[Any]") -> None:
+        if future.cancelled():
+            return
+        error = future.exception()
+        if error is not None:
+            logger.error(
+                f"Ошибка при отправке в чат {chat_id} "
+                f"(приоритет {PRIORITY_NAMES.get(priority, priority)}): {str(error)}"
+            )
+
+    def _push(self, chat_id: Optional[int], item: _Item) -> None:
+        queue = self._chats.get(chat_id)
+        if queue is None:
+            queue = self._chats[chat_id] = []
+        heapq.heappush(queue, item)
+        self._depth[item[0]] += 1
+        depth = sum(self._depth.values())
+        if depth > self.max_depth:
+            self.max_depth = depth
+
+        self._ensure_started()
+        if chat_id not in self._throttled_chats and queue[0] is item:
+            heapq.heappush(self._ready, (item[0], item[1], chat_id))
+            self._wakeup.set()
+
+    def _ensure_started(self) -> None:
+        if self._task is not None and not self._task.done():
+            return
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self, timeout: float = SEND_QUEUE_DRAIN_TIMEOUT) -> None:
+        """Дожидается отправки поставленных действий (не дольше timeout) и останавливает задачу"""
+        pending = [item[4] for queue in self._chats.values() for item in queue]
+        if pending and self._task is not None:
+            _, not_sent = await asyncio.wait(pending, timeout=timeout)
+            if not_sent:
+                logger.warning(f"Не отправлено действий из очереди при остановке: {len(not_sent)}")
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._inflight:
+            await asyncio.gather(*self._inflight, return_exceptions=True)
+        # Невыполненные действия завершаются ошибкой, чтобы вызывающие не ждали вечно
+        for queue in self._chats.values():
+            for item in queue:
+                if not item[4].done():
+                    item[4].set_exception(RuntimeError("Очередь отправки остановлена"))
+        self._chats.clear()
+        self._ready.clear()
+        self._throttled.clear()
+        self._throttled_chats.clear()
+        self._depth = {priority: 0 for priority in PRIORITY_NAMES}
+
+    def _bucket(self, chat_id: Optional[int]) -> Optional[TokenBucket]:
+        if chat_id is None:
+            return None
+        bucket = self._buckets.get(chat_id)
+        if bucket is None:
+            bucket = self._buckets[chat_id] = TokenBucket(self._chat_rate / 60, self._chat_rate)
+        return bucket
+
+    def _throttle(self, chat_id: Optional[int], until: float) -> None:
+        if chat_id in self._throttled_chats:
+            return
+        self._throttled_chats.add(chat_id)
+        heapq.heappush(self._throttled, (until, chat_id))
+
+    def _release_throttled(self, now: float) -> None:
+        """Возвращает в обслуживание чаты, пауза которых закончилась"""
+        while self._throttled and self._throttled[0][0] <= now:
+            _, chat_id = heapq.heappop(self._throttled)
+            self._throttled_chats.discard(chat_id)
+            queue = self._chats.get(chat_id)
+            if queue:
+                heapq.heappush(self._ready, (queue[0][0], queue[0][1], chat_id))
+
+    def _pop_ready(self, now: float) -> Optional[Tuple[Optional[int], _Item]]:
+        """Забирает самое приоритетное действие среди чатов, у которых есть токен"""
+        while self._ready:
+            priority, seq, chat_id = heapq.heappop(self._ready)
+            queue = self._chats.get(chat_id)
+            if not queue or queue[0][1] != seq or chat_id in self._throttled_chats:
+                # Запись устарела: первое действие чата уже другое или чат приостановлен
+                continue
+            bucket = self._bucket(chat_id)
+            if bucket is not None:
+                delay = bucket.delay(now)
+                if delay > 0:
+                    self._throttle(chat_id, now + delay)
+                    continue
+                bucket.take(now)
+            item = heapq.heappop(queue)
+            self._depth[item[0]] -= 1
+            if queue:
+                heapq.heappush(self._ready, (queue[0][0], queue[0][1], chat_id))
+            else:
+                del self._chats[chat_id]
+            return chat_id, item
+        return None
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                self._wakeup.clear()
+                now = time.monotonic()
+                self._release_throttled(now)
+
+                if self._ready:
+                    delay = self._global.delay(now)
+                    if delay > 0:
+                        await asyncio.sleep(delay)
+                        continue
+                    popped = self._pop_ready(now)
+                    if popped is not None:
+                        self._global.take(now)
+                        chat_id, item = popped
+                        task = asyncio.create_task(self._execute(chat_id, item))
+                        self._inflight.add(task)
+                        task.add_done_callback(self._inflight.discard)
+                    continue
+
+                timeout = self._throttled[0][0] - now if self._throttled else None
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Ошибка в очереди отправки: {str(e)}")
+                await asyncio.sleep(1)
+
+    async def _execute(self, chat_id: Optional[int], item: _Item) -> None:
+        priority, _, enqueued_at, factory, future, retries = item
+        if future.done():
+            # Вызывающий перестал ждать результат (задача отменена)
+            return
+        if retries == 0:
+            # Задержка считается от постановки в очередь до первой попытки
+            latency = time.monotonic() - enqueued_at
+            self._started += 1
+            self._latency_total += latency
+            if latency > self._latency_max:
+                self._latency_max = latency
+
+        try:
+            result = await factory()
+        except TelegramRetryAfter as e:
+            self.retry_after += 1
+            if retries >= self.max_retries:
+                self.failed += 1
+                if not future.done():
+                    future.set_exception(e)
+                return
+            logger.warning(
+                f"Превышен лимит Telegram для чата {chat_id}, пауза {e.retry_after} с "
+                f"(приоритет {PRIORITY_NAMES.get(priority, priority)})"
+            )
+            now = time.monotonic()
+            if chat_id is None:
+                # Лимит на действия без чата - общий: притормаживаем всю очередь
+                self._global.drain(now, e.retry_after)
+            else:
+                self._bucket(chat_id).drain(now, e.retry_after)
+            item[5] = retries + 1
+            # Действие сохраняет исходный seq и встаёт перед более поздними того же приоритета
+            self._push(chat_id, item)
+            return
+        except Exception as e:
+            self.failed += 1
+            if not future.done():
+                future.set_exception(e)
+            return
+
+        self.sent += 1
+        if not future.done():
+            future.set_result(result)
+        self._trim_buckets()
+
+    def _trim_buckets(self) -> None:
+        """Удаляет полные лимиты чатов без ожидающих действий, чтобы словарь не рос бесконечно"""
+        if len(self._buckets) <= 1000:
+            return
+        now = time.monotonic()
+        for chat_id in [c for c, b in self._buckets.items() if c not in self._chats and b.is_full(now)]:
+            del self._buckets[chat_id]
+
+    def stats(self) -> Dict[str, Any]:
+        """Возвращает глубину очереди по приоритетам, задержку и количество RetryAfter"""
+        return {
+            "depth": {PRIORITY_NAMES[p]: n for p, n in self._depth.items()},
+            "max_depth": self.max_depth,
+            "inflight": len(self._inflight),
+            "throttled_chats": len(self._throttled_chats),
+            "submitted": self.submitted,
+            "sent": self.sent,
+            "failed": self.failed,
+            "retry_after": self.retry_after,
+            "avg_latency_ms": round(self._latency_total / self._started * 1000, 2) if self._started else 0.0,
+            "max_latency_ms": round(self._latency_max * 1000, 2)
+        }
+
+
+# Общая очередь исходящих действий бота
+send_queue = OutboundQueue()
@@ -0,0 +1,202 @@
+"""
+Обработка обновлений по шардам чатов.
+
+Если каждое обновление обрабатывается отдельной задачей, два сообщения одного
+чата могут обрабатываться одновременно, и правила увидят ленту чата и историю
+пользователя в промежуточном состоянии (оба сообщения не видят предыдущего).
+Последовательная обработка исключает гонки, но лишает параллельности между
+группами.
+
+Промежуточный слой (outer middleware диспетчера) раскладывает обновления по
+шардам по chat_id: у каждого шарда своя ограниченная очередь и одна задача,
+обрабатывающая её по порядку. Обновления одного чата всегда попадают в один
+шард и обрабатываются строго по очереди, разные шарды работают параллельно.
+Когда очередь шарда заполнена, постановка ждёт освобождения места - поллинг
+приостанавливается, а не копит обновления в памяти без ограничений.
+
+Промежуточный слой возвращает управление aiogram сразу после постановки в
+очередь, поэтому ErrorsMiddleware диспетчера ошибку обработчика уже не увидит.
+Задача шарда сама вызывает обработчик через ErrorsMiddleware диспетчера из
+data["dispatcher"], и ошибки по-прежнему доходят до обработчиков router.errors.
+По той же причине строка aiogram "Update id=... is handled. Duration N ms"
+показывает только время постановки в очередь; реальное время обработки
+учитывается в статистике шардов (avg_handle_ms, max_handle_ms).
+"""
+import asyncio
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from aiogram.dispatcher.middlewares.error import ErrorsMiddleware
+from aiogram.types import TelegramObject
+
+logger = logging.getLogger(__name__)
+
+# Количество шардов и размер очереди каждого
+UPDATE_SHARDS = 16
+UPDATE_SHARD_QUEUE_SIZE = 1000
+
+# Сколько секунд при остановке ждать обработки уже принятых обновлений
+UPDATE_SHARDS_DRAIN_TIMEOUT = 10
+
+Handler = Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]]
+
+
+class _Shard:
+    """Очередь и задача одного шарда со статистикой задержки"""
+
+    __slots__ = (
+        "queue", "task", "processed", "errors", "waits",
+        "lag_total", "lag_max", "handle_total", "handle_max"
+    )
+
+    def __init__(self, max_queue: int):
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=max_queue)
+        self.task: Optional[asyncio.Task] = None
+        self.processed = 0
+        self.errors = 0
+        # Сколько раз постановка в очередь ждала свободного места
+        self.waits = 0
+        self.lag_total = 0.0
+        self.lag_max = 0.0
+        self.handle_total = 0.0
+        self.handle_max = 0.0
+
+
+class ShardedUpdateDispatcher:
+    """Outer middleware: обновления одного чата по порядку, разных шардов - параллельно"""
+
+    def __init__(self, shards: int = UPDATE_SHARDS, max_queue: int = UPDATE_SHARD_QUEUE_SIZE):
+        self.shard_count = shards
+        self.max_queue = max_queue
+        # Очереди и задачи создаются в работающем цикле событий
+        self._shards: List[_Shard] = []
+        # ErrorsMiddleware диспетчера, через который вызываются обработчики
+        self._errors: Optional[ErrorsMiddleware] = None
+
+    def configure(self, shards: int, max_queue: int) -> None:
+        """Меняет количество шардов и размер очередей; действует только до первого обновления"""
+        if self._shards:
+            logger.warning("Шарды обновлений уже запущены, новые настройки не применяются")
+            return
+        self.shard_count = max(1, shards)
+        self.max_queue = max(1, max_queue)
+
+    @staticmethod
+    def _key(data: Dict[str, Any]) -> int:
+        """Ключ шарда: чат обновления, для обновлений без чата - пользователь"""
+        chat = data.get("event_chat")
+        if chat is not None:
+            return chat.id
+        user = data.get("event_from_user")
+        if user is not None:
+            return user.id
+        return 0
+
+    def _ensure_started(self) -> None:
+        if not self._shards:
+            self._shards = [_Shard(self.max_queue) for _ in range(self.shard_count)]
+        for shard in self._shards:
+            if shard.task is None or shard.task.done():
+                shard.task = asyncio.create_task(self._run(shard))
+
+    async def __call__(self, handler: Handler, event: TelegramObject, data: Dict[str, Any]) -> Any:
+        if not self._shards:
+            self._ensure_started()
+        shard = self._shards[self._key(data) % self.shard_count]
+        if shard.task is None or shard.task.done():
+            # Задача шарда завершилась с ошибкой - перезапускаем
+            self._ensure_started()
+        entry = (handler, event, data, time.monotonic())
+        if shard.queue.full():
+            shard.waits += 1
+        # Если очередь заполнена, ждём места: так поллинг не опережает обработку
+        await shard.queue.put(entry)
+
+    async def _run(self, shard: _Shard) -> None:
+        while True:
+            handler, event, data, enqueued_at = await shard.queue.get()
+            started = time.monotonic()
+            try:
+                lag = started - enqueued_at
+                shard.lag_total += lag
+                if lag > shard.lag_max:
+                    shard.lag_max = lag
+                errors = self._errors_middleware(data)
+                if errors is not None:
+                    # Ошибку, обработанную router.errors, ErrorsMiddleware не выбрасывает
+                    await errors(handler, event, data)
+                else:
+                    await handler(event, data)
+                shard.processed += 1
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                shard.errors += 1
+                logger.error(f"Ошибка при обработке обновления: {str(e)}", exc_info=True)
+            finally:
+                elapsed = time.monotonic() - started
+                shard.handle_total += elapsed
+                if elapsed > shard.handle_max:
+                    shard.handle_max = elapsed
+                shard.queue.task_done()
+
+    def _errors_middleware(self, data: Dict[str, Any]) -> Optional[ErrorsMiddleware]:
+        """Возвращает ErrorsMiddleware диспетчера обновления (без диспетчера - None)"""
+        dispatcher = data.get("dispatcher")
+        if dispatcher is None:
+            return None
+        if self._errors is None or self._errors.router is not dispatcher:
+            self._errors = ErrorsMiddleware(dispatcher)
+        return self._errors
+
+    async def stop(self, timeout: float = UPDATE_SHARDS_DRAIN_TIMEOUT) -> None:
+        """Дожидается обработки принятых обновлений (не дольше timeout) и останавливает задачи"""
+        if not self._shards:
+            return
+        try:
+            await asyncio.wait_for(
+                asyncio.gather(*(shard.queue.join() for shard in self._shards)), timeout
+            )
+        except asyncio.TimeoutError:
+            pending = sum(shard.queue.qsize() for shard in self._shards)
+            logger.warning(f"Не обработано обновлений при остановке: {pending}")
+        for shard in self._shards:
+            if shard.task is not None:
+                shard.task.cancel()
+                try:
+                    await shard.task
+                except asyncio.CancelledError:
+                    pass
+                shard.task = None
+        self._shards = []
+
+    def stats(self) -> Dict[str, Any]:
+        """Возвращает глубину очередей, задержку начала и время обработки по шардам"""
+        per_shard = []
+        for shard in self._shards:
+            started = shard.processed + shard.errors
+            per_shard.append({
+                "depth": shard.queue.qsize(),
+                "processed": shard.processed,
+                "errors": shard.errors,
+                "waits": shard.waits,
+                "avg_lag_ms": round(shard.lag_total / started * 1000, 2) if started else 0.0,
+                "max_lag_ms": round(shard.lag_max * 1000, 2),
+                "avg_handle_ms": round(shard.handle_total / started * 1000, 2) if started else 0.0,
+                "max_handle_ms": round(shard.handle_max * 1000, 2)
+            })
+        return {
+            "shards": self.shard_count,
+            "pending": sum(s["depth"] for s in per_shard),
+            "processed": sum(s["processed"] for s in per_shard),
+            "errors": sum(s["errors"] for s in per_shard),
+            "waits": sum(s["waits"] for s in per_shard),
+            "max_lag_ms": max((s["max_lag_ms"] for s in per_shard), default=0.0),
+            "max_handle_ms": max((s["max_handle_ms"] for s in per_shard), default=0.0),
+            "per_shard": per_shard
+        }
+
+
+# Шарды обработки обновлений бота
+update_shards = ShardedUpdateDispatcher()
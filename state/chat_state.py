@@ -0,0 +1,50 @@
+"""
+Состояние чатов, необходимое правилам проверки сообщений.
+
+Объединяет ленты сообщений чатов и истории сообщений пользователей. Все
+операции синхронные и не обращаются к Telegram или базе данных.
+"""
+from collections import defaultdict
+from typing import Dict, Optional
+
+from state.chat_timeline import ChatTimeline
+from state.user_history import HistoryEntry, UserHistoryStore
+
+
+class ChatState:
+    """Ленты сообщений чатов и истории сообщений пользователей"""
+
+    def __init__(self, history: Optional[UserHistoryStore] = None):
+        # chat_id -> лента сообщений чата
+        self.timelines: Dict[int, ChatTimeline] = defaultdict(ChatTimeline)
+        # (chat_id, user_id) -> последние сообщения пользователя
+        self.history = history if history is not None else UserHistoryStore()
+
+    def timeline(self, chat_id: int) -> ChatTimeline:
+        """Возвращает ленту чата, создавая её при первом обращении"""
+        return self.timelines[chat_id]
+
+    def previous(self, chat_id: int, user_id: int) -> Optional[HistoryEntry]:
+        """Возвращает последнее сохранённое сообщение пользователя в чате"""
+        return self.history.previous(chat_id, user_id)
+
+    def has_other_messages_since(self, chat_id: int, user_id: int, since_seq: int) -> bool:
+        """
+        Проверяет, были ли сообщения от других пользователей после сообщения пользователя
+
+        Args:
+            chat_id: ID чата
+            user_id: ID пользователя, чьи сообщения проверяются
+            since_seq: Номер предыдущего сообщения пользователя в ленте чата
+
+        Returns:
+            True, если после since_seq в чат писал кто-то другой
+        """
+        timeline = self.timelines.get(chat_id)
+        if timeline is None:
+            return False
+        return timeline.has_other_messages_since(user_id, since_seq)
+
+    def clear(self) -> None:
+        self.timelines.clear()
+        self.history.clear()
@@ -0,0 +1,115 @@
+"""
+Лента сообщений чата с монотонными порядковыми номерами.
+
+Каждому сообщению в чате присваивается номер seq. Помимо самих записей лента
+хранит маркеры последнего сообщения (номер и автор) и номер начала текущей
+серии сообщений последнего автора. Этого достаточно, чтобы за O(1) ответить,
+писал ли кто-то другой после сообщения пользователя с номером since_seq.
+
+Записи хранятся по столбцам в массивах array('q')/array('d') без упаковки
+каждого значения в отдельный объект. Устаревшие записи отсекаются сдвигом
+начала ленты, а память освобождается пакетно, когда отсеченная часть
+становится не меньше живой (амортизированно O(1) на запись).
+"""
+import sys
+from array import array
+from bisect import bisect_left
+from typing import Iterator, Optional, Tuple
+
+# Минимальное количество отсеченных записей, при котором массивы уплотняются
+COMPACT_MIN_ENTRIES = 256
+
+
+class ChatTimeline:
+    """Лента сообщений одного чата"""
+
+    __slots__ = (
+        "last_seq", "last_user_id", "run_start_seq",
+        "_message_ids", "_user_ids", "_timestamps", "_head", "_base_seq"
+    )
+
+    def __init__(self):
+        # Номер последнего сообщения в чате (0 - сообщений ещё не было)
+        self.last_seq = 0
+        # Автор последнего сообщения
+        self.last_user_id: Optional[int] = None
+        # Номер первого сообщения в текущей серии сообщений last_user_id
+        self.run_start_seq = 0
+        # Столбцы записей в порядке поступления
+        self._message_ids = array("q")
+        self._user_ids = array("q")
+        self._timestamps = array("d")
+        # Индекс первой живой записи в массивах
+        self._head = 0
+        # Номер записи с индексом 0 в массивах
+        self._base_seq = 1
+
+    def append(self, message_id: int, user_id: int, timestamp: float) -> int:
+        """Добавляет сообщение в ленту и возвращает присвоенный ему номер"""
+        self.last_seq += 1
+        seq = self.last_seq
+        if user_id != self.last_user_id:
+            self.last_user_id = user_id
+            self.run_start_seq = seq
+        self._message_ids.append(message_id)
+        self._user_ids.append(user_id)
+        self._timestamps.append(timestamp)
+        return seq
+
+    def has_other_messages_since(self, user_id: int, since_seq: int) -> bool:
+        """
+        Проверяет, были ли сообщения других пользователей после сообщения since_seq
+
+        Args:
+            user_id: ID пользователя, которому принадлежит сообщение since_seq
+            since_seq: Номер предыдущего сообщения пользователя
+
+        Returns:
+            True, если после since_seq в чат писал кто-то другой
+        """
+        if self.last_user_id != user_id:
+            return since_seq < self.last_seq
+        # Все сообщения начиная с run_start_seq принадлежат пользователю,
+        # а сообщение перед серией - другому автору
+        return since_seq < self.run_start_seq
+
+    def expire(self, cutoff_ts: float) -> int:
+        """Удаляет записи старше cutoff_ts и возвращает количество удалённых"""
+        # Записи добавляются в порядке времени, поэтому границу можно найти бинарным поиском
+        new_head = bisect_left(self._timestamps, cutoff_ts, self._head)
+        removed = new_head - self._head
+        self._head = new_head
+        if new_head >= COMPACT_MIN_ENTRIES and new_head * 2 >= len(self._timestamps):
+            self._compact()
+        return removed
+
+    def oldest_timestamp(self) -> Optional[float]:
+        """Возвращает время самой старой живой записи"""
+        if self._head >= len(self._timestamps):
+            return None
+        return self._timestamps[self._head]
+
+    def _compact(self) -> None:
+        head = self._head
+        del self._message_ids[:head]
+        del self._user_ids[:head]
+        del self._timestamps[:head]
+        self._base_seq += head
+        self._head = 0
+
+    def __len__(self) -> int:
+        return len(self._timestamps) - self._head
+
+    def __iter__(self) -> Iterator[Tuple[int, int, int, float]]:
+        """Перебирает живые записи (seq, message_id, user_id, timestamp)"""
+        for i in range(self._head, len(self._timestamps)):
+            yield self._base_seq + i, self._message_ids[i], self._user_ids[i], self._timestamps[i]
+
+    def memory_bytes(self) -> int:
+        """Возвращает объём памяти, занимаемый лентой"""
+        return (
+            sys.getsizeof(self)
+            + sys.getsizeof(self._message_ids)
+            + sys.getsizeof(self._user_ids)
+            + sys.getsizeof(self._timestamps)
+        )
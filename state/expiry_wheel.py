@@ -0,0 +1,151 @@
+"""
+Инкрементальное удаление устаревших записей кэшей.
+
+Ключи раскладываются по корзинам времени (колесо таймеров с шагом granularity
+секунд). На каждом тике обрабатываются только наступившие корзины, причём
+порциями: одна порция не занимает цикл событий дольше budget_ms, между
+порциями управление возвращается циклу событий.
+
+Владелец ключей передаёт функцию expire_fn(key, now) -> (expired, deadline):
+она удаляет устаревшие записи ключа и возвращает их количество и новый срок
+проверки ключа (None, если ключ удалён полностью). Повторное планирование уже
+запланированного ключа ничего не делает: при срабатывании корзины ключ будет
+перепланирован на актуальный срок.
+"""
+import asyncio
+import time
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple
+
+# Шаг колеса таймеров в секундах
+EXPIRY_GRANULARITY = 10
+
+# Максимальная длительность одной порции обработки в миллисекундах
+EXPIRY_BUDGET_MS = 5
+
+# Количество ключей, обрабатываемых между проверками бюджета времени
+BUDGET_CHECK_INTERVAL = 32
+
+ExpireFn = Callable[[Hashable, float], Tuple[int, Optional[float]]]
+
+
+class ExpiryWheel:
+    """Колесо таймеров для порционного удаления устаревших ключей"""
+
+    def __init__(
+        self,
+        expire_fn: ExpireFn,
+        granularity: float = EXPIRY_GRANULARITY,
+        budget_ms: float = EXPIRY_BUDGET_MS
+    ):
+        self._expire_fn = expire_fn
+        self.granularity = granularity
+        self.budget_ms = budget_ms
+        # номер корзины -> ключи, срок проверки которых наступает к её началу
+        self._buckets: Dict[int, List[Hashable]] = {}
+        # ключ -> номер корзины, в которой он запланирован
+        self._scheduled: Dict[Hashable, int] = {}
+        # Номер первой необработанной корзины
+        self._cursor: Optional[int] = None
+
+        self.ticks = 0
+        self.slices = 0
+        self.expired_total = 0
+        self.last_tick_expired = 0
+        self.max_pause_ms = 0.0
+
+    def _bucket_for(self, deadline: float) -> int:
+        # Корзина обрабатывается, когда now >= номер * granularity, то есть не раньше срока
+        return int(deadline // self.granularity) + 1
+
+    def schedule(self, key: Hashable, deadline: float) -> None:
+        """Планирует проверку ключа не раньше deadline"""
+        if key in self._scheduled:
+            return
+        bucket = self._bucket_for(deadline)
+        if self._cursor is None:
+            self._cursor = bucket
+        elif bucket < self._cursor:
+            bucket = self._cursor
+        self._buckets.setdefault(bucket, []).append(key)
+        self._scheduled[key] = bucket
+
+    def _due_buckets(self, now: float) -> List[int]:
+        last = int(now // self.granularity)
+        if self._cursor is None or self._cursor > last:
+            return []
+        # После долгого простоя перебираем только существующие корзины
+        if last - self._cursor > len(self._buckets):
+            return sorted(index for index in self._buckets if index <= last)
+        return [index for index in range(self._cursor, last + 1) if index in self._buckets]
+
+    def run_slice(self, now: float) -> Tuple[int, bool]:
+        """
+        Обрабатывает наступившие корзины в пределах бюджета времени
+
+        Returns:
+            Количество удалённых записей и признак того, что все наступившие корзины обработаны
+        """
+        started = time.perf_counter()
+        budget = self.budget_ms / 1000
+        expired = 0
+        processed = 0
+
+        for index in self._due_buckets(now):
+            keys = self._buckets[index]
+            while keys:
+                key = keys.pop()
+                if self._scheduled.get(key) == index:
+                    del self._scheduled[key]
+                    key_expired, deadline = self._expire_fn(key, now)
+                    expired += key_expired
+                    if deadline is not None:
+                        self.schedule(key, deadline)
+                processed += 1
+                if processed % BUDGET_CHECK_INTERVAL == 0 and time.perf_counter() - started >= budget:
+                    self._finish_slice(started)
+                    return expired, False
+            del self._buckets[index]
+            self._cursor = index + 1
+
+        last = int(now // self.granularity)
+        if self._cursor is not None and self._cursor <= last:
+            self._cursor = last + 1
+        self._finish_slice(started)
+        return expired, True
+
+    def _finish_slice(self, started: float) -> None:
+        self.slices += 1
+        pause_ms = (time.perf_counter() - started) * 1000
+        if pause_ms > self.max_pause_ms:
+            self.max_pause_ms = pause_ms
+
+    async def tick(self, now: Optional[float] = None) -> int:
+        """Обрабатывает все наступившие корзины порциями, уступая цикл событий между ними"""
+        if now is None:
+            now = time.time()
+        expired_total = 0
+        while True:
+            expired, done = self.run_slice(now)
+            expired_total += expired
+            if done:
+                break
+            await asyncio.sleep(0)
+
+        self.ticks += 1
+        self.expired_total += expired_total
+        self.last_tick_expired = expired_total
+        return expired_total
+
+    def __len__(self) -> int:
+        return len(self._scheduled)
+
+    def stats(self) -> Dict[str, Any]:
+        """Возвращает счетчики удаления и максимальную паузу цикла событий"""
+        return {
+            "scheduled": len(self._scheduled),
+            "ticks": self.ticks,
+            "slices": self.slices,
+            "expired_total": self.expired_total,
+            "last_tick_expired": self.last_tick_expired,
+            "max_pause_ms": round(self.max_pause_ms, 3)
+        }
@@ -0,0 +1,111 @@
+"""
+Кэш с ограничением размера и временем жизни записей.
+
+Записи хранятся в OrderedDict в порядке последнего обновления. При переполнении
+вытесняется давно не использованная запись, а устаревшие записи снимаются с
+начала словаря при каждой вставке, поэтому очистка стоит амортизированно O(1)
+и не требует периодического обхода всего кэша.
+"""
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+_MISSING = object()
+
+
+class TTLCache:
+    """LRU-кэш с жёстким ограничением размера и TTL записей"""
+
+    def __init__(self, maxsize: int, ttl: float, touch_on_get: bool = False):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        # Продлевать ли позицию записи в LRU-очереди при чтении
+        self.touch_on_get = touch_on_get
+        # ключ -> (значение, момент истечения по time.monotonic())
+        self._data: "OrderedDict[Hashable, Tuple[Any, float]]" = OrderedDict()
+
+        self.hits = 0
+        self.misses = 0
+        self.expirations = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Возвращает значение по ключу или default, если записи нет или она устарела"""
+        entry = self._data.get(key)
+        if entry is None:
+            self.misses += 1
+            return default
+        value, expires_at = entry
+        if expires_at <= time.monotonic():
+            del self._data[key]
+            self.expirations += 1
+            self.misses += 1
+            return default
+        if self.touch_on_get:
+            self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        """Сохраняет значение; ttl переопределяет время жизни по умолчанию"""
+        now = time.monotonic()
+        data = self._data
+        data[key] = (value, now + (self.ttl if ttl is None else ttl))
+        data.move_to_end(key)
+        self._purge(now)
+        while len(data) > self.maxsize:
+            data.popitem(last=False)
+            self.evictions += 1
+
+    def _purge(self, now: float) -> int:
+        """Снимает устаревшие записи с начала очереди"""
+        data = self._data
+        purged = 0
+        while data:
+            key, (_, expires_at) = next(iter(data.items()))
+            if expires_at > now:
+                break
+            del data[key]
+            purged += 1
+        self.expirations += purged
+        return purged
+
+    def purge(self) -> int:
+        """Удаляет устаревшие записи с начала очереди и возвращает их количество"""
+        return self._purge(time.monotonic())
+
+    def peek(self, key: Hashable, default: Any = None) -> Any:
+        """Возвращает значение без учета в статистике и без продления позиции в LRU-очереди"""
+        entry = self._data.get(key)
+        if entry is None or entry[1] <= time.monotonic():
+            return default
+        return entry[0]
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        """Удаляет запись и возвращает её значение"""
+        entry = self._data.pop(key, _MISSING)
+        if entry is _MISSING:
+            return default
+        return entry[0]
+
+    def __contains__(self, key: Hashable) -> bool:
+        """Проверяет наличие действующей записи без учета в статистике, как peek"""
+        entry = self._data.get(key)
+        return entry is not None and entry[1] > time.monotonic()
+
+    def clear(self) -> None:
+        self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> Dict[str, Any]:
+        """Возвращает счетчики попаданий, промахов, истечений и вытеснений"""
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "expirations": self.expirations,
+            "evictions": self.evictions
+        }
@@ -0,0 +1,112 @@
+"""
+Ограниченная история сообщений пользователей в чатах.
+
+История хранится отдельно для каждой пары (chat_id, user_id) в кольцевом буфере
+фиксированного размера: добавление и получение предыдущего сообщения работают
+за O(1), а история пользователя в одной группе не смешивается с другой.
+"""
+import sys
+from typing import Dict, Iterator, List, Optional, Tuple, Any
+
+# Запись истории: (message_id, reply_to_message_id, timestamp, seq)
+HistoryEntry = Tuple[int, Optional[int], float, int]
+
+# Количество последних сообщений, хранимых для каждого пользователя в чате
+HISTORY_CAPACITY = 4
+
+
+class MessageRing:
+    """Кольцевой буфер последних сообщений пользователя"""
+
+    __slots__ = ("_items", "_next", "_size")
+
+    def __init__(self, capacity: int = HISTORY_CAPACITY):
+        self._items: List[Optional[HistoryEntry]] = [None] * capacity
+        self._next = 0
+        self._size = 0
+
+    def append(self, entry: HistoryEntry) -> None:
+        """Добавляет запись, вытесняя самую старую при заполнении буфера"""
+        items = self._items
+        items[self._next] = entry
+        self._next = (self._next + 1) % len(items)
+        if self._size < len(items):
+            self._size += 1
+
+    def last(self) -> Optional[HistoryEntry]:
+        """Возвращает последнюю добавленную запись"""
+        if not self._size:
+            return None
+        return self._items[self._next - 1]
+
+    def __len__(self) -> int:
+        return self._size
+
+    def __iter__(self) -> Iterator[HistoryEntry]:
+        """Перебирает записи от старых к новым"""
+        capacity = len(self._items)
+        start = (self._next - self._size) % capacity
+        for i in range(self._size):
+            yield self._items[(start + i) % capacity]
+
+
+class UserHistoryStore:
+    """Хранилище историй сообщений, ключ - пара (chat_id, user_id)"""
+
+    def __init__(self, capacity: int = HISTORY_CAPACITY):
+        self.capacity = capacity
+        self._rings: Dict[Tuple[int, int], MessageRing] = {}
+
+    def previous(self, chat_id: int, user_id: int) -> Optional[HistoryEntry]:
+        """Возвращает последнее сохранённое сообщение пользователя в чате"""
+        ring = self._rings.get((chat_id, user_id))
+        if ring is None:
+            return None
+        return ring.last()
+
+    def append(self, chat_id: int, user_id: int, entry: HistoryEntry) -> None:
+        """Сохраняет сообщение пользователя в чате"""
+        key = (chat_id, user_id)
+        ring = self._rings.get(key)
+        if ring is None:
+            ring = self._rings[key] = MessageRing(self.capacity)
+        ring.append(entry)
+
+    def history(self, chat_id: int, user_id: int) -> List[HistoryEntry]:
+        """Возвращает историю пользователя в чате от старых сообщений к новым"""
+        ring = self._rings.get((chat_id, user_id))
+        return list(ring) if ring is not None else []
+
+    def discard(self, chat_id: int, user_id: int) -> None:
+        """Удаляет историю пользователя в чате"""
+        self._rings.pop((chat_id, user_id), None)
+
+    def expire(self, cutoff_ts: float) -> int:
+        """Удаляет истории, последнее сообщение в которых старше cutoff_ts"""
+        expired = [
+            key for key, ring in self._rings.items()
+            if ring.last()[2] < cutoff_ts
+        ]
+        for key in expired:
+            del self._rings[key]
+        return len(expired)
+
+    def clear(self) -> None:
+        self._rings.clear()
+
+    def __len__(self) -> int:
+        return len(self._rings)
+
+    def memory_report(self) -> Dict[str, Any]:
+        """Оценивает занимаемую память в байтах, всего и на одного отслеживаемого пользователя"""
+        total = sys.getsizeof(self._rings)
+        for key, ring in self._rings.items():
+            total += sys.getsizeof(key) + sys.getsizeof(ring) + sys.getsizeof(ring._items)
+            for entry in ring:
+                total += sys.getsizeof(entry) + sum(sys.getsizeof(value) for value in entry)
+        tracked = len(self._rings)
+        return {
+            "tracked_users": tracked,
+            "total_bytes": total,
+            "bytes_per_user": total // tracked if tracked else 0
+        }
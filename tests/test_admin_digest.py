@@ -0,0 +1,186 @@
+"""
+Тесты сводок уведомлений в админ-чат
+"""
+import asyncio
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+
+import admin_notifications
+from admin_notifications import AdminDigest
+from services.send_queue import OutboundQueue
+
+
+def _config(window: float, individual_limit: int = 2):
+    return SimpleNamespace(
+        admin_digest_window_seconds=window,
+        admin_digest_individual_limit=individual_limit,
+        policy=SimpleNamespace(admin_chat_target=(-500, 7))
+    )
+
+
+@pytest.fixture
+def queue(monkeypatch):
+    queue = OutboundQueue()
+    monkeypatch.setattr(admin_notifications, "send_queue", queue)
+    return queue
+
+
+@pytest.mark.asyncio
+async def test_low_volume_sent_individually(queue):
+    """Пока уведомлений мало, каждое отправляется отдельно, и сводка не нужна"""
+    digest = AdminDigest()
+    bot = AsyncMock()
+    send = MagicMock()
+    config = _config(window=0.05)
+
+    try:
+        assert digest.notify(bot, config, -100, "no_reply", 1, "@a", send)
+        assert digest.notify(bot, config, -100, "no_reply", 2, "@b", send)
+        # Другой тип нарушения учитывается отдельно
+        assert digest.notify(bot, config, -100, "self_reply", 1, "@a", send)
+        await asyncio.sleep(0.1)
+
+        assert send.call_count == 3
+        bot.send_message.assert_not_called()
+        assert digest.stats()["open_windows"] == 0
+    finally:
+        await queue.stop()
+
+
+@pytest.mark.asyncio
+async def test_burst_collapsed_into_digest(queue):
+    """Уведомления сверх лимита попадают в одну сводку с самыми частыми нарушителями"""
+    digest = AdminDigest(top_offenders=2)
+    bot = AsyncMock()
+    send = MagicMock()
+    config = _config(window=0.05)
+
+    try:
+        for user_id in (1, 2, 1, 3, 1, 3, 4):
+            digest.notify(bot, config, -100, "no_reply", user_id, f"@u{user_id}", send)
+        assert send.call_count == 2
+        assert digest.stats()["digested"] == 5
+
+        await asyncio.sleep(0.15)
+
+        bot.send_message.assert_awaited_once()
+        kwargs = bot.send_message.call_args.kwargs
+        assert kwargs["chat_id"] == -500
+        assert kwargs["message_thread_id"] == 7
+        assert "Нарушений за 0.05 с</b>: 5 (пользователей: 3)" in kwargs["text"]
+        assert "@u1 (ID 1): 2" in kwargs["text"]
+        buttons = [button.callback_data for row in kwargs["reply_markup"].inline_keyboard for button in row]
+        assert buttons == ["revoke_penalty:1", "reset_violations:1", "revoke_penalty:3", "reset_violations:3"]
+        assert digest.stats()["digests_sent"] == 1
+    finally:
+        await queue.stop()
+
+
+@pytest.mark.asyncio
+async def test_digest_disabled_and_flush_all(queue):
+    """Нулевое окно отключает сводки, flush_all отправляет накопленное сразу"""
+    digest = AdminDigest()
+    bot = AsyncMock()
+    send = MagicMock()
+
+    try:
+        for _ in range(5):
+            assert digest.notify(bot, _config(window=0), -100, "no_reply", 1, "@a", send)
+        assert send.call_count == 5
+
+        config = _config(window=3600, individual_limit=0)
+        assert not digest.notify(bot, config, -100, "no_reply", 1, "@a", send, admins=True)
+        await digest.flush_all()
+
+        kwargs = bot.send_message.call_args.kwargs
+        assert "администраторами" in kwargs["text"]
+        assert kwargs["reply_markup"] is None
+        assert digest.stats()["open_windows"] == 0
+    finally:
+        await queue.stop()
+
+
+@pytest.mark.asyncio
+async def test_send_admin_notification_goes_through_digest(queue, monkeypatch):
+    """send_admin_notification отправляет уведомление через сводки и очередь отправки"""
+    digest = AdminDigest()
+    monkeypatch.setattr(admin_notifications, "admin_digest", digest)
+    bot = AsyncMock()
+    config = _config(window=3600, individual_limit=1)
+    config.policy.penalty_descriptions = {}
+
+    try:
+        for _ in range(2):
+            await admin_notifications.send_admin_notification(
+                bot, config, 1, "@a", "no_reply", "warning", "text", 1, group_id=-100
+            )
+        # Уведомление только поставлено в очередь; stop дожидается его отправки
+        await queue.stop()
+        bot.send_message.assert_awaited_once()
+        assert bot.send_message.call_args.kwargs["reply_markup"] is not None
+        assert digest.stats()["digested"] == 1
+    finally:
+        await queue.stop()
+
+
+@pytest.mark.asyncio
+async def test_notification_does_not_wait_for_throttled_admin_chat(queue, monkeypatch):
+    """Уведомление в админ-чат с исчерпанным лимитом не задерживает вызывающего"""
+    import time
+
+    monkeypatch.setattr(admin_notifications, "admin_digest", AdminDigest())
+    bot = AsyncMock()
+    config = _config(window=3600)
+    config.policy.penalty_descriptions = {}
+    # Лимит админ-чата исчерпан: следующий токен появится через 0.3 секунды
+    queue._bucket(-500).drain(time.monotonic(), 0.3)
+
+    try:
+        started = time.monotonic()
+        await admin_notifications.send_admin_notification(
+            bot, config, 1, "@a", "no_reply", "warning", "text", 1, group_id=-100
+        )
+        assert time.monotonic() - started < 0.1
+        bot.send_message.assert_not_called()
+        assert queue.stats()["depth"]["admin"] == 1
+    finally:
+        await queue.stop()
+    bot.send_message.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_digest_button_click_marks_only_that_offender(queue, monkeypatch):
+    """Нажатие кнопки в сводке отмечает выполненной только кнопку этого пользователя"""
+    from handlers import callbacks
+
+    digest = AdminDigest(top_offenders=3)
+    bot = AsyncMock()
+    config = _config(window=3600, individual_limit=0)
+
+    try:
+        for user_id in (1, 2, 3):
+            digest.notify(bot, config, -100, "no_reply", user_id, f"@u{user_id}", MagicMock())
+        await digest.flush_all()
+    finally:
+        await queue.stop()
+    markup = bot.send_message.call_args.kwargs["reply_markup"]
+
+    monkeypatch.setattr(callbacks, "revoke_penalty", AsyncMock())
+    monkeypatch.setattr(callbacks, "reset_all_user_data", AsyncMock())
+    call = AsyncMock()
+    call.data = "revoke_penalty:2"
+    call.message.reply_markup = markup
+    callback_config = SimpleNamespace(logging=SimpleNamespace(enabled=False), allowed_groups=[-100])
+
+    await callbacks._handle_revoke_penalty(call, bot, callback_config)
+
+    new_markup = bot.edit_message_reply_markup.call_args.kwargs["reply_markup"]
+    buttons = [button.callback_data for row in new_markup.inline_keyboard for button in row]
+    assert buttons == [
+        "revoke_penalty:1", "reset_violations:1",
+        "done", "reset_violations:2",
+        "revoke_penalty:3", "reset_violations:3"
+    ]
+    callbacks.revoke_penalty.assert_awaited_once_with(2)
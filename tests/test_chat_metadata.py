@@ -0,0 +1,127 @@
+"""
+Тесты кэширующего резолвера метаданных чатов
+"""
+import asyncio
+import pytest
+from unittest.mock import AsyncMock, MagicMock
+
+from handlers.chat_metadata import ChatMetadataResolver
+
+
+@pytest.fixture
+def bot():
+    bot = MagicMock()
+    bot.get_chat = AsyncMock(return_value=MagicMock(linked_chat_id=-100555))
+    return bot
+
+
+@pytest.mark.asyncio
+async def test_resolve_uses_cache(bot):
+    """Повторный запрос того же чата не обращается к Telegram"""
+    resolver = ChatMetadataResolver()
+
+    first = await resolver.resolve(bot, -1001)
+    second = await resolver.resolve(bot, -1001)
+
+    assert first.linked_chat_id == -100555
+    assert second is first
+    bot.get_chat.assert_called_once_with(-1001)
+    assert resolver.stats()["hits"] == 1
+    assert resolver.stats()["misses"] == 1
+
+
+@pytest.mark.asyncio
+async def test_concurrent_resolves_are_coalesced(bot):
+    """Параллельные запросы одного чата объединяются в один вызов get_chat"""
+    release = asyncio.Event()
+
+    async def slow_get_chat(chat_id):
+        await release.wait()
+        return MagicMock(linked_chat_id=None)
+
+    bot.get_chat = AsyncMock(side_effect=slow_get_chat)
+    resolver = ChatMetadataResolver()
+
+    tasks = [asyncio.ensure_future(resolver.resolve(bot, -1001)) for _ in range(5)]
+    await asyncio.sleep(0)
+    release.set()
+    results = await asyncio.gather(*tasks)
+
+    assert bot.get_chat.call_count == 1
+    assert all(result is results[0] for result in results)
+    assert resolver.stats()["coalesced"] == 4
+
+
+@pytest.mark.asyncio
+async def test_failures_are_cached(bot):
+    """Ошибка запроса кэшируется и не повторяется до истечения отрицательного TTL"""
+    bot.get_chat = AsyncMock(side_effect=RuntimeError("chat not found"))
+    resolver = ChatMetadataResolver()
+
+    assert await resolver.resolve(bot, -1001) is None
+    assert await resolver.resolve(bot, -1001) is None
+
+    bot.get_chat.assert_called_once()
+    assert resolver.stats()["errors"] == 1
+    assert resolver.stats()["negative_hits"] == 1
+
+
+@pytest.mark.asyncio
+async def test_expired_entry_is_refetched(bot):
+    """Запись с истекшим TTL запрашивается повторно"""
+    resolver = ChatMetadataResolver(ttl=0)
+
+    await resolver.resolve(bot, -1001)
+    await resolver.resolve(bot, -1001)
+
+    assert bot.get_chat.call_count == 2
+
+
+@pytest.mark.asyncio
+async def test_invalidate(bot):
+    """Инвалидация удаляет чат из кэша"""
+    resolver = ChatMetadataResolver()
+
+    await resolver.resolve(bot, -1001)
+    resolver.invalidate(-1001)
+    await resolver.resolve(bot, -1001)
+
+    assert bot.get_chat.call_count == 2
+
+
+@pytest.mark.asyncio
+async def test_invalidate_during_fetch_discards_result(bot):
+    """Результат запроса, начатого до инвалидации, не попадает в кэш"""
+    release = asyncio.Event()
+
+    async def slow_get_chat(chat_id):
+        await release.wait()
+        return MagicMock(linked_chat_id=None)
+
+    bot.get_chat = AsyncMock(side_effect=slow_get_chat)
+    resolver = ChatMetadataResolver()
+
+    task = asyncio.ensure_future(resolver.resolve(bot, -1001))
+    await asyncio.sleep(0)
+    resolver.invalidate(-1001)
+    release.set()
+    await task
+
+    assert resolver.stats()["size"] == 0
+
+
+@pytest.mark.asyncio
+async def test_lru_eviction(bot):
+    """При превышении размера вытесняется давно не использованный чат"""
+    resolver = ChatMetadataResolver(max_entries=2)
+
+    await resolver.resolve(bot, 1)
+    await resolver.resolve(bot, 2)
+    await resolver.resolve(bot, 1)
+    await resolver.resolve(bot, 3)
+
+    assert resolver.stats()["size"] == 2
+    assert resolver.stats()["evictions"] == 1
+
+    await resolver.resolve(bot, 1)
+    assert bot.get_chat.call_count == 3
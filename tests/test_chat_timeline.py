@@ -0,0 +1,98 @@
+"""
+Тесты ленты сообщений чата
+"""
+from state.chat_timeline import ChatTimeline
+
+
+def test_sequence_numbers_are_monotonic():
+    """Сообщениям присваиваются последовательные номера"""
+    timeline = ChatTimeline()
+
+    assert timeline.append(10, 1, 100.0) == 1
+    assert timeline.append(11, 2, 101.0) == 2
+    assert timeline.append(12, 1, 102.0) == 3
+    assert len(timeline) == 3
+
+
+def test_no_other_messages_in_own_run():
+    """Подряд идущие сообщения одного пользователя не считаются прерванными"""
+    timeline = ChatTimeline()
+
+    prev_seq = timeline.append(10, 1, 100.0)
+    timeline.append(11, 1, 101.0)
+
+    assert timeline.has_other_messages_since(1, prev_seq) is False
+
+
+def test_other_user_between_messages():
+    """Сообщение другого пользователя между сообщениями обнаруживается"""
+    timeline = ChatTimeline()
+
+    prev_seq = timeline.append(10, 1, 100.0)
+    timeline.append(11, 2, 101.0)
+    timeline.append(12, 1, 102.0)
+
+    assert timeline.has_other_messages_since(1, prev_seq) is True
+
+
+def test_other_user_before_own_untracked_message():
+    """Чужое сообщение учитывается, даже если после него пользователь уже писал"""
+    timeline = ChatTimeline()
+
+    prev_seq = timeline.append(10, 1, 100.0)
+    timeline.append(11, 2, 101.0)
+    timeline.append(12, 1, 102.0)
+    timeline.append(13, 1, 103.0)
+
+    assert timeline.has_other_messages_since(1, prev_seq) is True
+
+
+def test_check_before_current_message_is_added():
+    """Проверка работает и до добавления текущего сообщения"""
+    timeline = ChatTimeline()
+
+    prev_seq = timeline.append(10, 1, 100.0)
+    assert timeline.has_other_messages_since(1, prev_seq) is False
+
+    timeline.append(11, 2, 101.0)
+    assert timeline.has_other_messages_since(1, prev_seq) is True
+
+
+def test_expire_removes_old_entries():
+    """Устаревшие записи удаляются, маркеры ленты сохраняются"""
+    timeline = ChatTimeline()
+
+    timeline.append(10, 1, 100.0)
+    timeline.append(11, 2, 200.0)
+    prev_seq = timeline.append(12, 1, 300.0)
+
+    assert timeline.expire(250.0) == 2
+    assert len(timeline) == 1
+    assert timeline.has_other_messages_since(1, prev_seq) is False
+    assert timeline.append(13, 1, 301.0) == 4
+
+
+def test_iteration_returns_live_entries():
+    """Перебор ленты возвращает только неустаревшие записи с их номерами"""
+    timeline = ChatTimeline()
+
+    timeline.append(10, 1, 100.0)
+    timeline.append(11, 2, 200.0)
+    timeline.expire(150.0)
+
+    assert list(timeline) == [(2, 11, 2, 200.0)]
+
+
+def test_compaction_preserves_sequence_numbers():
+    """Уплотнение массивов не меняет номера оставшихся записей"""
+    timeline = ChatTimeline()
+    for i in range(1000):
+        timeline.append(i, i % 7, float(i))
+
+    assert timeline.expire(900.0) == 900
+    assert len(timeline) == 100
+
+    entries = list(timeline)
+    assert entries[0] == (901, 900, 900 % 7, 900.0)
+    assert entries[-1] == (1000, 999, 999 % 7, 999.0)
+    assert timeline.append(1000, 3, 1000.0) == 1001
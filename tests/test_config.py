@@ -0,0 +1,82 @@
+"""
+Тесты загрузки конфигурации и скомпилированной политики
+"""
+import json
+
+import pytest
+
+from config import Config
+
+
+@pytest.fixture
+def config_file(tmp_path):
+    data = {
+        "bot_token": "test_token",
+        "allowed_groups": [-1001, -1002],
+        "admin_ids": [42],
+        "admin_chat_id": "-1009_128",
+        "reply_cooldown_seconds": 90,
+        "penalties": {"2": "warning", "10": "ban", "3": "read-only", "6": "kick+ban"},
+        "notifications": {},
+        "delete_violationg_user_messages": True,
+        "violationg_user_messages_lifetime_seconds": 30
+    }
+    path = tmp_path / "config.json"
+    path.write_text(json.dumps(data), encoding="utf-8")
+    return str(path)
+
+
+def test_policy_admin_chat_target(config_file):
+    """Составной ID админ-чата разбирается на чат и топик один раз"""
+    config = Config.from_json_file(config_file)
+
+    assert config.policy.admin_chat_target == (-1009, 128)
+    assert config.policy.allowed_groups == frozenset({-1001, -1002})
+    assert 42 in config.policy.admin_ids
+
+
+def test_policy_admin_chat_without_thread(config_file):
+    """Простой ID админ-чата не содержит топика"""
+    config = Config.from_json_file(config_file)
+    config.admin_chat_id = "-1009"
+    config.__post_init__()
+
+    assert config.policy.admin_chat_target == (-1009, None)
+
+
+def test_policy_penalty_ladder(config_file):
+    """Текущее и следующее наказание определяются по отсортированным порогам"""
+    policy = Config.from_json_file(config_file).policy
+
+    assert policy.penalty_thresholds == (2, 3, 6, 10)
+    assert policy.current_penalty(1) is None
+    assert policy.current_penalty(2) == "warning"
+    assert policy.current_penalty(5) == "read-only"
+    assert policy.current_penalty(100) == "ban"
+
+    assert policy.next_penalty(0) == (2, "warning")
+    assert policy.next_penalty(2) == (3, "read-only")
+    assert policy.next_penalty(10) == (None, None)
+
+
+def test_policy_violation_texts(config_file):
+    """Уведомления содержат заранее подставленные константы и имя пользователя"""
+    policy = Config.from_json_file(config_file).policy
+
+    text = policy.violation_text("self_reply", "@user{0}")
+    assert "@user{0}" in text
+    assert "менее 2 мин." in text
+    assert "30 сек." in text
+
+    text = policy.violation_text("no_reply", "@user", with_delete_warning=False)
+    assert "сек." not in text
+
+    assert policy.violation_text("unknown", "@user") is None
+
+
+def test_policy_is_frozen(config_file):
+    """Скомпилированную политику нельзя изменить"""
+    policy = Config.from_json_file(config_file).policy
+
+    with pytest.raises(Exception):
+        policy.admin_chat_id = 1
@@ -0,0 +1,104 @@
+"""
+Тесты кэша счетчиков и наказаний со сквозной записью
+"""
+import asyncio
+import random
+import sqlite3
+
+import pytest
+
+from config import ViolationRule
+from db import operations
+from db.cache import MISSING, WriteThroughCache
+
+USERS = (1, 2, 3)
+VIOLATION_TYPES = ("no_reply", "self_reply")
+
+
+class _Config:
+    violation_rules = {
+        "no_reply": ViolationRule(enabled=True, count_as_violation=True, violations_before_penalty=2),
+        "self_reply": ViolationRule(enabled=True, count_as_violation=True, violations_before_penalty=3)
+    }
+
+
+def _db_state(path: str, user_id: int):
+    """Читает значения напрямую из базы, минуя кэш"""
+    with sqlite3.connect(path) as conn:
+        row = conn.execute("SELECT incident_count FROM users_incidents WHERE user_id=?", (user_id,)).fetchone()
+        incidents = row[0] if row else 0
+        counters = dict(conn.execute(
+            "SELECT violation_type, count FROM violation_counters WHERE user_id=?", (user_id,)
+        ).fetchall())
+        row = conn.execute("SELECT penalty_type FROM penalties_active WHERE user_id=?", (user_id,)).fetchone()
+        penalty = row[0] if row else None
+    return incidents, counters, penalty
+
+
+def _random_operation(rng: random.Random):
+    user_id = rng.choice(USERS)
+    kind = rng.random()
+    if kind < 0.4:
+        return operations.record_violation(user_id, "user", -100, rng.choice(VIOLATION_TYPES), _Config)
+    if kind < 0.5:
+        return operations.set_penalty(user_id, "user", rng.choice(("read-only", "warning")), None)
+    if kind < 0.55:
+        return operations.revoke_penalty(user_id)
+    if kind < 0.6:
+        return operations.reset_violation_counters(user_id)
+    if kind < 0.65:
+        return operations.reset_all_user_data(user_id)
+    if kind < 0.8:
+        return operations.get_incidents_count(user_id)
+    if kind < 0.9:
+        return operations.get_violation_counters(user_id)
+    return operations.get_penalty(user_id)
+
+
+def test_rejected_fill_after_write():
+    """Значение, прочитанное до записи, не попадает в кэш"""
+    cache = WriteThroughCache(maxsize=10, ttl=60)
+    token = cache.read_token()
+    cache.set(1, 5)
+    cache.fill(1, 4, token)
+
+    assert cache.get(1) == 5
+    assert cache.get(2) is MISSING
+    assert cache.stats()["rejected_fills"] == 1
+    assert cache.stats()["hit_rate"] == 0.5
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("seed", [1, 2, 3])
+async def test_cache_matches_database(tmp_path, monkeypatch, seed):
+    """После случайной последовательности операций кэш совпадает с базой"""
+    path = str(tmp_path / "cache.db")
+    monkeypatch.setattr(operations, "DB_PATH", path)
+    await operations.init_db()
+    rng = random.Random(seed)
+
+    try:
+        for _ in range(30):
+            # Операции каждого шага выполняются одновременно, чтобы чтения пересекались с записями
+            await asyncio.gather(*(_random_operation(rng) for _ in range(rng.randint(1, 8))))
+
+        for user_id in USERS:
+            incidents, counters, penalty = _db_state(path, user_id)
+            cached_incidents = operations.incidents_cache.get(user_id)
+            cached_counters = operations.counters_cache.get(user_id)
+            cached_penalty = operations.penalties_cache.get(user_id)
+
+            if cached_incidents is not MISSING:
+                assert cached_incidents == incidents
+            if cached_counters is not MISSING:
+                assert cached_counters == counters
+            if cached_penalty is not MISSING:
+                assert (cached_penalty[0] if cached_penalty else None) == penalty
+
+            assert await operations.get_incidents_count(user_id) == incidents
+            assert await operations.get_violation_counters(user_id) == counters
+            assert await operations.get_penalty(user_id) == penalty
+
+        assert operations.db_cache_stats()["incidents"]["hits"] > 0
+    finally:
+        await operations.close_connection_pool()
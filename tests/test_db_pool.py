@@ -0,0 +1,104 @@
+"""
+Тесты пула соединений с базой данных
+"""
+import asyncio
+
+import pytest
+
+from db.pool import ConnectionPool
+
+
+@pytest.mark.asyncio
+async def test_pragmas_applied_once_per_connection(tmp_path):
+    """Соединение настраивается при создании и переиспользуется"""
+    pool = ConnectionPool(str(tmp_path / "pool.db"))
+    try:
+        async with pool.acquire() as conn:
+            async with conn.execute("PRAGMA journal_mode") as cursor:
+                assert (await cursor.fetchone())[0] == "wal"
+            async with conn.execute("PRAGMA busy_timeout") as cursor:
+                assert (await cursor.fetchone())[0] == 5000
+            first = conn
+
+        async with pool.acquire() as conn:
+            assert conn is first
+
+        assert pool.stats()["created"] == 1
+        assert pool.stats()["acquisitions"] == 2
+    finally:
+        await pool.close()
+
+
+@pytest.mark.asyncio
+async def test_acquire_waits_when_pool_exhausted(tmp_path):
+    """При исчерпании пула acquire ждёт освобождения соединения"""
+    pool = ConnectionPool(str(tmp_path / "pool.db"), max_size=1)
+    released = asyncio.Event()
+
+    async def holder():
+        async with pool.acquire():
+            await released.wait()
+
+    async def waiter():
+        async with pool.acquire() as conn:
+            return conn
+
+    try:
+        holder_task = asyncio.create_task(holder())
+        await asyncio.sleep(0.01)
+        waiter_task = asyncio.create_task(waiter())
+        await asyncio.sleep(0.01)
+        assert not waiter_task.done()
+
+        released.set()
+        await holder_task
+        await waiter_task
+
+        stats = pool.stats()
+        assert stats["waits"] == 1
+        assert stats["max_wait_ms"] > 0
+        assert stats["created"] == 1
+    finally:
+        await pool.close()
+
+
+@pytest.mark.asyncio
+async def test_unfinished_transaction_rolled_back(tmp_path):
+    """Транзакция, прерванная ошибкой, откатывается при возврате соединения"""
+    pool = ConnectionPool(str(tmp_path / "pool.db"))
+    try:
+        async with pool.acquire() as conn:
+            await conn.execute("CREATE TABLE t (x INTEGER)")
+            await conn.commit()
+
+        with pytest.raises(RuntimeError):
+            async with pool.acquire() as conn:
+                await conn.execute("INSERT INTO t VALUES (1)")
+                raise RuntimeError("ошибка")
+
+        async with pool.acquire() as conn:
+            assert not conn.in_transaction
+            async with conn.execute("SELECT COUNT(*) FROM t") as cursor:
+                assert (await cursor.fetchone())[0] == 0
+    finally:
+        await pool.close()
+
+
+@pytest.mark.asyncio
+async def test_broken_connection_replaced(tmp_path):
+    """Соединение, не прошедшее проверку, заменяется новым"""
+    pool = ConnectionPool(str(tmp_path / "pool.db"), health_check_idle_seconds=0)
+    try:
+        async with pool.acquire() as conn:
+            broken = conn
+        await broken.close()
+
+        async with pool.acquire() as conn:
+            assert conn is not broken
+            async with conn.execute("SELECT 1") as cursor:
+                assert (await cursor.fetchone())[0] == 1
+
+        assert pool.stats()["health_check_failures"] == 1
+        assert pool.stats()["created"] == 2
+    finally:
+        await pool.close()
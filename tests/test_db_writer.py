@@ -0,0 +1,112 @@
+"""
+Тесты пакетной записи в базу данных
+"""
+import asyncio
+import sqlite3
+
+import pytest
+
+from config import ViolationRule
+from db import operations
+from db.models import ViolationOutcome
+from db.pool import ConnectionPool
+from db.writer import WriteBehindWriter
+
+
+def _create_table(conn: sqlite3.Connection) -> None:
+    conn.execute("CREATE TABLE t (x INTEGER UNIQUE)")
+
+
+def _insert(value: int):
+    def op(conn: sqlite3.Connection) -> int:
+        return conn.execute("INSERT INTO t (x) VALUES (?)", (value,)).lastrowid
+    return op
+
+
+def _count(path: str) -> int:
+    with sqlite3.connect(path) as conn:
+        return conn.execute("SELECT COUNT(*) FROM t").fetchone()[0]
+
+
+@pytest.mark.asyncio
+async def test_concurrent_writes_share_transaction(tmp_path):
+    """Одновременные операции записываются одной пачкой и получают свои результаты"""
+    path = str(tmp_path / "writer.db")
+    writer = WriteBehindWriter(ConnectionPool(path))
+    try:
+        await writer.submit(_create_table)
+        ids = await asyncio.gather(*(writer.submit(_insert(i)) for i in range(50)))
+
+        assert sorted(ids) == list(range(1, 51))
+        assert _count(path) == 50
+        assert writer.stats()["batches"] == 2
+        assert writer.stats()["max_batch"] == 50
+    finally:
+        await writer.stop()
+
+
+@pytest.mark.asyncio
+async def test_failed_operation_does_not_roll_back_batch(tmp_path):
+    """Ошибка одной операции передаётся вызывающему коду, остальные операции записываются"""
+    path = str(tmp_path / "writer.db")
+    writer = WriteBehindWriter(ConnectionPool(path))
+    try:
+        await writer.submit(_create_table)
+        results = await asyncio.gather(
+            writer.submit(_insert(1)),
+            writer.submit(_insert(1)),
+            writer.submit(_insert(2)),
+            return_exceptions=True
+        )
+
+        assert isinstance(results[1], sqlite3.IntegrityError)
+        assert _count(path) == 2
+        assert writer.stats()["failed_operations"] == 1
+    finally:
+        await writer.stop()
+
+
+@pytest.mark.asyncio
+async def test_stop_flushes_queue(tmp_path):
+    """При остановке записываются все операции из очереди"""
+    path = str(tmp_path / "writer.db")
+    writer = WriteBehindWriter(ConnectionPool(path), flush_interval_ms=1000)
+    await writer.submit(_create_table)
+
+    pending = [asyncio.create_task(writer.submit(_insert(i))) for i in range(10)]
+    await asyncio.sleep(0)
+    await writer.stop()
+
+    assert all(task.done() for task in pending)
+    assert _count(path) == 10
+
+
+@pytest.mark.asyncio
+async def test_record_violation_returns_escalation_state(tmp_path, monkeypatch):
+    """Запись нарушения возвращает счетчики и признак достижения порога"""
+    monkeypatch.setattr(operations, "DB_PATH", str(tmp_path / "violations.db"))
+    await operations.init_db()
+
+    class _Config:
+        violation_rules = {
+            "no_reply": ViolationRule(enabled=True, count_as_violation=True, violations_before_penalty=2)
+        }
+
+    try:
+        deleted_id, outcome = await asyncio.gather(
+            operations.record_deleted_message(1, "user", -100, "text"),
+            operations.record_violation(1, "user", -100, "no_reply", _Config)
+        )
+        assert deleted_id == 1
+        assert outcome == ViolationOutcome(type_count=1, incident_count=0, threshold_crossed=False)
+
+        # Второе нарушение достигает порога и увеличивает счетчик инцидентов
+        outcome = await operations.record_violation(1, "user", -100, "no_reply", _Config)
+        assert outcome == ViolationOutcome(type_count=2, incident_count=1, threshold_crossed=True)
+        assert await operations.get_incidents_count(1) == 1
+
+        # После порога счетчик типа нарушения начинается заново
+        outcome = await operations.record_violation(1, "user", -100, "no_reply", _Config)
+        assert outcome == ViolationOutcome(type_count=1, incident_count=1, threshold_crossed=False)
+    finally:
+        await operations.close_connection_pool()
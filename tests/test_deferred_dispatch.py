@@ -0,0 +1,64 @@
+"""
+Тесты отложенной отправки ответов бота
+"""
+import asyncio
+import time
+
+import pytest
+
+from services.deferred_dispatch import DeferredDispatcher
+
+
+async def _wait_for(predicate, timeout: float = 2.0):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline, "условие не выполнилось вовремя"
+        await asyncio.sleep(0.01)
+
+
+@pytest.mark.asyncio
+async def test_jobs_run_in_due_order():
+    """Действия выполняются по сроку, а не по порядку постановки; ранний срок будит задачу"""
+    dispatcher = DeferredDispatcher()
+    calls = []
+
+    def job(name):
+        async def run():
+            calls.append(name)
+        return run
+
+    try:
+        dispatcher.defer(0.15, job("late"))
+        dispatcher.defer(0.05, job("early"))
+        dispatcher.defer(0, job("now"))
+        await _wait_for(lambda: dispatcher.stats()["delivered"] == 3)
+
+        assert calls == ["now", "early", "late"]
+        assert dispatcher.stats()["pending"] == 0
+        assert dispatcher.stats()["delivery_max_ms"] >= 150
+    finally:
+        await dispatcher.stop()
+
+
+@pytest.mark.asyncio
+async def test_failures_counted_and_handler_time_observed():
+    """Ошибка действия не останавливает планировщик; время обработчика учитывается отдельно"""
+    dispatcher = DeferredDispatcher()
+
+    async def broken():
+        raise RuntimeError("Telegram недоступен")
+
+    async def ok():
+        pass
+
+    try:
+        dispatcher.defer(0, broken)
+        dispatcher.defer(0.01, ok)
+        dispatcher.observe_handler(0.004)
+        await _wait_for(lambda: dispatcher.stats()["delivered"] == 1)
+
+        stats = dispatcher.stats()
+        assert stats["failed"] == 1
+        assert stats["handler_max_ms"] == 4.0
+    finally:
+        await dispatcher.stop()
@@ -0,0 +1,186 @@
+"""
+Тесты сохранения отложенных удалений между перезапусками
+"""
+import asyncio
+import sqlite3
+import time
+from unittest.mock import AsyncMock
+
+import pytest
+from aiogram.exceptions import TelegramBadRequest, TelegramNetworkError, TelegramRetryAfter
+
+from db import operations
+from services.deletion_scheduler import DeletionScheduler
+
+
+def _stored(path: str):
+    with sqlite3.connect(path) as conn:
+        return sorted(conn.execute("SELECT chat_id, message_id FROM scheduled_deletions").fetchall())
+
+
+async def _wait_for(predicate, timeout: float = 2.0):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline, "условие не выполнилось вовремя"
+        await asyncio.sleep(0.01)
+
+
+@pytest.mark.asyncio
+async def test_long_deletions_persisted_in_one_batch(tmp_path, monkeypatch):
+    """Удаления с длинной задержкой сохраняются одной операцией, короткие - нет"""
+    path = str(tmp_path / "deletions.db")
+    monkeypatch.setattr(operations, "DB_PATH", path)
+    await operations.init_db()
+    bot = AsyncMock()
+    scheduler = DeletionScheduler(store=operations.deletion_store)
+
+    try:
+        for message_id in (1, 2, 3):
+            scheduler.schedule(bot, -100, message_id, 3600)
+        scheduler.schedule(bot, -100, 4, 0)
+
+        await _wait_for(lambda: scheduler.stats()["deleted"] == 1)
+        await scheduler.stop()
+
+        assert _stored(path) == [(-100, 1), (-100, 2), (-100, 3)]
+        assert scheduler.stats()["persist_batches"] == 1
+        bot.delete_message.assert_called_once_with(-100, 4)
+    finally:
+        await operations.close_connection_pool()
+
+
+@pytest.mark.asyncio
+async def test_restore_deletes_overdue_in_bulk_and_prunes(tmp_path, monkeypatch):
+    """После перезапуска просроченные удаления выполняются одним вызовом и убираются из базы"""
+    path = str(tmp_path / "deletions.db")
+    monkeypatch.setattr(operations, "DB_PATH", path)
+    await operations.init_db()
+    now = int(time.time())
+    with sqlite3.connect(path) as conn:
+        conn.executemany(
+            "INSERT INTO scheduled_deletions (chat_id, message_id, due_ts) VALUES (?, ?, ?)",
+            [(-100, 1, now - 60), (-100, 2, now - 30), (-200, 3, now + 3600)]
+        )
+
+    bot = AsyncMock()
+    scheduler = DeletionScheduler(store=operations.deletion_store)
+    try:
+        assert await scheduler.restore(bot) == 3
+        await _wait_for(lambda: _stored(path) == [(-200, 3)])
+
+        bot.delete_messages.assert_called_once_with(-100, [1, 2])
+        assert scheduler.stats()["pending"] == 1
+        await scheduler.stop()
+    finally:
+        await operations.close_connection_pool()
+
+
+@pytest.mark.asyncio
+async def test_failed_deletions_after_restart(tmp_path, monkeypatch):
+    """Постоянная ошибка убирает удаление из базы, временная оставляет его до следующего перезапуска"""
+    path = str(tmp_path / "deletions.db")
+    monkeypatch.setattr(operations, "DB_PATH", path)
+    await operations.init_db()
+    now = int(time.time())
+    with sqlite3.connect(path) as conn:
+        conn.executemany(
+            "INSERT INTO scheduled_deletions (chat_id, message_id, due_ts) VALUES (?, ?, ?)",
+            [(-100, 1, now - 60), (-200, 2, now - 60)]
+        )
+
+    async def delete_message(chat_id, message_id):
+        if chat_id == -100:
+            raise TelegramBadRequest(method=None, message="message to delete not found")
+        raise TelegramNetworkError(method=None, message="timeout")
+
+    bot = AsyncMock()
+    bot.delete_message.side_effect = delete_message
+    scheduler = DeletionScheduler(store=operations.deletion_store)
+    try:
+        assert await scheduler.restore(bot) == 2
+        await _wait_for(lambda: _stored(path) == [(-200, 2)])
+        await scheduler.stop()
+
+        stats = scheduler.stats()
+        assert stats["failed_calls"] == 2
+        assert stats["dropped"] == 1
+
+        # После следующего перезапуска повторяется только удаление с временной ошибкой
+        scheduler = DeletionScheduler(store=operations.deletion_store)
+        bot = AsyncMock()
+        assert await scheduler.restore(bot) == 1
+        await _wait_for(lambda: _stored(path) == [])
+        bot.delete_message.assert_called_once_with(-200, 2)
+        await scheduler.stop()
+    finally:
+        await operations.close_connection_pool()
+
+
+@pytest.mark.asyncio
+async def test_failed_persist_is_retried(tmp_path, monkeypatch):
+    """Пачка, которую не удалось записать в базу, сохраняется повторно, а не теряется"""
+    from services import deletion_scheduler
+
+    path = str(tmp_path / "deletions.db")
+    monkeypatch.setattr(operations, "DB_PATH", path)
+    monkeypatch.setattr(deletion_scheduler, "DELETE_FLUSH_RETRY_DELAY", 0.05)
+    await operations.init_db()
+    store = operations.deletion_store
+    apply = store.apply
+    calls = []
+
+    async def failing_once(saves, removes):
+        calls.append((list(saves), list(removes)))
+        if len(calls) == 1:
+            raise sqlite3.OperationalError("database is locked")
+        await apply(saves, removes)
+
+    monkeypatch.setattr(store, "apply", failing_once)
+    scheduler = DeletionScheduler(store=store)
+    try:
+        scheduler.schedule(AsyncMock(), -100, 1, 3600)
+        await _wait_for(lambda: _stored(path) == [(-100, 1)])
+        await scheduler.stop()
+
+        assert len(calls) == 2
+        stats = scheduler.stats()
+        assert stats["persist_failures"] == 1
+        assert stats["persist_batches"] == 1
+    finally:
+        await operations.close_connection_pool()
+
+
+@pytest.mark.asyncio
+async def test_retryable_errors_retried_in_process(monkeypatch):
+    """RetryAfter и сетевые ошибки повторяются без перезапуска, в том числе без хранилища"""
+    from services import deletion_scheduler
+
+    monkeypatch.setattr(deletion_scheduler, "DELETE_RETRY_DELAY", 0.01)
+    monkeypatch.setattr(deletion_scheduler, "DELETE_MAX_RETRIES", 2)
+    bot = AsyncMock()
+    bot.delete_messages.side_effect = [
+        TelegramRetryAfter(method=None, message="Too Many Requests", retry_after=0),
+        None
+    ]
+    bot.delete_message.side_effect = TelegramNetworkError(method=None, message="timeout")
+    scheduler = DeletionScheduler()
+
+    try:
+        # Пачка после RetryAfter удаляется повторно целиком
+        for message_id in range(1, 101):
+            scheduler.schedule(bot, -100, message_id, 0)
+        await _wait_for(lambda: scheduler.stats()["deleted"] == 100)
+        assert bot.delete_messages.call_count == 2
+        assert bot.delete_messages.call_args.args == (-100, list(range(1, 101)))
+
+        # Сетевая ошибка повторяется с паузой, пока не исчерпаны повторы
+        scheduler.schedule(bot, -200, 1, 0)
+        await _wait_for(lambda: scheduler.stats()["retries_exhausted"] == 1)
+        assert bot.delete_message.call_count == 3
+
+        stats = scheduler.stats()
+        assert stats["retries"] == 102
+        assert stats["pending"] == 0
+        assert stats["scheduled"] == 101
+    finally:
+        await scheduler.stop()
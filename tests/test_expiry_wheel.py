@@ -0,0 +1,104 @@
+"""
+Тесты колеса таймеров для очистки кэшей
+"""
+import pytest
+
+from state.expiry_wheel import ExpiryWheel
+
+
+class FakeStore:
+    """Хранилище с фиксированными сроками жизни ключей"""
+
+    def __init__(self):
+        self.deadlines = {}
+        self.calls = []
+
+    def expire(self, key, now):
+        self.calls.append(key)
+        deadline = self.deadlines.get(key)
+        if deadline is None:
+            return 0, None
+        if deadline <= now:
+            del self.deadlines[key]
+            return 1, None
+        return 0, deadline
+
+
+@pytest.mark.asyncio
+async def test_expires_due_keys_only():
+    """Удаляются только ключи с наступившим сроком"""
+    store = FakeStore()
+    wheel = ExpiryWheel(store.expire, granularity=10)
+    store.deadlines = {"a": 100.0, "b": 500.0}
+    wheel.schedule("a", 100.0)
+    wheel.schedule("b", 500.0)
+
+    assert await wheel.tick(50.0) == 0
+    assert await wheel.tick(120.0) == 1
+    assert "a" not in store.deadlines
+    assert "b" in store.deadlines
+    assert len(wheel) == 1
+
+
+@pytest.mark.asyncio
+async def test_never_expires_before_deadline():
+    """Ключ не проверяется раньше своего срока"""
+    store = FakeStore()
+    wheel = ExpiryWheel(store.expire, granularity=10)
+    store.deadlines = {"a": 105.0}
+    wheel.schedule("a", 105.0)
+
+    await wheel.tick(105.0)
+    assert store.calls == []
+
+    await wheel.tick(110.0)
+    assert store.calls == ["a"]
+    assert "a" not in store.deadlines
+
+
+@pytest.mark.asyncio
+async def test_touched_key_is_rescheduled():
+    """Продлённый ключ перепланируется на новый срок"""
+    store = FakeStore()
+    wheel = ExpiryWheel(store.expire, granularity=10)
+    store.deadlines = {"a": 100.0}
+    wheel.schedule("a", 100.0)
+
+    # Ключ продлён, повторное планирование ничего не меняет
+    store.deadlines["a"] = 300.0
+    wheel.schedule("a", 300.0)
+
+    assert await wheel.tick(150.0) == 0
+    assert "a" in store.deadlines
+    assert await wheel.tick(310.0) == 1
+    assert len(wheel) == 0
+
+
+@pytest.mark.asyncio
+async def test_work_is_split_into_slices():
+    """При нулевом бюджете обработка разбивается на порции"""
+    store = FakeStore()
+    wheel = ExpiryWheel(store.expire, granularity=10, budget_ms=0)
+    for i in range(1000):
+        store.deadlines[i] = 100.0
+        wheel.schedule(i, 100.0)
+
+    assert await wheel.tick(200.0) == 1000
+    stats = wheel.stats()
+    assert stats["slices"] > 1
+    assert stats["last_tick_expired"] == 1000
+    assert stats["expired_total"] == 1000
+    assert stats["scheduled"] == 0
+
+
+@pytest.mark.asyncio
+async def test_long_idle_gap():
+    """После долгого простоя обрабатываются все накопившиеся корзины"""
+    store = FakeStore()
+    wheel = ExpiryWheel(store.expire, granularity=1)
+    store.deadlines = {"a": 10.0, "b": 20.0}
+    wheel.schedule("a", 10.0)
+    wheel.schedule("b", 20.0)
+
+    assert await wheel.tick(1_000_000.0) == 2
+    assert store.deadlines == {}
@@ -2,18 +2,28 @@
 Модуль тестирования обработчиков сообщений бота.
 Проверяет корректность обработки различных типов сообщений, нарушений и наказаний.
 """
+import asyncio
 import pytest
 from unittest.mock import AsyncMock, MagicMock, patch, create_autospec
 from aiogram.types import Message, User, Chat, ChatPermissions
 from config import Config, LoggingConfig, LoggingModules
 from handlers.message_handlers import (
+    reject_stats,
     process_group_message,
     apply_penalty,
+    apply_penalties_if_needed,
     process_violation,
     safe_delete_bot_message,
     schedule_delete
 )
 from dataclasses import dataclass
+from services.deferred_dispatch import DeferredDispatcher
+from services.deletion_scheduler import DeletionScheduler
+from services.send_queue import OutboundQueue, PRIORITY_COSMETIC
+from admin_notifications import AdminDigest
+from state.chat_state import ChatState
+from state.ttl_cache import TTLCache
+from state.user_history import UserHistoryStore
 import datetime
 from data.admin_texts import VIOLATION_DESCRIPTIONS
 import time
@@ -62,6 +72,7 @@ def config():
         temp_ban_duration_seconds=3600,
         data_retention_days=30,
         delete_violationg_user_messages=True,
+        violationg_user_messages_lifetime_seconds=0,
         logging=logging_config,
         violation_rules={
             "no_reply": ViolationRule(enabled=True, count_as_violation=True, violations_before_penalty=1),
@@ -140,6 +151,10 @@ def mock_all():
          patch("handlers.message_handlers.get_user_violations_count", new_callable=AsyncMock) as mock_get_violations_count, \
          patch("handlers.message_handlers.get_user_active_violations", new_callable=AsyncMock) as mock_get_active_violations, \
          patch("handlers.message_handlers.datetime") as mock_datetime, \
+         patch("handlers.message_handlers.deletion_scheduler", DeletionScheduler()), \
+         patch("handlers.message_handlers.send_queue", OutboundQueue()), \
+         patch("handlers.message_handlers.deferred_dispatcher", DeferredDispatcher()), \
+         patch("handlers.message_handlers.admin_digest", AdminDigest()), \
          patch("handlers.message_handlers.VIOLATION_DESCRIPTIONS", VIOLATION_DESCRIPTIONS):
         
         mock_record_violation.return_value = None
@@ -166,11 +181,11 @@ def mock_all():
         }
 
 @pytest.fixture(autouse=True)
-def mock_user_messages():
-    """Фикстура для мока user_messages"""
-    with patch("handlers.message_handlers.user_messages", defaultdict(list)) as mock:
-        mock[123456] = []  # Инициализируем список сообщений для тестового пользователя
-        yield mock
+def mock_user_history():
+    """Фикстура для подмены хранилища истории сообщений пользователей"""
+    state = ChatState(UserHistoryStore())
+    with patch("handlers.message_handlers.chat_state", state):
+        yield state.history
 
 @pytest.mark.asyncio
 async def test_process_group_message_allowed_group(message, bot, config):
@@ -223,6 +238,13 @@ async def test_safe_delete_bot_message(message, bot, config):
     # Проверяем, что была создана задача на удаление
     assert bot.delete_message.called == False
 
+async def _wait_for_deletions(scheduler, count: int, timeout: float = 2.0):
+    """Ждёт, пока планировщик удалит указанное количество сообщений"""
+    deadline = asyncio.get_running_loop().time() + timeout
+    while scheduler.stats()["deleted"] < count:
+        assert asyncio.get_running_loop().time() < deadline
+        await asyncio.sleep(0.01)
+
 @pytest.mark.asyncio
 async def test_schedule_delete(message, bot, config):
     """
@@ -231,12 +253,26 @@ async def test_schedule_delete(message, bot, config):
     Ожидаемое поведение:
     - Сообщение удаляется после указанной задержки
     - Вызывается метод delete_message с правильными параметрами
+    - Несколько сообщений одного чата удаляются одним вызовом delete_messages
     """
-    # Вызываем функцию
-    await schedule_delete(bot, message.chat.id, message.message_id, 0)
-    
-    # Проверяем, что сообщение было удалено
-    bot.delete_message.assert_called_once_with(message.chat.id, message.message_id)
+    scheduler = DeletionScheduler()
+    with patch('handlers.message_handlers.deletion_scheduler', scheduler):
+        # Вызываем функцию
+        schedule_delete(bot, message.chat.id, message.message_id, 0)
+        await _wait_for_deletions(scheduler, 1)
+        
+        # Проверяем, что сообщение было удалено
+        bot.delete_message.assert_called_once_with(message.chat.id, message.message_id)
+
+        # Сообщения с наступившим сроком удаляются одним вызовом deleteMessages
+        for message_id in (201, 202, 203):
+            schedule_delete(bot, message.chat.id, message_id, 0)
+        await _wait_for_deletions(scheduler, 4)
+
+        bot.delete_messages.assert_called_once_with(message.chat.id, [201, 202, 203])
+        assert scheduler.stats()["api_calls"] == 2
+        assert scheduler.stats()["calls_saved"] == 2
+        await scheduler.stop()
 
 @pytest.mark.asyncio
 async def test_process_violation_warning(message, bot, config):
@@ -437,7 +473,7 @@ async def test_process_violation_no_count(message, bot, config):
     message.delete.assert_called_once()
 
 @pytest.mark.asyncio
-async def test_process_group_message_no_violation(message, bot, config):
+async def test_process_group_message_no_violation(message, bot, config, mock_user_history):
     """
     Проверяет обработку сообщений без нарушений.
     
@@ -453,15 +489,14 @@ async def test_process_group_message_no_violation(message, bot, config):
     message.reply_to_message.from_user = MagicMock()
     message.reply_to_message.from_user.id = 999999
     
-    with patch("handlers.message_handlers.user_messages") as mock_user_messages:
-        mock_user_messages.__getitem__.return_value = [(1, 101, time.time() - 1)]
-        
-        await process_group_message(message, bot, config=config)
-        
-        message.delete.assert_not_called()
+    mock_user_history.append(message.chat.id, message.from_user.id, (1, 101, time.time() - 1, 1))
+    
+    await process_group_message(message, bot, config=config)
+    
+    message.delete.assert_not_called()
 
 @pytest.mark.asyncio
-async def test_process_group_message_cooldown_disabled(message, bot, config):
+async def test_process_group_message_cooldown_disabled(message, bot, config, mock_user_history):
     """
     Проверяет обработку сообщений при отключенной проверке временного интервала.
     
@@ -478,9 +513,152 @@ async def test_process_group_message_cooldown_disabled(message, bot, config):
     message.reply_to_message.from_user = MagicMock()
     message.reply_to_message.from_user.id = message.from_user.id
     
-    with patch("handlers.message_handlers.user_messages") as mock_user_messages:
-        mock_user_messages.__getitem__.return_value = [(1, None, time.time() - 1)]
-        
+    mock_user_history.append(message.chat.id, message.from_user.id, (1, None, time.time() - 1, 1))
+    
+    await process_group_message(message, bot, config=config)
+    
+    message.delete.assert_not_called() 
+
+@pytest.mark.asyncio
+async def test_process_group_message_fast_reject_not_allowed_group(message, bot, config):
+    """
+    Проверяет быстрый отсев сообщений из неразрешенных групп.
+    
+    Ожидаемое поведение:
+    - Метаданные чата не запрашиваются
+    - Увеличивается счетчик причины отсева
+    """
+    message.chat.id = 999999999
+    before = reject_stats["not_allowed_chat"]
+    
+    await process_group_message(message, bot, config=config)
+    
+    bot.get_chat.assert_not_called()
+    assert reject_stats["not_allowed_chat"] == before + 1
+
+@pytest.mark.asyncio
+async def test_media_group_duplicates_counted_as_cache_hits(message, bot, config):
+    """
+    Проверяет отсев повторных сообщений одного альбома.
+
+    Ожидаемое поведение:
+    - Второе сообщение медиагруппы отбрасывается как дубликат
+    - Проверка учитывается в статистике кэша медиагрупп: один промах, одно попадание
+    """
+    message.chat.id = config.allowed_groups[0]
+    message.media_group_id = "album-1"
+    cache = TTLCache(maxsize=10, ttl=60)
+    before = reject_stats["media_group_duplicate"]
+
+    with patch("handlers.message_handlers.media_groups_cache", cache):
         await process_group_message(message, bot, config=config)
-        
-        message.delete.assert_not_called() 
\ No newline at end of file
+        await process_group_message(message, bot, config=config)
+
+    assert reject_stats["media_group_duplicate"] == before + 1
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"]) == (1, 1)
+
+@pytest.mark.asyncio
+async def test_process_group_message_fast_reject_reasons(message, bot, config):
+    """
+    Проверяет подсчет причин отсева для ботов, служебных и длинных сообщений.
+    
+    Ожидаемое поведение:
+    - Каждое отброшенное сообщение учитывается по своей причине
+    - Сообщения не удаляются
+    """
+    message.chat.id = config.allowed_groups[0]
+    before = dict(reject_stats)
+    
+    message.from_user.is_bot = True
+    await process_group_message(message, bot, config=config)
+    message.from_user.is_bot = False
+    
+    message.new_chat_members = []
+    await process_group_message(message, bot, config=config)
+    message.new_chat_members = None
+    
+    message.text = "x" * config.message_length_limit
+    await process_group_message(message, bot, config=config)
+    
+    assert reject_stats["bot"] == before.get("bot", 0) + 1
+    assert reject_stats["service"] == before.get("service", 0) + 1
+    assert reject_stats["long_message"] == before.get("long_message", 0) + 1
+    message.delete.assert_not_called()
+
+@pytest.mark.asyncio
+async def test_apply_penalties_deferred(message, bot, config):
+    """
+    Проверяет, что пауза перед ответом не держит обработчик.
+
+    Ожидаемое поведение:
+    - Мут применяется сразу, обработчик не ждёт паузы и ничего не отправляет в группу
+    - После bot_message_delay_seconds отправляется уведомление, затем сообщение о муте
+    """
+    config.bot_message_delay_seconds = 0.2
+    message.chat.id = config.allowed_groups[0]
+    message.reply = AsyncMock(return_value=MagicMock(message_id=555, chat=MagicMock(id=message.chat.id)))
+    dispatcher = DeferredDispatcher()
+
+    with patch("handlers.message_handlers.deferred_dispatcher", dispatcher):
+        started = time.monotonic()
+        await apply_penalties_if_needed(
+            message.from_user.id, "@test_user", message.chat.id, config, "no_reply", "text", bot,
+            original_message=message, count_incidents=2
+        )
+        assert time.monotonic() - started < 0.1
+        message.reply.assert_not_called()
+        bot.restrict_chat_member.assert_awaited_once()
+
+        deadline = time.monotonic() + 2
+        while dispatcher.stats()["delivered"] < 1:
+            assert time.monotonic() < deadline
+            await asyncio.sleep(0.01)
+
+        assert time.monotonic() - started >= 0.2
+        texts = [call.args[0] for call in message.reply.await_args_list]
+        assert texts[0] == config.policy.violation_text("no_reply", "@test_user", with_delete_warning=True)
+        assert len(texts) == 2 and "@test_user" in texts[1]
+        assert dispatcher.stats()["delivery_max_ms"] >= 200
+        await dispatcher.stop()
+
+@pytest.mark.asyncio
+async def test_penalty_not_blocked_by_throttled_chat(message, bot, config):
+    """
+    Проверяет, что наказание не ждёт уведомлений в чате с исчерпанным лимитом.
+
+    Ожидаемое поведение:
+    - Мут применяется сразу, хотя уведомление о нарушении ждёт токена чата
+    """
+    message.chat.id = config.allowed_groups[0]
+    message.reply = AsyncMock(return_value=MagicMock(message_id=555, chat=MagicMock(id=message.chat.id)))
+    queue = OutboundQueue(chat_rate_per_minute=120)
+    dispatcher = DeferredDispatcher()
+
+    with patch("handlers.message_handlers.send_queue", queue), \
+         patch("handlers.message_handlers.deferred_dispatcher", dispatcher):
+        # Лимит чата исчерпан: следующий токен появится через 0.3 секунды
+        await queue.submit(message.chat.id, PRIORITY_COSMETIC, AsyncMock())
+        queue._bucket(message.chat.id).drain(time.monotonic(), 0.3)
+
+        await apply_penalties_if_needed(
+            message.from_user.id, "@test_user", message.chat.id, config, "no_reply", "text", bot,
+            original_message=message, count_incidents=2
+        )
+
+        # Мут применён до возврата из обработчика
+        bot.restrict_chat_member.assert_awaited_once()
+
+        deadline = time.monotonic() + 1
+        while queue.stats()["depth"]["cosmetic"] < 1:
+            assert time.monotonic() < deadline
+            await asyncio.sleep(0.01)
+        message.reply.assert_not_called()
+
+        # Уведомление и сообщение о муте уходят, когда появляются токены чата
+        deadline = time.monotonic() + 3
+        while message.reply.await_count < 2:
+            assert time.monotonic() < deadline
+            await asyncio.sleep(0.01)
+        await dispatcher.stop()
+        await queue.stop()
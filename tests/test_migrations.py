@@ -0,0 +1,136 @@
+"""
+Тесты версионных миграций схемы и планов горячих запросов
+"""
+import sqlite3
+
+import pytest
+
+from db import migrations, operations
+
+COUNT_QUERY = """
+SELECT COUNT(*) FROM violations
+WHERE user_id = ? AND chat_id = ?
+AND timestamp > ?
+"""
+
+ACTIVE_QUERY = """
+SELECT * FROM violations
+WHERE user_id = ? AND chat_id = ?
+AND timestamp > ?
+ORDER BY timestamp DESC
+"""
+
+
+def _query_plan(path: str, query: str) -> str:
+    with sqlite3.connect(path) as conn:
+        rows = conn.execute(f"EXPLAIN QUERY PLAN {query}", (1, -100, 0)).fetchall()
+    return "\n".join(row[-1] for row in rows)
+
+
+@pytest.mark.asyncio
+async def test_new_database_gets_latest_version(tmp_path, monkeypatch):
+    """Новая база получает все миграции, повторный запуск не выполняет DDL"""
+    path = str(tmp_path / "schema.db")
+    monkeypatch.setattr(operations, "DB_PATH", path)
+    await operations.init_db()
+    try:
+        assert await migrations.get_schema_version(operations.db_pool) == migrations.LATEST_VERSION
+        assert await migrations.apply_migrations(operations.db_pool, operations.db_writer) == 0
+
+        with sqlite3.connect(path) as conn:
+            indexes = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type='index'")}
+            analyzed = conn.execute("SELECT COUNT(*) FROM sqlite_master WHERE name='sqlite_stat1'").fetchone()[0]
+        assert "idx_violations_user_chat_ts" in indexes
+        assert "idx_violations_user_id" not in indexes
+        assert analyzed == 1
+    finally:
+        await operations.close_connection_pool()
+
+
+@pytest.mark.asyncio
+async def test_legacy_database_upgraded(tmp_path, monkeypatch):
+    """База версии без миграций доводится до последней версии без потери данных"""
+    path = str(tmp_path / "legacy.db")
+    with sqlite3.connect(path) as conn:
+        conn.executescript(migrations.INITIAL_SCHEMA_SCRIPT)
+        conn.execute(
+            "INSERT INTO users_incidents (user_id, incident_count, last_incident_ts) VALUES (1, 3, 0)"
+        )
+
+    monkeypatch.setattr(operations, "DB_PATH", path)
+    await operations.init_db()
+    try:
+        with sqlite3.connect(path) as conn:
+            versions = [row[0] for row in conn.execute("SELECT version FROM schema_version ORDER BY version")]
+        assert versions == [migration.version for migration in migrations.MIGRATIONS]
+        assert await operations.get_incidents_count(1) == 3
+    finally:
+        await operations.close_connection_pool()
+
+
+@pytest.mark.asyncio
+async def test_failed_migration_rolled_back(tmp_path, monkeypatch):
+    """Ошибка в скрипте миграции откатывает её целиком, версия не записывается"""
+    path = str(tmp_path / "broken.db")
+    monkeypatch.setattr(operations, "DB_PATH", path)
+    await operations.init_db()
+
+    broken = migrations.MIGRATIONS + (
+        migrations.Migration(
+            migrations.LATEST_VERSION + 1, "Ошибка",
+            script="CREATE TABLE extra (x INTEGER); INSERT INTO missing VALUES (1);"
+        ),
+    )
+    try:
+        with pytest.raises(sqlite3.OperationalError):
+            await migrations.apply_migrations(operations.db_pool, operations.db_writer, broken)
+
+        assert await migrations.get_schema_version(operations.db_pool) == migrations.LATEST_VERSION
+        with sqlite3.connect(path) as conn:
+            assert conn.execute("SELECT COUNT(*) FROM sqlite_master WHERE name='extra'").fetchone()[0] == 0
+    finally:
+        await operations.close_connection_pool()
+
+
+@pytest.mark.asyncio
+async def test_hot_queries_use_composite_index(tmp_path, monkeypatch):
+    """Подсчёт нарушений идёт только по индексу, выборка не сортируется отдельно"""
+    path = str(tmp_path / "plan.db")
+    monkeypatch.setattr(operations, "DB_PATH", path)
+    await operations.init_db()
+    try:
+        count_plan = _query_plan(path, COUNT_QUERY)
+        assert "USING COVERING INDEX idx_violations_user_chat_ts" in count_plan
+
+        active_plan = _query_plan(path, ACTIVE_QUERY)
+        assert "USING INDEX idx_violations_user_chat_ts" in active_plan
+        assert "TEMP B-TREE" not in active_plan
+    finally:
+        await operations.close_connection_pool()
+
+
+@pytest.mark.asyncio
+async def test_current_schema_checked_by_fingerprint(tmp_path, monkeypatch):
+    """Актуальная схема определяется по отпечатку в заголовке базы, без чтения таблиц"""
+    path = str(tmp_path / "fingerprint.db")
+    monkeypatch.setattr(operations, "DB_PATH", path)
+    await operations.init_db()
+    try:
+        with sqlite3.connect(path) as conn:
+            assert conn.execute("PRAGMA user_version").fetchone()[0] == migrations.schema_fingerprint()
+            # Без таблицы версий проверка по отпечатку всё равно считает схему актуальной
+            conn.execute("ALTER TABLE schema_version RENAME TO schema_version_backup")
+
+        assert await migrations.apply_migrations(operations.db_pool, operations.db_writer) == 0
+
+        # Изменённый список миграций меняет отпечаток, и схема сверяется заново
+        extended = migrations.MIGRATIONS + (
+            migrations.Migration(migrations.LATEST_VERSION + 1, "Новая таблица", script="CREATE TABLE extra (x INTEGER);"),
+        )
+        with sqlite3.connect(path) as conn:
+            conn.execute("ALTER TABLE schema_version_backup RENAME TO schema_version")
+        assert migrations.schema_fingerprint(extended) != migrations.schema_fingerprint()
+        assert await migrations.apply_migrations(operations.db_pool, operations.db_writer, extended) == 1
+        assert await migrations.apply_migrations(operations.db_pool, operations.db_writer, extended) == 0
+    finally:
+        await operations.close_connection_pool()
@@ -0,0 +1,123 @@
+"""
+Тесты снятия истёкших наказаний
+"""
+import asyncio
+import sqlite3
+import time
+
+import pytest
+
+from db import operations
+
+
+def _penalty_users(path: str):
+    with sqlite3.connect(path) as conn:
+        return sorted(row[0] for row in conn.execute("SELECT user_id FROM penalties_active"))
+
+
+async def _wait_for(predicate, timeout: float = 2.0):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline, "условие не выполнилось вовремя"
+        await asyncio.sleep(0.01)
+
+
+@pytest.mark.asyncio
+async def test_expired_penalties_removed_in_batch(tmp_path, monkeypatch):
+    """Наступившие наказания удаляются одной операцией, будущие и бессрочные остаются"""
+    path = str(tmp_path / "penalties.db")
+    monkeypatch.setattr(operations, "DB_PATH", path)
+    await operations.init_db()
+    scheduler = operations.penalty_expiry
+    now = int(time.time())
+
+    # Наказания, установленные до запуска, загружаются из базы
+    with sqlite3.connect(path) as conn:
+        conn.executemany(
+            "INSERT INTO penalties_active (user_id, user_name, penalty_type, until_date) VALUES (?, 'user', 'read-only', ?)",
+            [(1, now - 10), (2, now - 5), (3, now + 3600), (4, None)]
+        )
+
+    try:
+        assert await scheduler.load() == 3
+        batches_before = scheduler.batches
+        scheduler.start()
+
+        await _wait_for(lambda: _penalty_users(path) == [3, 4])
+        assert scheduler.batches - batches_before == 1
+        assert scheduler.stats()["pending"] == 1
+    finally:
+        await operations.close_connection_pool()
+
+
+@pytest.mark.asyncio
+async def test_schedule_follows_set_and_revoke(tmp_path, monkeypatch):
+    """Куча следует за set_penalty и revoke_penalty, продлённое наказание не снимается"""
+    path = str(tmp_path / "penalties.db")
+    monkeypatch.setattr(operations, "DB_PATH", path)
+    await operations.init_db()
+    scheduler = operations.penalty_expiry
+    now = int(time.time())
+
+    try:
+        await scheduler.load()
+        scheduler.start()
+
+        await operations.set_penalty(1, "user", "read-only", now + 3600)
+        await operations.set_penalty(2, "user", "read-only", now + 3600)
+        assert await operations.get_penalty(1) == "read-only"
+
+        # Наказание с уже наступившим сроком будит спящую задачу
+        expired_before = scheduler.expired
+        await operations.set_penalty(1, "user", "read-only", now - 1)
+        # Ждём не только удаления строки, но и сброса кэша после коммита
+        await _wait_for(lambda: scheduler.expired > expired_before)
+        assert _penalty_users(path) == [2]
+        assert await operations.get_penalty(1) is None
+
+        # Отменённое наказание больше не отслеживается
+        await operations.revoke_penalty(2)
+        assert scheduler.stats()["pending"] == 0
+    finally:
+        await operations.close_connection_pool()
+
+
+@pytest.mark.asyncio
+async def test_failed_write_retried(tmp_path, monkeypatch):
+    """Если запись в базу не удалась, наказания возвращаются в кучу и снимаются повторно"""
+    from db import penalty_expiry
+
+    path = str(tmp_path / "penalties.db")
+    monkeypatch.setattr(operations, "DB_PATH", path)
+    monkeypatch.setattr(penalty_expiry, "PENALTY_EXPIRY_RETRY_DELAY", 0.05)
+    await operations.init_db()
+    scheduler = operations.penalty_expiry
+    now = int(time.time())
+
+    with sqlite3.connect(path) as conn:
+        conn.executemany(
+            "INSERT INTO penalties_active (user_id, user_name, penalty_type, until_date) VALUES (?, 'user', 'read-only', ?)",
+            [(1, now - 10), (2, now - 5)]
+        )
+
+    submit = scheduler.writer.submit
+    calls = []
+
+    async def failing_once(op):
+        calls.append(op)
+        if len(calls) == 1:
+            raise sqlite3.OperationalError("database is locked")
+        return await submit(op)
+
+    monkeypatch.setattr(scheduler.writer, "submit", failing_once)
+    try:
+        assert await scheduler.load() == 2
+        failures_before = scheduler.failures
+        scheduler.start()
+
+        await _wait_for(lambda: _penalty_users(path) == [])
+        assert scheduler.failures - failures_before == 1
+        assert len(calls) == 2
+        assert scheduler.stats()["pending"] == 0
+    finally:
+        await operations.close_connection_pool()
@@ -0,0 +1,24 @@
+"""
+Тесты стенда воспроизведения обновлений
+"""
+import pytest
+
+from benchmarks.replay import build_config, generate_updates, replay
+from db import operations as db_operations
+
+
+@pytest.mark.asyncio
+async def test_replay_synthetic_stream(tmp_path, monkeypatch):
+    """Синтетический поток проходит через роутер, метрики собираются"""
+    monkeypatch.setattr(db_operations, "DB_PATH", db_operations.DB_PATH)
+    updates = generate_updates(300)
+    config = build_config("config.example.json", synthetic=True, penalties=False)
+
+    metrics = await replay(updates, config, str(tmp_path))
+
+    assert metrics["updates"] == 300
+    assert metrics["updates_per_second"] > 0
+    assert metrics["p50_ms"] <= metrics["p95_ms"] <= metrics["p99_ms"]
+    # Синтетический поток содержит нарушения, поэтому бот пишет в базу и отвечает в чат
+    assert metrics["db_statements_per_update"] > 0
+    assert metrics["api_calls"].get("SendMessage", 0) > 0
@@ -0,0 +1,82 @@
+"""
+Тесты порционного удаления устаревших записей
+"""
+import sqlite3
+import time
+
+import pytest
+
+from db import migrations, operations
+
+
+def _insert_rows(path: str, timestamps):
+    with sqlite3.connect(path) as conn:
+        conn.executemany(
+            "INSERT INTO violations (user_id, chat_id, violation_type, message_text, timestamp) VALUES (1, -100, 'no_reply', '', ?)",
+            [(ts,) for ts in timestamps]
+        )
+        conn.executemany(
+            "INSERT INTO messages_deleted (user_id, user_name, group_id, message_text, timestamp) VALUES (1, 'user', -100, 'text', ?)",
+            [(ts,) for ts in timestamps]
+        )
+
+
+def _timestamps(path: str, table: str):
+    with sqlite3.connect(path) as conn:
+        return sorted(row[0] for row in conn.execute(f"SELECT timestamp FROM {table}"))
+
+
+@pytest.mark.asyncio
+async def test_purge_deletes_old_rows_in_chunks(tmp_path, monkeypatch):
+    """Удаляются только строки старше границы, порциями не больше chunk_size"""
+    path = str(tmp_path / "retention.db")
+    monkeypatch.setattr(operations, "DB_PATH", path)
+    await operations.init_db()
+    purger = operations.retention_purger
+    monkeypatch.setattr(purger, "chunk_size", 10)
+
+    # Строки вставлены не по порядку времени
+    old = [1000 + i for i in range(25)]
+    fresh = [5000 + i for i in range(5)]
+    _insert_rows(path, fresh[:2] + old + fresh[2:])
+
+    try:
+        chunks_before = purger.chunks
+        purged = await purger.purge(cutoff_ts=2000)
+
+        assert purged == {"violations": 25, "messages_deleted": 25}
+        assert _timestamps(path, "violations") == fresh
+        assert _timestamps(path, "messages_deleted") == fresh
+        # 25 строк по 10: три порции на таблицу
+        assert purger.chunks - chunks_before == 6
+    finally:
+        await operations.close_connection_pool()
+
+
+@pytest.mark.asyncio
+async def test_init_db_drops_cleanup_triggers(tmp_path, monkeypatch):
+    """Триггеры очистки из прежних версий удаляются и больше не трогают старые строки"""
+    path = str(tmp_path / "legacy.db")
+    with sqlite3.connect(path) as conn:
+        conn.executescript(migrations.INITIAL_SCHEMA_SCRIPT)
+        conn.execute(
+            """
+            CREATE TRIGGER cleanup_old_violations AFTER INSERT ON violations
+            BEGIN
+                DELETE FROM violations WHERE timestamp < (strftime('%s', 'now') - 2592000);
+            END
+            """
+        )
+
+    monkeypatch.setattr(operations, "DB_PATH", path)
+    await operations.init_db()
+    try:
+        with sqlite3.connect(path) as conn:
+            assert conn.execute("SELECT COUNT(*) FROM sqlite_master WHERE type='trigger'").fetchone()[0] == 0
+
+        # Строка старше 30 дней остаётся, пока её не удалит очистка по data_retention_days
+        old_ts = int(time.time()) - 90 * 86400
+        _insert_rows(path, [old_ts, int(time.time())])
+        assert len(_timestamps(path, "violations")) == 2
+    finally:
+        await operations.close_connection_pool()
@@ -0,0 +1,108 @@
+"""
+Тесты движка правил проверки сообщений
+"""
+from rules.engine import MessageEvent, NO_VIOLATION, RuleEngine, Verdict
+from state.chat_state import ChatState
+
+CHAT_ID = 100
+USER_ID = 1
+OTHER_USER_ID = 2
+COOLDOWN = 60
+
+
+def _post(state: ChatState, engine: RuleEngine, message_id: int, user_id: int, ts: float,
+          reply_to_message_id=None, reply_to_user_id=None, is_admin: bool = False) -> Verdict:
+    """Добавляет сообщение в состояние так же, как обработчик, и возвращает вердикт"""
+    event = MessageEvent(CHAT_ID, user_id, message_id, reply_to_message_id, reply_to_user_id, ts, is_admin)
+    seq = state.timeline(CHAT_ID).append(message_id, user_id, ts)
+    verdict = engine.evaluate(event, state, COOLDOWN)
+    state.history.append(CHAT_ID, user_id, (message_id, reply_to_message_id, ts, seq))
+    return verdict
+
+
+def test_first_message_is_not_violation():
+    """Первое сообщение пользователя не проверяется"""
+    state, engine = ChatState(), RuleEngine()
+
+    assert _post(state, engine, 1, USER_ID, 100.0) is NO_VIOLATION
+
+
+def test_no_reply_violation():
+    """Два сообщения без реплая подряд нарушают правило no_reply"""
+    state, engine = ChatState(), RuleEngine()
+
+    _post(state, engine, 1, USER_ID, 100.0)
+
+    assert _post(state, engine, 2, USER_ID, 101.0) == Verdict("no_reply", True)
+
+
+def test_no_reply_interrupted_by_other_user():
+    """Сообщение другого пользователя между сообщениями снимает нарушение no_reply"""
+    state, engine = ChatState(), RuleEngine()
+
+    _post(state, engine, 1, USER_ID, 100.0)
+    _post(state, engine, 2, OTHER_USER_ID, 100.5)
+
+    assert _post(state, engine, 3, USER_ID, 101.0) is NO_VIOLATION
+
+
+def test_self_reply_violation():
+    """Реплай на своё сообщение нарушает правило self_reply"""
+    state, engine = ChatState(), RuleEngine()
+
+    _post(state, engine, 1, USER_ID, 100.0)
+
+    verdict = _post(state, engine, 2, USER_ID, 101.0, reply_to_message_id=1, reply_to_user_id=USER_ID)
+    assert verdict == Verdict("self_reply", True)
+
+
+def test_double_reply_violation():
+    """Повторный ответ на одно и то же сообщение нарушает правило double_reply"""
+    state, engine = ChatState(), RuleEngine()
+
+    _post(state, engine, 1, USER_ID, 100.0, reply_to_message_id=50, reply_to_user_id=OTHER_USER_ID)
+
+    verdict = _post(state, engine, 2, USER_ID, 101.0, reply_to_message_id=50, reply_to_user_id=OTHER_USER_ID)
+    assert verdict == Verdict("double_reply", True)
+
+
+def test_reply_to_unknown_author_is_not_checked():
+    """Реплай на сообщение без автора не проверяется"""
+    state, engine = ChatState(), RuleEngine()
+
+    _post(state, engine, 1, USER_ID, 100.0, reply_to_message_id=50)
+
+    assert _post(state, engine, 2, USER_ID, 101.0, reply_to_message_id=50) is NO_VIOLATION
+
+
+def test_cooldown_and_history_ttl():
+    """Сообщения после интервала и при отключённом интервале не нарушают правил"""
+    state, engine = ChatState(), RuleEngine(history_ttl=30)
+
+    _post(state, engine, 1, USER_ID, 100.0)
+    # Интервал 60 секунд, но предыдущее сообщение старше history_ttl
+    assert _post(state, engine, 2, USER_ID, 140.0) is NO_VIOLATION
+
+    event = MessageEvent(CHAT_ID, USER_ID, 3, None, None, 141.0)
+    assert engine.evaluate(event, state, 0) is NO_VIOLATION
+
+
+def test_admin_messages_are_not_deleted():
+    """Нарушение администратора фиксируется без удаления сообщения"""
+    state, engine = ChatState(), RuleEngine()
+
+    _post(state, engine, 1, USER_ID, 100.0, is_admin=True)
+
+    assert _post(state, engine, 2, USER_ID, 101.0, is_admin=True) == Verdict("no_reply", False)
+
+
+def test_custom_rule():
+    """Новое правило подключается через список правил"""
+    def long_thread(event, prev, state):
+        return event.message_id - prev[0] > 10
+
+    state, engine = ChatState(), RuleEngine(rules=[("long_thread", long_thread)])
+
+    _post(state, engine, 1, USER_ID, 100.0)
+
+    assert _post(state, engine, 20, USER_ID, 101.0) == Verdict("long_thread", True)
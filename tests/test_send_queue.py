@@ -0,0 +1,134 @@
+"""
+Тесты очереди исходящих действий бота
+"""
+import asyncio
+import time
+from unittest.mock import MagicMock
+
+import pytest
+from aiogram.exceptions import TelegramRetryAfter
+
+from services.send_queue import (
+    OutboundQueue,
+    PRIORITY_PENALTY,
+    PRIORITY_ADMIN,
+    PRIORITY_WARNING,
+    PRIORITY_COSMETIC
+)
+
+
+def _action(calls, name, result=None):
+    async def run():
+        calls.append(name)
+        return result
+    return run
+
+
+@pytest.mark.asyncio
+async def test_actions_run_in_priority_order():
+    """Поставленные одновременно действия выполняются от наказаний к косметическим ответам"""
+    queue = OutboundQueue()
+    calls = []
+    try:
+        results = await asyncio.gather(
+            queue.submit(-100, PRIORITY_COSMETIC, _action(calls, "cosmetic", 4)),
+            queue.submit(-100, PRIORITY_WARNING, _action(calls, "warning", 3)),
+            queue.submit(-200, PRIORITY_ADMIN, _action(calls, "admin", 2)),
+            queue.submit(None, PRIORITY_PENALTY, _action(calls, "penalty", 1))
+        )
+        assert results == [4, 3, 2, 1]
+        assert calls == ["penalty", "admin", "warning", "cosmetic"]
+        assert queue.stats()["sent"] == 4
+    finally:
+        await queue.stop()
+
+
+@pytest.mark.asyncio
+async def test_throttled_chat_does_not_block_others():
+    """Исчерпанный лимит одного чата не задерживает действия в другом"""
+    queue = OutboundQueue(global_rate=1000, chat_rate_per_minute=60)
+    calls = []
+    try:
+        await asyncio.gather(*(queue.submit(-100, PRIORITY_WARNING, _action(calls, -100)) for _ in range(60)))
+        started = time.monotonic()
+        busy = asyncio.ensure_future(queue.submit(-100, PRIORITY_PENALTY, _action(calls, "late")))
+        await queue.submit(-200, PRIORITY_COSMETIC, _action(calls, -200))
+        assert time.monotonic() - started < 0.5
+        assert not busy.done()
+
+        # Токен чата появляется через секунду
+        await busy
+        assert calls[-1] == "late"
+        assert queue.stats()["throttled_chats"] == 0
+    finally:
+        await queue.stop()
+
+
+@pytest.mark.asyncio
+async def test_retry_after_is_honored():
+    """После RetryAfter действие повторяется не раньше указанного времени"""
+    queue = OutboundQueue()
+    attempts = []
+
+    async def flaky():
+        attempts.append(time.monotonic())
+        if len(attempts) == 1:
+            raise TelegramRetryAfter(method=MagicMock(), message="Too Many Requests", retry_after=0.2)
+        return "ok"
+
+    try:
+        assert await queue.submit(-100, PRIORITY_WARNING, flaky) == "ok"
+        assert attempts[1] - attempts[0] >= 0.19
+        stats = queue.stats()
+        assert stats["retry_after"] == 1
+        assert stats["sent"] == 1
+    finally:
+        await queue.stop()
+
+
+@pytest.mark.asyncio
+async def test_errors_reach_the_caller():
+    """Ошибка действия возвращается вызывающему, повторы после RetryAfter ограничены"""
+    queue = OutboundQueue(max_retries=1)
+
+    async def broken():
+        raise ValueError("bad request")
+
+    async def flooded():
+        raise TelegramRetryAfter(method=MagicMock(), message="Too Many Requests", retry_after=0)
+
+    try:
+        with pytest.raises(ValueError):
+            await queue.submit(-100, PRIORITY_ADMIN, broken)
+        with pytest.raises(TelegramRetryAfter):
+            await queue.submit(None, PRIORITY_PENALTY, flooded)
+        stats = queue.stats()
+        assert stats["failed"] == 2
+        assert stats["retry_after"] == 2
+        assert sum(stats["depth"].values()) == 0
+    finally:
+        await queue.stop()
+
+
+@pytest.mark.asyncio
+async def test_enqueue_does_not_wait_and_stop_drains(caplog):
+    """enqueue возвращается сразу, ошибка логируется, stop дожидается поставленных действий"""
+    queue = OutboundQueue(chat_rate_per_minute=120)
+    calls = []
+
+    async def broken():
+        raise RuntimeError("chat not found")
+
+    # Лимит чата исчерпан: действия дождутся токена, а enqueue возвращается сразу
+    await queue.submit(-100, PRIORITY_COSMETIC, _action(calls, "first"))
+    queue._bucket(-100).drain(time.monotonic(), 0.2)
+    future = queue.enqueue(-100, PRIORITY_COSMETIC, _action(calls, "second"))
+    queue.enqueue(-200, PRIORITY_ADMIN, broken)
+    assert not future.done()
+
+    await queue.stop()
+
+    assert calls == ["first", "second"]
+    assert future.done()
+    assert queue.stats()["failed"] == 1
+    assert "chat not found" in caplog.text
@@ -0,0 +1,84 @@
+"""
+Тесты сериализации контекста нарушений
+"""
+import sqlite3
+
+import pytest
+
+from db import migrations, operations
+from db.serializers import FORMAT_JSON, decode_context, encode_context
+
+
+def test_json_roundtrip():
+    """Контекст сохраняется с номером формата и читается обратно"""
+    context = {"message_id": 10, "text": "привет", "reply_to": None, "is_admin": False}
+    data = encode_context(context)
+
+    assert data[0] == FORMAT_JSON
+    assert decode_context(data) == context
+    assert encode_context(None) is None
+    assert encode_context({}) is None
+    assert decode_context(None) is None
+
+
+def test_legacy_context_is_not_evaluated():
+    """Контекст в прежнем формате разбирается без выполнения кода"""
+    assert decode_context("{'message_id': 10, 'text': 'привет'}") == {"message_id": 10, "text": "привет"}
+    assert decode_context("__import__('os').getcwd()") == "__import__('os').getcwd()"
+
+
+def test_unknown_format_rejected():
+    with pytest.raises(ValueError):
+        decode_context(b"\x7f{}")
+
+
+@pytest.mark.asyncio
+async def test_migration_rewrites_legacy_rows(tmp_path, monkeypatch):
+    """Миграция переписывает контекст прежнего формата порциями, не трогая новые строки"""
+    path = str(tmp_path / "context.db")
+    with sqlite3.connect(path) as conn:
+        conn.executescript(migrations.INITIAL_SCHEMA_SCRIPT)
+        conn.executemany(
+            "INSERT INTO violations (user_id, chat_id, violation_type, message_text, context, timestamp) VALUES (1, -100, 'no_reply', '', ?, 0)",
+            [(str({"message_id": i}),) for i in range(7)] + [(None,), (encode_context({"message_id": 100}),), ("{1, 2}",)]
+        )
+
+    monkeypatch.setattr(operations, "DB_PATH", path)
+    await operations.init_db()
+    try:
+        # init_db уже перевёл все строки, повторный запуск ничего не меняет
+        assert await migrations.reencode_legacy_contexts(operations.db_writer, batch_size=3) == 0
+
+        with sqlite3.connect(path) as conn:
+            rows = conn.execute("SELECT context FROM violations ORDER BY id").fetchall()
+        contexts = [decode_context(row[0]) for row in rows]
+
+        assert contexts[:7] == [{"message_id": i} for i in range(7)]
+        assert contexts[7] is None
+        assert contexts[8] == {"message_id": 100}
+        # Множество не представимо в JSON и сохраняется строкой
+        assert contexts[9] == "{1, 2}"
+        assert all(not isinstance(row[0], str) for row in rows)
+    finally:
+        await operations.close_connection_pool()
+
+
+@pytest.mark.asyncio
+async def test_migration_in_batches(tmp_path, monkeypatch):
+    """Миграция обходит строки порциями заданного размера"""
+    path = str(tmp_path / "context.db")
+    monkeypatch.setattr(operations, "DB_PATH", path)
+    await operations.init_db()
+    with sqlite3.connect(path) as conn:
+        conn.executemany(
+            "INSERT INTO violations (user_id, chat_id, violation_type, message_text, context, timestamp) VALUES (1, -100, 'no_reply', '', ?, 0)",
+            [(str({"message_id": i}),) for i in range(10)]
+        )
+
+    try:
+        batches_before = operations.db_writer.stats()["batches"]
+        assert await migrations.reencode_legacy_contexts(operations.db_writer, batch_size=3) == 10
+        # Четыре порции по 3 строки, каждая - отдельная операция записи
+        assert operations.db_writer.stats()["batches"] - batches_before == 4
+    finally:
+        await operations.close_connection_pool()
@@ -0,0 +1,92 @@
+"""
+Тесты кэша с ограничением размера и временем жизни записей
+"""
+from unittest.mock import patch
+
+from state.ttl_cache import TTLCache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_get_and_set():
+    """Сохранённое значение возвращается до истечения TTL"""
+    cache = TTLCache(maxsize=10, ttl=60)
+    cache.set("a", 1)
+
+    assert cache.get("a") == 1
+    assert "a" in cache
+    assert cache.get("b") is None
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 1
+
+
+def test_entries_expire():
+    """Устаревшие записи не возвращаются и удаляются при вставке"""
+    clock = FakeClock()
+    with patch("state.ttl_cache.time.monotonic", clock):
+        cache = TTLCache(maxsize=10, ttl=10)
+        cache.set("a", 1)
+        cache.set("b", 2)
+
+        clock.now += 11
+        assert "a" not in cache
+        assert cache.get("a") is None
+
+        cache.set("c", 3)
+        assert len(cache) == 1
+        assert cache.stats()["expirations"] == 2
+
+
+def test_per_entry_ttl():
+    """Время жизни можно переопределить для отдельной записи"""
+    clock = FakeClock()
+    with patch("state.ttl_cache.time.monotonic", clock):
+        cache = TTLCache(maxsize=10, ttl=100)
+        cache.set("short", 1, ttl=5)
+        cache.set("long", 2)
+
+        clock.now += 6
+        assert cache.get("short") is None
+        assert cache.get("long") == 2
+
+
+def test_size_is_capped():
+    """При превышении размера вытесняются самые старые записи"""
+    cache = TTLCache(maxsize=3, ttl=60)
+    for i in range(10):
+        cache.set(i, i)
+
+    assert len(cache) == 3
+    assert cache.get(0) is None
+    assert cache.get(9) == 9
+    assert cache.stats()["evictions"] == 7
+
+
+def test_touch_on_get_protects_recent_entries():
+    """В режиме LRU прочитанная запись не вытесняется первой"""
+    cache = TTLCache(maxsize=2, ttl=60, touch_on_get=True)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+
+    assert cache.get("a") == 1
+    assert cache.get("b") is None
+
+
+def test_pop_and_default():
+    """pop удаляет запись, отсутствующие ключи возвращают default"""
+    cache = TTLCache(maxsize=10, ttl=60)
+    cache.set("a", None)
+
+    missing = object()
+    assert cache.get("a", missing) is None
+    assert cache.pop("a", missing) is None
+    assert cache.get("a", missing) is missing
+    assert cache.pop("a", missing) is missing
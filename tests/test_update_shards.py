@@ -0,0 +1,161 @@
+"""
+Тесты обработки обновлений по шардам чатов
+"""
+import asyncio
+import datetime
+from types import SimpleNamespace
+
+import pytest
+from aiogram import Bot, Dispatcher, Router
+from aiogram.types import Chat, ErrorEvent, Message, Update, User
+
+from services.update_shards import ShardedUpdateDispatcher
+
+
+def _data(chat_id):
+    return {"event_chat": SimpleNamespace(id=chat_id)}
+
+
+@pytest.mark.asyncio
+async def test_same_chat_in_order_other_chats_in_parallel():
+    """Обновления одного чата не перекрываются, разные шарды обрабатываются одновременно"""
+    shards = ShardedUpdateDispatcher(shards=4)
+    log = []
+    active = {}
+
+    def handler(delay):
+        async def handle(event, data):
+            chat_id = data["event_chat"].id
+            assert not active.get(chat_id), "обновления одного чата обрабатываются одновременно"
+            active[chat_id] = True
+            await asyncio.sleep(delay)
+            active[chat_id] = False
+            log.append((chat_id, event))
+        return handle
+
+    try:
+        # Первое обновление чата 1 самое медленное: второе всё равно должно идти после него
+        await shards(handler(0.1), "a1", _data(1))
+        await shards(handler(0), "a2", _data(1))
+        await shards(handler(0.02), "b1", _data(2))
+        await asyncio.wait_for(asyncio.gather(*(s.queue.join() for s in shards._shards)), 2)
+
+        assert [event for chat_id, event in log if chat_id == 1] == ["a1", "a2"]
+        # Чат 2 в другом шарде не ждал медленного обновления чата 1
+        assert log[0] == (2, "b1")
+        assert shards.stats()["processed"] == 3
+    finally:
+        await shards.stop()
+
+
+@pytest.mark.asyncio
+async def test_full_queue_applies_backpressure():
+    """Постановка в заполненную очередь шарда ждёт, ошибка обработчика не останавливает шард"""
+    shards = ShardedUpdateDispatcher(shards=1, max_queue=1)
+    release = asyncio.Event()
+    done = []
+
+    async def blocking(event, data):
+        await release.wait()
+        done.append(event)
+
+    async def broken(event, data):
+        raise RuntimeError("ошибка обработчика")
+
+    try:
+        await shards(blocking, "first", _data(1))
+        await asyncio.sleep(0)
+        await shards(broken, "second", _data(2))
+        third = asyncio.ensure_future(shards(blocking, "third", _data(3)))
+        await asyncio.sleep(0.05)
+        assert not third.done()
+
+        release.set()
+        await asyncio.wait_for(third, 1)
+        await asyncio.wait_for(shards._shards[0].queue.join(), 1)
+
+        assert done == ["first", "third"]
+        stats = shards.stats()
+        assert stats["errors"] == 1
+        assert stats["waits"] == 1
+        assert stats["per_shard"][0]["max_lag_ms"] >= 50
+        # Время обработки учитывает ожидание первого обработчика
+        assert stats["per_shard"][0]["max_handle_ms"] >= 50
+    finally:
+        await shards.stop()
+
+
+@pytest.mark.asyncio
+async def test_dispatcher_updates_routed_through_shards():
+    """Обновления диспетчера aiogram доходят до обработчиков через шарды в порядке поступления"""
+    shards = ShardedUpdateDispatcher(shards=2)
+    dp = Dispatcher()
+    dp.update.outer_middleware(shards)
+    router = Router()
+    seen = []
+
+    @router.message()
+    async def on_message(message: Message):
+        seen.append((message.chat.id, message.message_id))
+
+    dp.include_router(router)
+    bot = Bot(token="42:TEST")
+
+    def update(update_id, chat_id, message_id):
+        return Update(update_id=update_id, message=Message(
+            message_id=message_id,
+            date=datetime.datetime.now(),
+            chat=Chat(id=chat_id, type="supergroup"),
+            from_user=User(id=1, is_bot=False, first_name="Test"),
+            text="text"
+        ))
+
+    try:
+        for update_id, (chat_id, message_id) in enumerate([(-100, 1), (-101, 1), (-100, 2), (-100, 3)]):
+            await dp.feed_update(bot, update(update_id, chat_id, message_id))
+        await asyncio.wait_for(asyncio.gather(*(s.queue.join() for s in shards._shards)), 2)
+
+        assert [message_id for chat_id, message_id in seen if chat_id == -100] == [1, 2, 3]
+        assert len(seen) == 4
+    finally:
+        await shards.stop()
+        await bot.session.close()
+
+
+@pytest.mark.asyncio
+async def test_handler_errors_reach_router_errors():
+    """Ошибка обработчика в шарде доходит до router.errors, как без шардов"""
+    shards = ShardedUpdateDispatcher(shards=1)
+    dp = Dispatcher()
+    dp.update.outer_middleware(shards)
+    router = Router()
+    caught = []
+
+    @router.message()
+    async def on_message(message: Message):
+        raise ValueError("ошибка обработчика")
+
+    @router.errors()
+    async def on_error(event: ErrorEvent):
+        caught.append((event.update.update_id, str(event.exception)))
+        return True
+
+    dp.include_router(router)
+    bot = Bot(token="42:TEST")
+
+    try:
+        await dp.feed_update(bot, Update(update_id=7, message=Message(
+            message_id=1,
+            date=datetime.datetime.now(),
+            chat=Chat(id=-100, type="supergroup"),
+            from_user=User(id=1, is_bot=False, first_name="Test"),
+            text="text"
+        )))
+        await asyncio.wait_for(shards._shards[0].queue.join(), 2)
+
+        assert caught == [(7, "ошибка обработчика")]
+        # Обработанная router.errors ошибка не считается ошибкой шарда
+        assert shards.stats()["errors"] == 0
+    finally:
+        await shards.stop()
+        await bot.session.close()
@@ -0,0 +1,72 @@
+"""
+Тесты истории сообщений пользователей
+"""
+from state.user_history import MessageRing, UserHistoryStore
+
+
+def test_ring_keeps_last_entries():
+    """Кольцевой буфер хранит только последние записи"""
+    ring = MessageRing(capacity=3)
+    for i in range(5):
+        ring.append((i, None, float(i), i))
+
+    assert len(ring) == 3
+    assert [entry[0] for entry in ring] == [2, 3, 4]
+    assert ring.last()[0] == 4
+
+
+def test_empty_ring():
+    """Пустой буфер не возвращает записей"""
+    ring = MessageRing()
+
+    assert ring.last() is None
+    assert list(ring) == []
+
+
+def test_previous_message():
+    """Предыдущее сообщение - последнее сохранённое до текущего"""
+    store = UserHistoryStore()
+
+    assert store.previous(-100, 1) is None
+    store.append(-100, 1, (10, None, 100.0, 1))
+    store.append(-100, 1, (11, 5, 101.0, 2))
+
+    assert store.previous(-100, 1) == (11, 5, 101.0, 2)
+
+
+def test_history_is_scoped_by_chat():
+    """История пользователя в одной группе не смешивается с другой"""
+    store = UserHistoryStore()
+
+    store.append(-100, 1, (10, None, 100.0, 1))
+    store.append(-200, 1, (20, None, 101.0, 1))
+
+    assert store.previous(-100, 1)[0] == 10
+    assert store.previous(-200, 1)[0] == 20
+    assert store.history(-100, 1) == [(10, None, 100.0, 1)]
+
+
+def test_expire_drops_idle_users():
+    """Истории без свежих сообщений удаляются целиком"""
+    store = UserHistoryStore()
+
+    store.append(-100, 1, (10, None, 100.0, 1))
+    store.append(-100, 2, (11, None, 300.0, 2))
+
+    assert store.expire(200.0) == 1
+    assert store.previous(-100, 1) is None
+    assert store.previous(-100, 2) is not None
+
+
+def test_memory_report():
+    """Отчёт о памяти учитывает всех отслеживаемых пользователей"""
+    store = UserHistoryStore()
+    assert store.memory_report()["bytes_per_user"] == 0
+
+    for user_id in range(10):
+        store.append(-100, user_id, (user_id, None, 100.0, user_id))
+
+    report = store.memory_report()
+    assert report["tracked_users"] == 10
+    assert report["bytes_per_user"] > 0
+    assert report["total_bytes"] >= report["bytes_per_user"] * 10